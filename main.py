@@ -7,28 +7,81 @@
 ║  요구: pip install blessed               ║
 ║  이동: WASD / 방향키                     ║
 ║  행동: E(상호작용) I(인벤토리) Q(종료)   ║
-║        J(퀘스트)  C(캐릭터) S(저장)      ║
+║        J(퀘스트)  C(캐릭터) F5(저장)     ║
+║        L/F9(불러오기) H(시작점 귀환)     ║
+║        B(보관함, 시작점에서) F3(프로파일)║
 ╚══════════════════════════════════════════╝
 """
-import random, time, math, json, os, sys
+import random, time, math, json, os, sys, struct, mmap, zlib, heapq, asyncio
+from array import array
 from blessed import Terminal
-from dataclasses import dataclass, field
+from wcwidth import wcwidth
+from dataclasses import dataclass, field, fields
 from typing import List, Dict, Tuple, Optional
-from collections import deque
-from enum import Enum, auto
-from copy import deepcopy
+from collections import deque, OrderedDict
+from enum import Enum, IntEnum, auto
 
 # ═══════════════════════════════════════════
 #  § 1. 상수 & 기본 설정
 # ═══════════════════════════════════════════
-MAP_W, MAP_H   = 100, 100
+MAP_W, MAP_H   = 100, 100     # 기본 맵 크기 (--size 로 변경)
+CHUNK_SHIFT    = 5
+CHUNK          = 1 << CHUNK_SHIFT   # 32×32 청크
+CHUNK_MASK     = CHUNK - 1
 VIEW_W, VIEW_H = 55, 28
+SIM_RADIUS     = 40           # 플레이어 주변 청크 생성/시뮬레이션 반경
 PANEL_X        = VIEW_W + 2
 PANEL_W        = 24
 BASE_FOV       = 8
-TICK           = 0.07
+SIM_DT         = 0.05         # 고정 시뮬레이션 스텝 (20Hz)
+MAX_FPS        = 30           # 렌더 상한
 DAY_LEN        = 240          # 초 기준 하루
-SAVE_FILE      = "neon_save.json"
+DATA_FILE      = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "templates.json")
+SAVE_FILE      = "neon_save.nds"
+LEGACY_SAVE    = "neon_save.json"   # v0 (플레이어 일부 필드만 담은 JSON)
+REPLAY_FILE    = "neon_replay.bin"
+EVENT_FILE     = "neon_events.ndev"
+PROFILE_FILE   = "neon_profile.json"
+AUTOSAVE_FILE  = "neon_autosave.nds"
+AUTOSAVE_SEC   = 120.0        # 자동 저장 주기 (0이면 끔)
+PREFETCH_MAX   = 64           # 미리 만들어 둘 청크 수 상한
+INV_SLOTS      = 8
+STASH_SLOTS    = 2000         # 시작점 보관함 칸 수
+STASH_RADIUS   = 3            # 시작점에서 이 거리 안이면 보관함 사용 가능
+
+# 초당 발생률/변화량 (예전 0.07초 틱당 값을 초 단위로 환산)
+WEATHER_RATE      = 0.0114    # 날씨 변화 횟수 /s
+ERROR_RATE        = 0.057     # 오류 확산 이벤트 /s
+ERROR_TICK_BUDGET = 200       # 틱당 최대 확산 이벤트 수 — 남으면 다음 틱으로 넘긴다
+WATCHER_STEP_RATE = 0.57      # 감시자 이동 /s
+WATCHER_ANXIETY   = 57.0      # 감시자 근접 시 불안 증가 /s
+WATCHER_SYNC_RATE = 14.3      # 감시자 근접 시 동기화 점수 /s
+ENEMY_STEP_RATE   = 0.25      # 추적 중인 적 이동 /s (speed 1당)
+AGGRO_RADIUS      = 6         # 적이 플레이어를 알아채는 거리 (맨해튼)
+FLOW_RADIUS       = 24        # 추적용 거리 지도 반경 — 이 밖으로 나가면 추적 포기
+ERROR_STEP_COST   = 3         # 장거리 경로에서 오류 타일 진입 비용 (일반 칸 1)
+PATH_CACHE        = 128       # 최근 경로 LRU 캐시 크기
+TRAVEL_RATE       = 8.0       # 자동 이동 속도 (칸/s)
+
+def rate_chance(rate: float, dt: float) -> float:
+    """초당 rate회 일어나는 사건이 dt초 안에 일어날 확률"""
+    return 1.0 - math.exp(-rate * dt)
+
+def load_templates(path: str = DATA_FILE) -> dict:
+    """아이템/적/퀘스트 템플릿 데이터 (시작 시 한 번만 읽는다)"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def clone_slots(obj, mutable=()):
+    """__slots__ 객체 얕은 복사. 가변 필드(mutable)만 새 리스트로 복사하고
+    나머지는 템플릿과 공유한다 (deepcopy 대신)"""
+    cls = type(obj)
+    new = cls.__new__(cls)
+    for name in cls.__slots__:
+        setattr(new, name, getattr(obj, name))
+    for name in mutable:
+        setattr(new, name, list(getattr(obj, name)))
+    return new
 
 # 타일 문자
 T_FLOOR   = '·'; T_WALL  = '█'; T_ROAD   = '░'
@@ -98,6 +151,8 @@ ZONE_PROPS = {
     Zone.ROOFTOP_NETWORK:  dict(light=0.7, surv=0.3, err=0.08, npc=0.05, danger=0.4),
 }
 
+JOB_RANDOM = 254     # 인트로에서 Enter (무작위 직업)
+JOB_NONE   = 255     # 선택 없이 시작
 JOBS = [
     ("배달 기사",   "이동속도+, 상업/주거 이벤트+, 초기 자전거 보유"),
     ("편의점 직원", "심야 안정+, 저신호 NPC 친밀+, 초기 식량 보유"),
@@ -105,20 +160,27 @@ JOBS = [
     ("택시 기사",   "전구역 소문+, 감시 회피+, 초기 크레딧 2배"),
     ("무직",        "전 구역 자유 접근, 초기 스탯 균형, 특수 이벤트+"),
 ]
+JOB_ITEMS = {                 # 직업별 시작 아이템
+    "배달 기사":   ["ration", "stim_pack"],
+    "편의점 직원": ["ration", "ration", "coffee"],
+    "서버 보조":   ["sniffer", "battery"],
+    "택시 기사":   ["fake_id", "credits_50"],
+    "무직":        ["knife", "stim_pack"],
+}
 
 
 # ═══════════════════════════════════════════
 #  § 3. 아이템 시스템
 # ═══════════════════════════════════════════
-@dataclass
-class Item:
+@dataclass(frozen=True, slots=True)
+class ItemDef:
+    """불변 아이템 정의 — 같은 종류의 모든 인스턴스가 공유한다"""
     id: str
     name: str
     desc: str
     grade: ItemGrade = ItemGrade.COMMON
     weight: float = 0.5
     stackable: bool = False
-    qty: int = 1
     equippable: bool = False
     slot: str = ""          # "weapon" / "armor" / "accessory"
     # 효과
@@ -131,60 +193,147 @@ class Item:
     defense_bonus: int = 0
     duration: int = 0       # 지속 턴
     price: int = 10
+    durability: int = 0     # 최대 내구도 (0 = 무한)
+    milli: int = field(init=False, repr=False, compare=False)   # 무게 ×1000 (정수 합산용)
+
+    def __post_init__(self):
+        object.__setattr__(self, "milli", round(self.weight * 1000))
+
+    def make(self, qty: int = 1) -> "Item":
+        return Item(self, qty, self.durability)
+
+
+@dataclass(slots=True)
+class Item:
+    """아이템 인스턴스 — 수량/내구도만 갖고 나머지 속성은 정의에서 읽는다"""
+    defn: ItemDef
+    qty: int = 1
+    durability: int = 0
+
+    def __getattr__(self, name):
+        if name == "defn":          # 슬롯이 비어 있는 상태 (복사 중)
+            raise AttributeError(name)
+        return getattr(self.defn, name)
+
+    def clone(self, qty: Optional[int] = None) -> "Item":
+        it = clone_slots(self)
+        if qty is not None:
+            it.qty = qty
+        return it
+
+TEMPLATES = load_templates()
 
-ITEM_DB: Dict[str, Item] = {
-    "neon_flash":   Item("neon_flash",   "네온 플래시",     "시야 3턴 확장",          grade=ItemGrade.COMMON,    fov_bonus=4,      duration=3,  price=30),
-    "fake_id":      Item("fake_id",      "위조 신분증",     "감시 이벤트 1회 회피",   grade=ItemGrade.RARE,      stealth_bonus=20, duration=1,  price=80),
-    "battery":      Item("battery",      "임시 배터리팩",   "전자기기 1회 작동",      grade=ItemGrade.COMMON,    price=40),
-    "sniffer":      Item("sniffer",      "신호 스니퍼",     "숨겨진 데이터 흐름 표시",grade=ItemGrade.RARE,      price=120, equippable=True, slot="accessory"),
-    "memory_chip":  Item("memory_chip",  "기억 조각",       "특정 구역을 변화시킨다", grade=ItemGrade.LEGENDARY, price=500),
-    "knife":        Item("knife",        "접이식 나이프",   "공격력+5, 내구도 있음",  grade=ItemGrade.COMMON,    attack_bonus=5,  equippable=True, slot="weapon", price=60),
-    "stim_pack":    Item("stim_pack",    "스팀팩",          "HP 30 회복",             grade=ItemGrade.COMMON,    hp_restore=30,   stackable=True,  price=50),
-    "ration":       Item("ration",       "압축 식량",       "배고픔 40 회복",         grade=ItemGrade.COMMON,    hunger_restore=40, stackable=True, price=20),
-    "coffee":       Item("coffee",       "합성 커피",       "피로 감소, 스트레스+5",  grade=ItemGrade.COMMON,    stress_reduce=-5,  stackable=True, price=15),
-    "armor_vest":   Item("armor_vest",   "방탄 조끼",       "방어력+8",               grade=ItemGrade.RARE,      defense_bonus=8,  equippable=True, slot="armor",  price=150),
-    "data_chip":    Item("data_chip",    "데이터 칩",       "퀘스트 아이템",          grade=ItemGrade.RARE,      price=200),
-    "credits_50":   Item("credits_50",   "크레딧 카드",     "50 크레딧",              grade=ItemGrade.COMMON,    price=50),
+ITEM_DB: Dict[str, ItemDef] = {
+    iid: ItemDef(iid, **dict(spec, grade=ItemGrade[spec.get("grade", "COMMON")]))
+    for iid, spec in TEMPLATES["items"].items()
 }
 
 
 @dataclass
 class Inventory:
-    slots: int = 8
-    items: List[Optional[Item]] = field(default_factory=lambda: [None]*8)
+    """슬롯 목록 + 캐시 (무게 합, 빈 칸 스택, id→슬롯 색인).
+    추가/제거/겹치기/무게 검사가 모두 O(1)이라 수천 칸 보관함에도 쓴다.
+    items를 직접 바꿨다면 reindex()를 불러야 한다"""
+    slots: int = INV_SLOTS
+    items: List[Optional[Item]] = field(default_factory=list)
     equipped: Dict[str, Optional[Item]] = field(default_factory=lambda: {
         "weapon": None, "armor": None, "accessory": None
     })
     max_weight: float = 20.0
+    _load: int = field(default=0, init=False, repr=False)            # 무게 ×1000
+    _free: List[int] = field(default_factory=list, init=False, repr=False)
+    _index: Dict[str, set] = field(default_factory=dict, init=False, repr=False)
 
-    def total_weight(self) -> float:
-        return sum(it.weight * it.qty for it in self.items if it)
+    def __post_init__(self):
+        self.reindex()
+
+    def reindex(self):
+        items = self.items
+        if len(items) < self.slots:
+            items.extend([None] * (self.slots - len(items)))
+        self._load, self._index = 0, {}
+        for i, it in enumerate(items):
+            if it:
+                self._load += it.defn.milli * it.qty
+                self._index.setdefault(it.defn.id, set()).add(i)
+        # 앞 칸부터 채워지도록 역순으로 쌓는다
+        self._free = [i for i in range(len(items) - 1, -1, -1) if items[i] is None]
 
-    def add(self, item: Item) -> bool:
-        if self.total_weight() + item.weight > self.max_weight:
-            return False
-        if item.stackable:
-            for it in self.items:
-                if it and it.id == item.id:
-                    it.qty += item.qty
-                    return True
-        for i, slot in enumerate(self.items):
-            if slot is None:
-                self.items[i] = deepcopy(item)
-                return True
-        return False
+    def total_weight(self) -> float:
+        return self._load / 1000
+
+    def fits(self, defn: ItemDef, qty: int = 1) -> bool:
+        return self._load + defn.milli * qty <= self.max_weight * 1000
+
+    def find(self, iid: str) -> int:
+        """해당 id가 든 슬롯 하나 (없으면 -1)"""
+        where = self._index.get(iid)
+        return next(iter(where)) if where else -1
+
+    def has(self, iid: str) -> bool:
+        return iid in self._index
+
+    def add(self, defn: ItemDef, qty: int = 1) -> bool:
+        return self.put(defn.make(qty)) >= 0
+
+    def put(self, item: Item) -> int:
+        """인스턴스를 그대로 넣는다 (겹칠 수 있으면 기존 묶음에 합침). 넣은 슬롯, 실패 시 -1"""
+        defn = item.defn
+        if not self.fits(defn, item.qty):
+            return -1
+        where = self._index.get(defn.id)
+        if defn.stackable and where:
+            i = next(iter(where))
+            self.items[i].qty += item.qty
+            self._load += defn.milli * item.qty
+            return i
+        if not self._free:
+            return -1
+        return self._place(self._free.pop(), item)
+
+    def _place(self, i: int, item: Item) -> int:
+        self.items[i] = item
+        self._index.setdefault(item.defn.id, set()).add(i)
+        self._load += item.defn.milli * item.qty
+        return i
+
+    def take(self, idx: int, qty: Optional[int] = None) -> Optional[Item]:
+        """슬롯에서 qty개(기본 전부)를 꺼낸다"""
+        if not 0 <= idx < len(self.items):
+            return None
+        it = self.items[idx]
+        if it is None:
+            return None
+        if qty is None or qty >= it.qty:
+            self.items[idx] = None
+            self._free.append(idx)
+            where = self._index[it.defn.id]
+            where.discard(idx)
+            if not where:
+                del self._index[it.defn.id]
+            out = it
+        else:
+            it.qty -= qty
+            out = it.clone(qty)
+        self._load -= it.defn.milli * out.qty
+        return out
 
     def remove(self, idx: int):
-        if 0 <= idx < len(self.items):
-            self.items[idx] = None
+        self.take(idx)
+
+    def used(self) -> int:
+        return len(self.items) - len(self._free)
 
     def equip(self, idx: int) -> str:
         item = self.items[idx]
         if not item or not item.equippable:
             return "장착 불가"
+        self.take(idx)
         old = self.equipped.get(item.slot)
         self.equipped[item.slot] = item
-        self.items[idx] = old
+        if old:                     # 벗은 장비는 방금 비운 칸으로 (무게 제한 무시, 기존 동작)
+            self._free.pop()        # take()가 idx를 빈 칸 스택 맨 위에 올려 두었다
+            self._place(idx, old)
         return f"{item.name} 장착 완료"
 
     def get_stat(self, attr: str) -> int:
@@ -328,13 +477,37 @@ class ReputationSystem:
 # ═══════════════════════════════════════════
 #  § 6. 퀘스트 시스템
 # ═══════════════════════════════════════════
-@dataclass
+class GameEvent(Enum):
+    """퀘스트 목표가 구독하는 게임 이벤트. 키는 이벤트마다 다르다"""
+    ENTER_ZONE   = auto()    # 키: 구역 이름 (구역이 바뀔 때만)
+    NPC_CONTACT  = auto()    # 키: NPC 세력 (없으면 None)
+    USE_TERMINAL = auto()    # 키: 구역 이름
+    LOOP_CCTV    = auto()    # 키: 구역 이름
+    ERROR_TILE   = auto()    # 오류 농도 높은 칸을 밟음
+    USE_ITEM     = auto()    # 키: 아이템 id (사용/장착)
+    GET_ITEM     = auto()    # 키: 아이템 id
+
+
+@dataclass(frozen=True, slots=True)
+class Objective:
+    text: str
+    event: GameEvent
+    key: Optional[str] = None   # None이면 같은 종류의 모든 이벤트
+    count: int = 1
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> "Objective":
+        return cls(spec["text"], GameEvent[spec["event"]], spec.get("key"), spec.get("count", 1))
+
+
+@dataclass(slots=True)
 class Quest:
     id: str
     title: str
     desc: str
-    objectives: List[str]
+    objectives: List[Objective]     # 템플릿과 공유 (읽기 전용)
     completed_obj: List[bool] = field(default_factory=list)
+    progress: List[int] = field(default_factory=list)
     reward_credits: int = 100
     reward_xp: int = 50
     reward_item: Optional[str] = None
@@ -345,6 +518,8 @@ class Quest:
     def __post_init__(self):
         if not self.completed_obj:
             self.completed_obj = [False] * len(self.objectives)
+        if not self.progress:
+            self.progress = [0] * len(self.objectives)
 
     def complete_objective(self, idx: int) -> bool:
         if 0 <= idx < len(self.objectives):
@@ -358,31 +533,64 @@ class Quest:
         done = sum(self.completed_obj)
         return f"{done}/{len(self.objectives)}"
 
+    def clone(self) -> "Quest":
+        return clone_slots(self, mutable=("completed_obj", "progress"))
+
 
 QUEST_POOL: List[Quest] = [
-    Quest("find_person", "실종된 시민",
-          "누군가 연락이 끊긴 시민을 찾고 있다.",
-          ["저신호 구역 탐색", "단서 수집 (NPC 대화 3회)", "위치 확인"],
-          reward_credits=150, reward_xp=80, reward_item="stim_pack", giver="익명"),
-    Quest("deliver_chip", "데이터 칩 전달",
-          "이 칩을 산업 구역 서버실에 꽂아라.",
-          ["데이터 칩 수령", "산업 구역 도달", "서버 터미널 사용"],
-          reward_credits=200, reward_xp=100, reward_item="fake_id", giver="고스트"),
-    Quest("fix_errors", "오류 진정",
-          "저신호 구역의 오류 확산을 막아라.",
-          ["오류 지점 3곳 방문", "신호 스니퍼 사용"],
-          reward_credits=120, reward_xp=60, giver="시민"),
-    Quest("intel_gather", "정보 수집",
-          "기업 네트워크의 감시 패턴을 파악하라.",
-          ["CCTV 2대 조작", "옥상 구역 도달", "기업 NPC 대화"],
-          reward_credits=300, reward_xp=150, reward_item="sniffer", giver="고스트"),
+    Quest(qid, **dict(spec, objectives=[Objective.from_spec(o) for o in spec["objectives"]]))
+    for qid, spec in TEMPLATES["quests"].items()
 ]
 
 
+class QuestEngine:
+    """(이벤트, 키) → 그 이벤트를 기다리는 미완료 목표 색인.
+    emit은 색인 두 칸(키 일치 + 키 무관)만 보므로 아무 목표도 걸리지 않는
+    이벤트는 진행 중인 퀘스트 수와 상관없이 공짜다"""
+
+    def __init__(self):
+        self._subs: Dict[Tuple[GameEvent, Optional[str]], Dict[Tuple[str, int], Quest]] = {}
+
+    def subscribe(self, q: Quest):
+        for i, obj in enumerate(q.objectives):
+            if not q.completed_obj[i]:
+                self._subs.setdefault((obj.event, obj.key), {})[(q.id, i)] = q
+
+    def unsubscribe(self, q: Quest):
+        for i, obj in enumerate(q.objectives):
+            bucket = self._subs.get((obj.event, obj.key))
+            if bucket:
+                bucket.pop((q.id, i), None)
+                if not bucket:
+                    del self._subs[(obj.event, obj.key)]
+
+    def reset(self, quests: List[Quest]):
+        self._subs.clear()
+        for q in quests:
+            self.subscribe(q)
+
+    def emit(self, event: GameEvent, key: Optional[str] = None) -> List[Tuple[Quest, int]]:
+        """진행된 (퀘스트, 목표 번호) 목록. 다 채운 목표는 구독 해제"""
+        hits = []
+        for sub in ((event, key), (event, None)) if key is not None else ((event, None),):
+            bucket = self._subs.get(sub)
+            if not bucket:
+                continue
+            for (qid, i), q in list(bucket.items()):
+                q.progress[i] += 1
+                if q.progress[i] >= q.objectives[i].count:
+                    q.complete_objective(i)
+                    del bucket[(qid, i)]
+                hits.append((q, i))
+            if not bucket:
+                del self._subs[sub]
+        return hits
+
+
 # ═══════════════════════════════════════════
 #  § 7. 적 시스템
 # ═══════════════════════════════════════════
-@dataclass
+@dataclass(slots=True)
 class Enemy:
     id: str
     name: str
@@ -392,28 +600,37 @@ class Enemy:
     attack: int; defense: int; speed: int
     xp_reward: int
     credit_reward: int
-    drop_items: List[str] = field(default_factory=list)
+    drop_items: Tuple[str, ...] = ()     # 템플릿과 공유 (읽기 전용)
     faction: str = "NONE"
     alert: bool = False
     alert_timer: float = 0.0
     aggro: bool = False
+    move_acc: float = 0.0       # 추적 이동 누적 (1 이상이면 한 칸)
 
     def is_alive(self) -> bool:
         return self.hp > 0
 
     def take_damage(self, dmg: int) -> int:
-        actual = max(1, dmg - self.defense)
+        actual = mitigate(dmg, self.defense)
         self.hp = max(0, self.hp - actual)
         return actual
 
+    def clone(self, x: int, y: int) -> "Enemy":
+        e = clone_slots(self)      # 가변 필드는 모두 스칼라라 얕은 복사로 충분
+        e.x, e.y = x, y
+        return e
+
+
+ENEMY_TEMPLATES: Dict[str, Enemy] = {
+    etype: Enemy(etype, spec["name"], spec["char"], 0, 0, spec["hp"], spec["hp"],
+                 spec["attack"], spec["defense"], spec["speed"], spec["xp_reward"],
+                 spec["credit_reward"], tuple(spec.get("drop_items", ())),
+                 spec.get("faction", "NONE"))
+    for etype, spec in TEMPLATES["enemies"].items()
+}
 
 def make_enemy(etype: str, x: int, y: int) -> Enemy:
-    templates = {
-        "drone": Enemy("drone", "감시 드론",    T_ENEMY_D, x, y, 40, 40,  8,  3, 4, 30, 20, ["battery"],     "CORP"),
-        "gang":  Enemy("gang",  "거리 폭력배",  T_ENEMY_G, x, y, 60, 60, 12,  5, 3, 40, 35, ["credits_50"],  "GHOSTS"),
-        "error": Enemy("error", "오류 개체",    T_ENEMY_E, x, y, 30, 30,  6,  0, 5, 20, 10, ["data_chip"],   "NONE"),
-    }
-    return deepcopy(templates.get(etype, templates["gang"]))
+    return ENEMY_TEMPLATES.get(etype, ENEMY_TEMPLATES["gang"]).clone(x, y)
 
 
 # ═══════════════════════════════════════════
@@ -438,27 +655,679 @@ class NPC:
     faction: Optional[str] = None
     quest_id: Optional[str] = None
     shop_inv: List[str] = field(default_factory=list)
+    home_x: int = -1; home_y: int = -1   # 일과 중심 (기본은 생성 위치)
+    synced: float = -1.0                 # 마지막 개별 갱신 시각 (gs.clock)
 
-    def get_line(self) -> str:
+    def __post_init__(self):
+        if self.home_x < 0:
+            self.home_x, self.home_y = self.x, self.y
+
+    def rally(self) -> Tuple[int,int]:
+        """파벌 집회 장소 — 집이 속한 블록의 중심"""
+        half = 1 << (RALLY_SHIFT - 1)
+        return ((self.home_x >> RALLY_SHIFT << RALLY_SHIFT) + half,
+                (self.home_y >> RALLY_SHIFT << RALLY_SHIFT) + half)
+
+    def goal(self, tod: float) -> Optional[Tuple[int,int]]:
+        """지금 시각에 가 있어야 할 곳 (없으면 집 근처 배회)"""
+        if self.role == "merchant" and in_hours(tod, SHOP_HOURS):
+            return self.home_x, self.home_y
+        if self.faction and in_hours(tod, GATHER_HOURS):
+            return self.rally()
+        return None
+
+    def get_line(self, rng: random.Random = random) -> str:
         pool = NPC_LINES.get(self.role, NPC_LINES["stranger"])
         if self.memory > 5:
-            return random.choice(["또 왔네.", "낯이 익어.", "살아있구나."])
-        return random.choice(pool)
+            return rng.choice(["또 왔네.", "낯이 익어.", "살아있구나."])
+        return rng.choice(pool)
+
+
+# NPC 일과 LOD: 뷰포트 주변만 매 틱 개별로 돌리고, 나머지는 구역 집계(CrowdSim)만 갱신
+NPC_LOD_MARGIN  = 8           # 뷰포트 밖 이 칸 수까지는 개별 시뮬레이션
+NPC_WANDER_RATE = 0.4         # 걸음 /s
+NPC_HOME_R      = 6           # 집에서 이 거리(맨해튼) 안에서만 배회
+NPC_MOOD_TAU    = 60.0        # 기분이 구역 분위기로 수렴하는 시간 상수 (초)
+NPC_RESETTLE    = 30.0        # 이보다 오래 멀리 있던 NPC는 일과 위치로 다시 배치
+CROWD_DT        = 2.0         # 구역 집계 갱신 주기 (초)
+SHOP_HOURS      = (0.25, 0.85)   # 상점 영업 시간 (time_of_day)
+GATHER_HOURS    = (0.85, 0.05)   # 파벌 집회 시간 (자정을 넘김)
+RALLY_SHIFT     = 4           # 집회 장소 = 16×16 블록 중심
+
+WEATHER_MOOD = {Weather.CLEAR: 0.05, Weather.RAIN: -0.05, Weather.HEAVY: -0.15}
+
+def in_hours(tod: float, span: Tuple[float, float]) -> bool:
+    a, b = span
+    return a <= tod < b if a < b else (tod >= a or tod < b)
+
+class CrowdSim:
+    """구역 단위 NPC 집계. 멀리 있는 NPC는 개별로 돌리지 않고 구역 분위기만
+    CROWD_DT마다 한꺼번에 갱신한다. NPC가 다시 가까워지면 떨어져 있던 시간만큼
+    한 번에 따라잡으므로 비용이 전체 NPC 수와 무관하다."""
+    def __init__(self):
+        self.mood = [0.5] * len(Zone)       # Zone.value 순서
+        self._acc = 0.0
+
+    @staticmethod
+    def target(zone: Zone, tod: float, weather: Weather) -> float:
+        pr = ZONE_PROPS[zone]
+        t = 0.5 + 0.3 * (pr["light"] - pr["danger"]) + WEATHER_MOOD[weather]
+        if not in_hours(tod, SHOP_HOURS):
+            t -= 0.1
+        return min(1.0, max(0.0, t))
+
+    def tick(self, dt: float, tod: float, weather: Weather):
+        self._acc += dt
+        if self._acc < CROWD_DT:
+            return
+        k = 1.0 - math.exp(-self._acc / NPC_MOOD_TAU)
+        self._acc = 0.0
+        for z in Zone:
+            m = self.mood[z.value]
+            self.mood[z.value] = m + (self.target(z, tod, weather) - m) * k
 
 
 # ═══════════════════════════════════════════
 #  § 9. 맵 타일
 # ═══════════════════════════════════════════
-@dataclass
+# 월드는 구조체-배열(SoA)로 저장한다. 각 배열에는 코드만 들어가고
+# 실제 문자/구역/아이템 ID는 아래 테이블로 복원한다.
+TILE_CHARS   = [T_FLOOR, T_WALL, T_ROAD, T_BUILD, T_NEON, T_ERROR,
+                T_DOOR, T_TERM, T_CCTV, T_ITEM, T_CHEST]
+CHAR_CODE    = {c: i for i, c in enumerate(TILE_CHARS)}
+INTERACTIVES = ["", "door", "terminal", "cctv", "chest"]
+INTER_CODE   = {s: i for i, s in enumerate(INTERACTIVES)}
+ZONE_BY_CODE = sorted(Zone, key=lambda z: z.value)
+ITEM_IDS     = list(ITEM_DB.keys())
+ITEM_CODE    = {iid: i for i, iid in enumerate(ITEM_IDS)}
+
+
+class Chunk:
+    """CHUNK×CHUNK 타일 배열 묶음. 로컬 인덱스 i = ly * CHUNK + lx"""
+    __slots__ = ("cx", "cy", "ox", "oy", "char", "zone", "walkable", "neon",
+                 "visits", "error", "interactive", "item", "seen", "sclass", "version",
+                 "cost_version", "paint", "labels", "spots")
+
+    def __init__(self, cx: int, cy: int):
+        n = CHUNK * CHUNK
+        self.cx, self.cy = cx, cy
+        self.ox, self.oy = cx * CHUNK, cy * CHUNK
+        self.char        = bytearray(n)                 # TILE_CHARS 코드
+        self.zone        = bytearray(n)                 # Zone.value
+        self.walkable    = bytearray(b'\x01') * n
+        self.neon        = bytearray(n)
+        self.visits      = array('I', bytes(4 * n))
+        self.error       = array('f', bytes(4 * n))
+        self.interactive = bytearray(n)                 # INTERACTIVES 코드
+        self.item        = array('h', [-1]) * n         # ITEM_IDS 코드, -1=없음
+        self.seen        = bytearray(n)                 # 시야에 들어온 적 있음
+        self.sclass      = bytearray(n)                 # 스타일 클래스 (tile_class)
+        self.version     = 0                            # 통행/차폐 변경 카운터
+        self.cost_version = 0                           # 경로 비용(오류 타일) 변경 카운터
+        self.paint       = 0                            # 글리프/sclass 변경 카운터 (seen 제외)
+        self.labels      = None                         # (통행 배열 사본, 연결 요소 번호) — chunk_labels
+        self.spots       = None                         # (라벨, 구역별 스폰 칸) — spawn_spots
+
+
+# 타일 스타일 클래스. 렌더러는 클래스별 이스케이프 문자열을 미리 만들어 두고
+# 셀마다 Chunk.sclass 값으로 찾기만 한다. 우선순위는 아래 tile_class 순서.
+SC_ZONE     = 0             # 0..4 밝은 구역 바닥 (구역 색) — SC_ZONE + Zone.value
+SC_DIM      = 5             # 중간 조명 구역 바닥
+SC_DARK     = 6             # 어두운 구역 바닥
+SC_WALL, SC_ROAD, SC_ITEM, SC_INTERACT, SC_ERROR, SC_NEON, SC_VISITED = range(7, 14)
+N_STYLE_CLASSES = 14
+
+_FLOOR_CLASS = bytes(SC_DARK if ZONE_PROPS[z]['light'] < 0.4 else
+                     SC_DIM if ZONE_PROPS[z]['light'] < 0.7 else SC_ZONE + z.value
+                     for z in ZONE_BY_CODE)
+_CODE_CLASS  = {CHAR_CODE[T_WALL]: SC_WALL, CHAR_CODE[T_BUILD]: SC_WALL,
+                CHAR_CODE[T_ROAD]: SC_ROAD}
+
+def tile_class(ck: Chunk, i: int) -> int:
+    if ck.visits[i] > 15:     return SC_VISITED
+    if ck.neon[i]:            return SC_NEON
+    if ck.error[i] > 0.5:     return SC_ERROR
+    if ck.interactive[i]:     return SC_INTERACT
+    if ck.item[i] >= 0:       return SC_ITEM
+    return _CODE_CLASS.get(ck.char[i]) or _FLOOR_CLASS[ck.zone[i]]
+
+def restyle_chunk(ck: Chunk):
+    sc = ck.sclass
+    for i in range(CHUNK * CHUNK):
+        sc[i] = tile_class(ck, i)
+
+
+def chunk_seed(seed: int, cx: int, cy: int) -> int:
+    return (seed * 73856093 ^ cx * 19349663 ^ cy * 83492791) & 0xFFFFFFFF
+
+
+class World:
+    """청크 단위로 지연 생성되는 타일 그리드"""
+    def __init__(self, w: int = MAP_W, h: int = MAP_H, seed: int = 0):
+        self.w, self.h = w, h
+        self.seed   = seed
+        self.cw     = (w + CHUNK - 1) // CHUNK
+        self.ch     = (h + CHUNK - 1) // CHUNK
+        self.chunks: Dict[Tuple[int,int], Chunk] = {}
+        self.on_generate: List = []     # fn(chunk) — 청크 최초 생성 시 호출
+        self.on_restore: List = []      # fn(chunk) — 세이브 스냅샷에서 복원 시 호출
+        self.snapshot: Optional["WorldSnapshot"] = None
+        # 유휴 시간에 미리 만든 청크. 지형만 있고 리스너(NPC/적 배치 등)는
+        # 실제로 활성화될 때 부르므로 게임 진행(리플레이 포함)은 그대로다
+        self.prefetched: Dict[Tuple[int,int], Chunk] = {}
+        self.links = Connectivity(self)
+        self.atlas = CityAtlas(self)
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def chunk(self, cx: int, cy: int) -> Chunk:
+        ck = self.chunks.get((cx, cy))
+        if ck is None:
+            ck = self.snapshot.restore(cx, cy) if self.snapshot else None
+            if ck is not None:
+                listeners = self.on_restore
+            else:
+                ck = self.prefetched.pop((cx, cy), None) or generate_chunk(self, cx, cy)
+                listeners = self.on_generate
+            self.chunks[(cx, cy)] = ck
+            self.links.add_chunk(ck)
+            self.atlas.dirty.add((cx, cy))
+            for fn in listeners:
+                fn(ck)
+        return ck
+
+    def is_loaded(self, x: int, y: int) -> bool:
+        return (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) in self.chunks
+
+    def ensure_rect(self, x0: int, y0: int, x1: int, y1: int):
+        """(x0,y0)-(x1,y1) 사각형에 닿는 청크를 모두 생성"""
+        cx0 = max(0, x0) >> CHUNK_SHIFT; cx1 = min(self.w - 1, x1) >> CHUNK_SHIFT
+        cy0 = max(0, y0) >> CHUNK_SHIFT; cy1 = min(self.h - 1, y1) >> CHUNK_SHIFT
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                if (cx, cy) not in self.chunks:
+                    self.chunk(cx, cy)
+
+    def ensure_radius(self, x: int, y: int, r: int):
+        self.ensure_rect(x - r, y - r, x + r, y + r)
+
+    def prefetch(self, x: int, y: int, r: int) -> bool:
+        """(x,y) 반경 r 안에서 아직 없는 청크 하나를 가까운 것부터 미리 생성.
+        할 일이 없으면 False"""
+        pcx, pcy = x >> CHUNK_SHIFT, y >> CHUNK_SHIFT
+        best, best_d = None, None
+        cx0 = max(0, x - r) >> CHUNK_SHIFT; cx1 = min(self.w - 1, x + r) >> CHUNK_SHIFT
+        cy0 = max(0, y - r) >> CHUNK_SHIFT; cy1 = min(self.h - 1, y + r) >> CHUNK_SHIFT
+        snap = self.snapshot.table if self.snapshot else ()
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                key = (cx, cy)
+                if key in self.chunks or key in self.prefetched or key in snap:
+                    continue
+                d = abs(cx - pcx) + abs(cy - pcy)
+                if best is None or d < best_d:
+                    best, best_d = key, d
+        if best is None:
+            return False
+        if len(self.prefetched) >= PREFETCH_MAX:        # 가장 먼 것부터 버린다
+            far = max(self.prefetched, key=lambda k: abs(k[0] - pcx) + abs(k[1] - pcy))
+            del self.prefetched[far]
+        self.prefetched[best] = generate_chunk(self, *best)
+        return True
+
+    def tile(self, x: int, y: int) -> Optional["Tile"]:
+        if 0 <= x < self.w and 0 <= y < self.h:
+            ck = self.chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+            return Tile(ck, (y & CHUNK_MASK) * CHUNK + (x & CHUNK_MASK))
+        return None
+
+    def walkable_at(self, x: int, y: int) -> bool:
+        if 0 <= x < self.w and 0 <= y < self.h:
+            ck = self.chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+            return bool(ck.walkable[(y & CHUNK_MASK) * CHUNK + (x & CHUNK_MASK)])
+        return False
+
+    def sample_near(self, rng: random.Random, x: int, y: int, r: int,
+                    tries: int = 20) -> Optional[Tuple[int, int]]:
+        """(x,y) 반경 r 상자 안에서 (x,y)와 이어진 스폰 칸 하나. 청크의 스폰 칸 목록에서
+        바로 뽑으므로 통행 칸이 드물어도 시도 횟수가 늘지 않는다"""
+        self.ensure_rect(x - r, y - r, x + r, y + r)
+        keys = [(cx, cy) for cy in range(max(0, y - r) >> CHUNK_SHIFT, (min(self.h - 1, y + r) >> CHUNK_SHIFT) + 1)
+                for cx in range(max(0, x - r) >> CHUNK_SHIFT, (min(self.w - 1, x + r) >> CHUNK_SHIFT) + 1)]
+        home = self.links.node(x, y)
+        for _ in range(tries):
+            ck = self.chunks[rng.choice(keys)]
+            spots = spawn_spots(self, ck)
+            if not spots:
+                continue
+            i = rng.choice(spots)
+            sx, sy = ck.ox + (i & CHUNK_MASK), ck.oy + (i >> CHUNK_SHIFT)
+            if abs(sx - x) <= r and abs(sy - y) <= r and (home is None or self.links.same(home, sx, sy)):
+                return sx, sy
+        return None
+
+
 class Tile:
-    char: str = T_FLOOR
-    zone: Zone = Zone.RESIDENTIAL
-    walkable: bool = True
-    is_neon: bool = False
-    visit_count: int = 0
-    error_level: float = 0.0
-    interactive: str = ""    # "door" / "terminal" / "cctv" / "chest"
-    item_drop: Optional[str] = None   # 아이템 ID
+    """Chunk 배열 한 칸에 대한 가벼운 뷰 (기존 Tile 속성 API 유지).
+    스타일에 영향을 주는 속성을 바꾸면 sclass도 함께 갱신한다"""
+    __slots__ = ("_c", "_i")
+
+    def __init__(self, chunk: Chunk, idx: int):
+        self._c = chunk
+        self._i = idx
+
+    def _restyle(self):
+        c, i = self._c, self._i
+        sc = tile_class(c, i)
+        if c.sclass[i] != sc:
+            c.sclass[i] = sc
+            c.paint += 1
+
+    @property
+    def pos(self) -> Tuple[int, int]:
+        return self._c.ox + (self._i & CHUNK_MASK), self._c.oy + (self._i >> CHUNK_SHIFT)
+
+    @property
+    def char(self) -> str:
+        return TILE_CHARS[self._c.char[self._i]]
+    @char.setter
+    def char(self, v: str):
+        code, old = CHAR_CODE[v], self._c.char[self._i]
+        if old != code:
+            self._c.char[self._i] = code
+            self._c.paint += 1
+            if _C_ERROR in (old, code):
+                self._c.cost_version += 1
+        self._restyle()
+
+    @property
+    def zone(self) -> Zone:
+        return ZONE_BY_CODE[self._c.zone[self._i]]
+    @zone.setter
+    def zone(self, v: Zone):
+        self._c.zone[self._i] = v.value
+        self._restyle()
+
+    @property
+    def walkable(self) -> bool:
+        return bool(self._c.walkable[self._i])
+    @walkable.setter
+    def walkable(self, v: bool):
+        v = 1 if v else 0
+        if self._c.walkable[self._i] != v:
+            self._c.walkable[self._i] = v
+            self._c.version += 1
+
+    @property
+    def is_neon(self) -> bool:
+        return bool(self._c.neon[self._i])
+    @is_neon.setter
+    def is_neon(self, v: bool):
+        self._c.neon[self._i] = 1 if v else 0
+        self._restyle()
+
+    @property
+    def visit_count(self) -> int:
+        return self._c.visits[self._i]
+    @visit_count.setter
+    def visit_count(self, v: int):
+        self._c.visits[self._i] = v
+        self._restyle()
+
+    @property
+    def error_level(self) -> float:
+        return self._c.error[self._i]
+    @error_level.setter
+    def error_level(self, v: float):
+        self._c.error[self._i] = v
+        self._restyle()
+
+    @property
+    def interactive(self) -> str:          # "door" / "terminal" / "cctv" / "chest"
+        return INTERACTIVES[self._c.interactive[self._i]]
+    @interactive.setter
+    def interactive(self, v: str):
+        self._c.interactive[self._i] = INTER_CODE[v]
+        self._restyle()
+
+    @property
+    def item_drop(self) -> Optional[str]:  # 아이템 ID
+        code = self._c.item[self._i]
+        return ITEM_IDS[code] if code >= 0 else None
+    @item_drop.setter
+    def item_drop(self, v: Optional[str]):
+        self._c.item[self._i] = ITEM_CODE[v] if v else -1
+        self._restyle()
+
+
+def _walk_runs(wk: bytearray, a: int, b: int) -> List[Tuple[int, int]]:
+    """wk[a:b] 안 연속 통행 구간 [시작, 끝) 목록 (인덱스는 wk 기준)"""
+    runs = []
+    x = wk.find(1, a, b)
+    while x >= 0:
+        e = wk.find(0, x, b)
+        if e < 0:
+            e = b
+        runs.append((x, e))
+        x = wk.find(1, e, b)
+    return runs
+
+def chunk_labels(ck: Chunk) -> array:
+    """청크 안 연결 요소 번호 (0=통행 불가, 4방향). 행마다 통행 구간을 잘라
+    윗행 구간과 겹치면 union-find로 합친다. 통행 배열이 그대로면 캐시를 쓴다"""
+    hit, wk = ck.labels, ck.walkable
+    if hit is not None and hit[0] == wk:
+        return hit[1]
+    parent: List[int] = []                  # 구간 → 부모 구간
+    runs, prev = [], []                     # (시작, 끝, 구간 번호)
+    for row in range(0, CHUNK * CHUNK, CHUNK):
+        cur, j, end = [], 0, row + CHUNK
+        a = wk.find(1, row, end)
+        while a >= 0:
+            b = wk.find(0, a, end)
+            if b < 0:
+                b = end
+            root = None
+            while j < len(prev) and prev[j][1] + CHUNK <= a:
+                j += 1
+            k = j
+            while k < len(prev) and prev[k][0] + CHUNK < b:      # 윗행에서 겹치는 구간
+                r = prev[k][2]
+                while parent[r] != r:
+                    parent[r] = parent[parent[r]]
+                    r = parent[r]
+                if root is None:
+                    root = r
+                elif r != root:
+                    root, other = min(root, r), max(root, r)
+                    parent[other] = root
+                k += 1
+            rid = len(parent)
+            parent.append(rid if root is None else root)
+            cur.append((a, b, rid))
+            a = wk.find(1, b, end)
+        runs += cur
+        prev = cur
+    lab = array('H', bytes(2 * CHUNK * CHUNK))
+    ids: Dict[int, int] = {}
+    for a, b, r in runs:
+        while parent[r] != r:
+            r = parent[r]
+        n = ids.get(r)
+        if n is None:
+            n = ids[r] = len(ids) + 1
+        lab[a:b] = array('H', [n]) * (b - a)
+    ck.labels = (bytes(wk), lab)
+    return lab
+
+def spawn_spots(world: World, ck: Chunk, zone: Optional[Zone] = None) -> array:
+    """스폰해도 되는 칸의 로컬 인덱스 (zone을 주면 그 구역만). 맵 가장자리 칸과
+    벽에 갇힌 연결 요소(맵 안쪽 청크 경계에도, 문에도 닿지 않는 것)는 뺀다"""
+    lab = chunk_labels(ck)
+    if ck.spots is None or ck.spots[0] is not lab:
+        bw, bh = _chunk_extent(world, ck)
+        edge = []                                   # 이웃 청크와 맞닿은 칸
+        if ck.cx > 0:
+            edge += range(0, bh * CHUNK, CHUNK)
+        if ck.cy > 0:
+            edge += range(bw)
+        if ck.ox + CHUNK < world.w:
+            edge += range(CHUNK_MASK, bh * CHUNK, CHUNK)
+        if ck.oy + CHUNK < world.h:
+            edge += range(CHUNK_MASK * CHUNK, CHUNK_MASK * CHUNK + bw)
+        exits = {lab[i] for i in edge}
+        door = INTER_CODE["door"]
+        i = ck.interactive.find(door)
+        while i >= 0:
+            lx = i & CHUNK_MASK
+            for j in (i - CHUNK, i + CHUNK, i - 1 if lx else -1, i + 1 if lx < CHUNK_MASK else -1):
+                if 0 <= j < CHUNK * CHUNK:
+                    exits.add(lab[j])
+            i = ck.interactive.find(door, i + 1)
+        exits.discard(0)
+        x0, y0 = 1 if ck.ox == 0 else 0, 1 if ck.oy == 0 else 0
+        x1, y1 = min(bw, world.w - 1 - ck.ox), min(bh, world.h - 1 - ck.oy)
+        zn, flat = ck.zone, array('H')
+        if ((x0, y0, x1, y1) == (0, 0, CHUNK, CHUNK) and len(exits) == max(lab, default=0)
+                and zn.count(zn[0]) == len(zn)):
+            # 흔한 경우 — 구역 하나인 안쪽 청크에 갇힌 요소가 없다: 통행 칸 전체를 한 번에
+            for a, b in _walk_runs(ck.walkable, 0, CHUNK * CHUNK):
+                flat.extend(range(a, b))
+            by_zone: Dict[Optional[int], array] = {None: flat, zn[0]: flat}
+        else:
+            by_zone = {None: flat}
+            for row in range(y0 * CHUNK, y1 * CHUNK, CHUNK):
+                for a, b in _walk_runs(ck.walkable, row + x0, row + x1):
+                    if lab[a] not in exits:
+                        continue
+                    flat.extend(range(a, b))
+                    z = zn[a]
+                    if zn.count(z, a, b) == b - a:
+                        by_zone.setdefault(z, array('H')).extend(range(a, b))
+                    else:
+                        for k in range(a, b):
+                            by_zone.setdefault(zn[k], array('H')).append(k)
+        ck.spots = (lab, by_zone)
+    return ck.spots[1].get(None if zone is None else zone.value, _NO_SPOTS)
+
+_NO_SPOTS = array('H')
+
+
+class Connectivity:
+    """로드된 청크 전체의 통행 연결 요소 (union-find). 노드는 청크 안 연결 요소이고,
+    청크가 로드되면 이미 있는 이웃과 경계에서 합치고 문이 열리면 그 칸 주변을 합친다.
+    아직 없는 청크를 돌아가는 길은 모르므로 same()이 True면 확실히 이어진 것이다."""
+    def __init__(self, world: World):
+        self.world = world
+        self.parent: List[int] = []
+        self.size: List[int] = []
+        self.comp: Dict[Tuple[int,int], Tuple[int, array]] = {}   # 청크 → (첫 노드, 로드 시 라벨)
+        self.opened: Dict[Tuple[int,int], int] = {}                # 연 문 칸 → 노드
+
+    def _new(self, n: int) -> int:
+        base = len(self.parent)
+        self.parent.extend(range(base, base + n))
+        self.size.extend([1] * n)
+        return base
+
+    def find(self, a: int) -> int:
+        parent = self.parent
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def node(self, x: int, y: int) -> Optional[int]:
+        """(x,y) 칸의 노드. 통행 불가이거나 청크가 아직 없으면 None"""
+        hit = self.opened.get((x, y))
+        if hit is not None:
+            return hit
+        ent = self.comp.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if ent is None or not self.world.in_bounds(x, y):
+            return None
+        lab = ent[1][(y & CHUNK_MASK) * CHUNK + (x & CHUNK_MASK)]
+        return ent[0] + lab - 1 if lab else None
+
+    def same(self, a: int, x: int, y: int) -> bool:
+        b = self.node(x, y)
+        return b is not None and self.find(a) == self.find(b)
+
+    def connected(self, ax: int, ay: int, bx: int, by: int) -> bool:
+        a = self.node(ax, ay)
+        return a is not None and self.same(a, bx, by)
+
+    def add_chunk(self, ck: Chunk):
+        lab = chunk_labels(ck)
+        self.comp[(ck.cx, ck.cy)] = (self._new(max(lab, default=0)), lab)
+        # 이미 로드된 네 이웃과 경계에서 맞닿은 통행 칸끼리 합친다
+        for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            if (ck.cx + dx, ck.cy + dy) not in self.comp:
+                continue
+            for k in range(CHUNK):
+                lx, ly = (k, CHUNK_MASK if dy > 0 else 0) if dy else (CHUNK_MASK if dx > 0 else 0, k)
+                x, y = ck.ox + lx, ck.oy + ly
+                a = self.node(x, y)
+                if a is not None:
+                    b = self.node(x + dx, y + dy)
+                    if b is not None:
+                        self.union(a, b)
+
+    def open_tile(self, x: int, y: int):
+        """(x,y)가 통행 가능해졌다 (문 개방). 그 칸과 4방향 이웃을 한 요소로"""
+        if self.node(x, y) is not None or (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) not in self.comp:
+            return
+        a = self.opened[(x, y)] = self._new(1)
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            b = self.node(nx, ny)
+            if b is not None:
+                self.union(a, b)
+
+
+# 도시 지도 층 (밉맵). 0단계 한 칸 = ATLAS_CELL×ATLAS_CELL 타일, 단계마다 두 배.
+# 구역(최빈값, 0=미생성) / 오류 타일 비율(평균, 0..255) / 탐색 비율(평균) / 알려진 지점(비트 OR)
+ATLAS_CELL = 4
+POI_BITS = {INTER_CODE["terminal"]: 1, INTER_CODE["door"]: 2, INTER_CODE["cctv"]: 4,
+            INTER_CODE["chest"]: 8}
+POI_ITEM = 16
+_NO_ITEM4 = array('h', [-1]) * ATLAS_CELL
+
+class CityAtlas:
+    """도시 전체를 낮은 해상도로 요약한 층들. 바뀐 청크의 0단계 칸만 다시 계산하고
+    그 위 단계는 해당 영역만 줄여 올린다. 그리는 쪽은 화면 칸마다 한 단계의 한 칸만 읽으므로
+    맵 크기와 상관없이 비용이 같다."""
+    def __init__(self, world: World):
+        self.world = world
+        self.dims: List[Tuple[int, int]] = []
+        w, h = (world.w + ATLAS_CELL - 1) // ATLAS_CELL, (world.h + ATLAS_CELL - 1) // ATLAS_CELL
+        while True:
+            self.dims.append((w, h))
+            if w == 1 and h == 1:
+                break
+            w, h = (w + 1) // 2, (h + 1) // 2
+        self.zone     = [bytearray(a * b) for a, b in self.dims]
+        self.error    = [bytearray(a * b) for a, b in self.dims]
+        self.explored = [bytearray(a * b) for a, b in self.dims]
+        self.poi      = [bytearray(a * b) for a, b in self.dims]
+        self.dirty: set = set()                      # 다시 읽을 청크 키
+        self.stamp: Dict[Tuple[int,int], int] = {}   # 청크 → 마지막으로 읽은 paint
+
+    def cell_size(self, level: int) -> int:
+        return ATLAS_CELL << level
+
+    def refresh(self, x: int, y: int):
+        """표시 전에 호출. 표시된 청크와, 타일 변경이 일어나는 플레이어 주변 3×3 청크를 반영"""
+        chunks = self.world.chunks
+        pcx, pcy = x >> CHUNK_SHIFT, y >> CHUNK_SHIFT
+        for key in [(pcx + dx, pcy + dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]:
+            ck = chunks.get(key)
+            if ck is not None and self.stamp.get(key) != ck.paint:
+                self.dirty.add(key)
+        for key in self.dirty:
+            ck = chunks.get(key)
+            if ck is not None:
+                self.absorb(ck)
+        self.dirty.clear()
+
+    def absorb_stored(self, snap: "WorldSnapshot"):
+        """세이브에만 있고 아직 안 올린 청크도 지도에는 보이게 (지형 스타일 계산은 생략).
+        0단계를 다 채운 뒤 위 단계는 단계마다 한 번에 줄인다"""
+        for key in snap.table:
+            if key not in self.world.chunks:
+                self.absorb(unpack_chunk(*key, snap.raw(key), restyle=False), propagate=False)
+        for k in range(1, len(self.dims)):
+            self._reduce(k, 0, 0, *self.dims[k])
+
+    def absorb(self, ck: Chunk, propagate: bool = True):
+        """청크 하나를 0단계 칸에 반영하고 (propagate면) 위 단계로 전파"""
+        self.stamp[(ck.cx, ck.cy)] = ck.paint
+        n = CHUNK // ATLAS_CELL
+        w0, h0 = self.dims[0]
+        bx, by = ck.cx * n, ck.cy * n
+        nx, ny = min(n, w0 - bx), min(n, h0 - by)
+        zl, el, xl, pl = self.zone[0], self.error[0], self.explored[0], self.poi[0]
+        seen, err, inter, item, zn = ck.seen, ck.error, ck.interactive, ck.item, ck.zone
+        explored = seen.count(1) > 0
+        z_all = zn[0] if zn.count(zn[0]) == len(zn) else -1     # 청크 전체가 한 구역인가
+        for gy in range(ny):
+            rows = [(gy * ATLAS_CELL + k) * CHUNK for k in range(ATLAS_CELL)]
+            base = (by + gy) * w0 + bx
+            for gx in range(nx):
+                a = gx * ATLAS_CELL
+                # 구역은 칸 안 타일의 최빈값. 대부분은 한 구역이라 count만으로 끝난다
+                z = z_all
+                if z < 0:
+                    z = zn[rows[0] + a]
+                    if sum(zn.count(z, r + a, r + a + ATLAS_CELL) for r in rows) != ATLAS_CELL * ATLAS_CELL:
+                        zs = b"".join(zn[r + a:r + a + ATLAS_CELL] for r in rows)
+                        z = max(set(zs), key=zs.count)
+                zl[base + gx] = z + 1
+                if not explored:
+                    el[base + gx] = xl[base + gx] = pl[base + gx] = 0
+                    continue
+                cnt, bad, bits = 0, 0, 0
+                for r in rows:
+                    i0, i1 = r + a, r + a + ATLAS_CELL
+                    cnt += seen.count(1, i0, i1)
+                    if max(err[i0:i1]) > 0.5:                    # tile_class와 같은 기준
+                        bad += sum(1 for v in err[i0:i1] if v > 0.5)
+                    if inter.count(0, i0, i1) != ATLAS_CELL or item[i0:i1] != _NO_ITEM4:
+                        for i in range(i0, i1):
+                            if seen[i]:
+                                bits |= POI_BITS.get(inter[i], 0) | (POI_ITEM if item[i] >= 0 else 0)
+                el[base + gx] = bad * 255 // (ATLAS_CELL * ATLAS_CELL)
+                xl[base + gx] = cnt * 255 // (ATLAS_CELL * ATLAS_CELL)
+                pl[base + gx] = bits
+        if not propagate:
+            return
+        x0, y0, x1, y1 = bx, by, bx + nx, by + ny
+        for k in range(1, len(self.dims)):
+            x0, y0, x1, y1 = x0 // 2, y0 // 2, (x1 + 1) // 2, (y1 + 1) // 2
+            self._reduce(k, x0, y0, x1, y1)
+
+    def _reduce(self, k: int, x0: int, y0: int, x1: int, y1: int):
+        cw, chh = self.dims[k - 1]
+        pw = self.dims[k][0]
+        cz, ce, cx_, cp = self.zone[k - 1], self.error[k - 1], self.explored[k - 1], self.poi[k - 1]
+        pz, pe, px_, pp = self.zone[k], self.error[k], self.explored[k], self.poi[k]
+        for y in range(y0, y1):
+            ys = [cy for cy in (2 * y, 2 * y + 1) if cy < chh]
+            for x in range(x0, x1):
+                kids = [cy * cw + c for cy in ys for c in (2 * x, 2 * x + 1) if c < cw]
+                zs = [cz[i] for i in kids if cz[i]]
+                j = y * pw + x
+                pz[j] = (zs[0] if zs.count(zs[0]) == len(zs) else max(set(zs), key=zs.count)) if zs else 0
+                pe[j] = sum(ce[i] for i in kids) // len(kids)
+                ex = sum(cx_[i] for i in kids)
+                px_[j] = (ex + len(kids) - 1) // len(kids)      # 올림 — 조금이라도 가 봤으면 남는다
+                bits = 0
+                for i in kids:
+                    bits |= cp[i]
+                pp[j] = bits
+
+    def level_for(self, tiles_per_cell: float) -> int:
+        """화면 한 칸이 덮는 타일 수 이하인 가장 거친 단계"""
+        k = 0
+        while k + 1 < len(self.dims) and self.cell_size(k + 1) <= tiles_per_cell:
+            k += 1
+        return k
+
+    def sample(self, level: int, x: int, y: int) -> Tuple[int, int, int, int]:
+        """월드 좌표 (x,y)가 속한 level 칸의 (구역+1, 오류, 탐색, 지점 비트). 맵 밖은 전부 0"""
+        if not (0 <= x < self.world.w and 0 <= y < self.world.h):
+            return 0, 0, 0, 0
+        c = self.cell_size(level)
+        i = (y // c) * self.dims[level][0] + x // c
+        return self.zone[level][i], self.error[level][i], self.explored[level][i], self.poi[level][i]
 
 
 # ═══════════════════════════════════════════
@@ -472,6 +1341,7 @@ class Player:
     job_desc: str = ""
     stats: Stats = field(default_factory=Stats)
     inventory: Inventory = field(default_factory=Inventory)
+    stash: Inventory = field(default_factory=lambda: Inventory(STASH_SLOTS, max_weight=math.inf))
     reputation: ReputationSystem = field(default_factory=ReputationSystem)
 
     # 감정 수치
@@ -518,8 +1388,8 @@ class Player:
 # ═══════════════════════════════════════════
 #  § 11. 맵 생성
 # ═══════════════════════════════════════════
-def _zone_at(x, y) -> Zone:
-    cx, cy = x / MAP_W, y / MAP_H
+def _zone_at(x, y, w=MAP_W, h=MAP_H) -> Zone:
+    cx, cy = x / w, y / h
     dc = math.hypot(cx - 0.5, cy - 0.5)
     if dc < 0.15:                        return Zone.LOW_SIGNAL
     if cx < 0.5 and cy < 0.5:           return Zone.NEON_COMMERCIAL
@@ -527,110 +1397,151 @@ def _zone_at(x, y) -> Zone:
     if cx < 0.5 and cy >= 0.5:          return Zone.RESIDENTIAL
     return Zone.INDUSTRIAL
 
-def generate_map() -> List[List[Tile]]:
-    tiles = [[Tile() for _ in range(MAP_W)] for _ in range(MAP_H)]
-    for y in range(MAP_H):
-        for x in range(MAP_W):
-            z = _zone_at(x, y)
-            t = tiles[y][x]
-            t.zone = z
-            r = random.random()
-            if r < 0.10:   t.char = T_BUILD;  t.walkable = False
-            elif r < 0.14: t.char = T_WALL;   t.walkable = False
-            elif r < 0.18: t.char = T_ROAD;   t.walkable = True
+# 타일당 기대 개수 (100×100 기준 단말 20 / 문 15 / CCTV 12 / 아이템 25 / NPC 100 / 적 60)
+OBJ_DENSITY   = dict(terminal=0.0020, door=0.0015, cctv=0.0012, item=0.0025)
+NPC_DENSITY   = 0.010
+ENEMY_DENSITY = 0.006
+
+def _scaled_count(rng: random.Random, area: int, density: float) -> int:
+    """기대값 area*density 를 확률적으로 반올림"""
+    v = area * density
+    return int(v) + (rng.random() < v - int(v))
+
+def _chunk_extent(world: World, ck: Chunk) -> Tuple[int, int]:
+    return min(CHUNK, world.w - ck.ox), min(CHUNK, world.h - ck.oy)
+
+def generate_chunk(world: World, cx: int, cy: int) -> Chunk:
+    ck  = Chunk(cx, cy)
+    rng = random.Random(chunk_seed(world.seed, cx, cy))
+    bw, bh = _chunk_extent(world, ck)
+    ch, zn, wk, ne, er = ck.char, ck.zone, ck.walkable, ck.neon, ck.error
+    c_build, c_wall, c_road = CHAR_CODE[T_BUILD], CHAR_CODE[T_WALL], CHAR_CODE[T_ROAD]
+    c_neon, c_err = CHAR_CODE[T_NEON], CHAR_CODE[T_ERROR]
+    for ly in range(CHUNK):
+        row = ly * CHUNK
+        for lx in range(CHUNK):
+            i = row + lx
+            if lx >= bw or ly >= bh:     # 맵 바깥 (가장자리 청크)
+                ch[i] = c_wall; wk[i] = 0
+                continue
+            z = _zone_at(ck.ox + lx, ck.oy + ly, world.w, world.h)
+            zn[i] = z.value
+            r = rng.random()
+            if r < 0.10:   ch[i] = c_build; wk[i] = 0
+            elif r < 0.14: ch[i] = c_wall;  wk[i] = 0
+            elif r < 0.18: ch[i] = c_road
             elif r < 0.20 and z == Zone.NEON_COMMERCIAL:
-                t.char = T_NEON; t.is_neon = True
+                ch[i] = c_neon; ne[i] = 1
             elif r < 0.22 and z in (Zone.INDUSTRIAL, Zone.LOW_SIGNAL):
-                t.char = T_ERROR; t.error_level = random.uniform(0.3, 0.8)
-            else:
-                t.char = T_FLOOR
-
-            if z == Zone.NEON_COMMERCIAL and random.random() < 0.04 and t.walkable:
-                t.is_neon = True; t.char = T_NEON
-
-    # 상호작용 오브젝트 배치
-    for _ in range(20):
-        x, y = random.randint(0, MAP_W-1), random.randint(0, MAP_H-1)
-        if tiles[y][x].walkable:
-            tiles[y][x].interactive = "terminal"
-            tiles[y][x].char = T_TERM
-    for _ in range(15):
-        x, y = random.randint(0, MAP_W-1), random.randint(0, MAP_H-1)
-        if not tiles[y][x].walkable:
-            tiles[y][x].interactive = "door"
-            tiles[y][x].char = T_DOOR
-            tiles[y][x].walkable = False
-    for _ in range(12):
-        x, y = random.randint(0, MAP_W-1), random.randint(0, MAP_H-1)
-        if tiles[y][x].walkable:
-            tiles[y][x].interactive = "cctv"
-            tiles[y][x].char = T_CCTV
-    for _ in range(25):
-        x, y = random.randint(0, MAP_W-1), random.randint(0, MAP_H-1)
-        if tiles[y][x].walkable:
-            tiles[y][x].item_drop = random.choice(list(ITEM_DB.keys()))
-            tiles[y][x].char = T_ITEM
-
-    # 플레이어 시작점 클리어
-    cx, cy = MAP_W // 2, MAP_H // 2
-    for dy in range(-4, 5):
-        for dx in range(-4, 5):
-            nx, ny = cx+dx, cy+dy
-            if 0 <= nx < MAP_W and 0 <= ny < MAP_H:
-                t = tiles[ny][nx]
-                t.char = T_FLOOR; t.walkable = True
-                t.interactive = ""; t.item_drop = None
-    return tiles
-
-def generate_npcs(tiles) -> List[NPC]:
+                ch[i] = c_err; er[i] = rng.uniform(0.3, 0.8)
+
+            if z == Zone.NEON_COMMERCIAL and rng.random() < 0.04 and wk[i]:
+                ne[i] = 1; ch[i] = c_neon
+
+    # 플레이어 시작점 클리어 (스폰 칸 목록을 만들기 전에 통행부터)
+    sx, sy = world.w // 2, world.h // 2
+    start = [(y - ck.oy) * CHUNK + (x - ck.ox)
+             for y in range(max(sy - 4, ck.oy), min(sy + 5, ck.oy + bh))
+             for x in range(max(sx - 4, ck.ox), min(sx + 5, ck.ox + bw))]
+    c_floor = CHAR_CODE[T_FLOOR]
+    for i in start:
+        ch[i] = c_floor; wk[i] = 1; ne[i] = 0; er[i] = 0.0
+
+    # 상호작용 오브젝트 배치. 문은 막힌 칸에, 나머지는 드나들 수 있는 통행 칸 목록에서 뽑는다
+    area = bw * bh
+    for _ in range(_scaled_count(rng, area, OBJ_DENSITY["door"])):
+        t = Tile(ck, rng.randrange(bh) * CHUNK + rng.randrange(bw))
+        if not t.walkable:
+            t.interactive = "door"
+            t.char = T_DOOR
+    spots = spawn_spots(world, ck)
+    def probe() -> Optional[Tile]:
+        return Tile(ck, rng.choice(spots)) if spots else None
+    for _ in range(_scaled_count(rng, area, OBJ_DENSITY["terminal"])):
+        t = probe()
+        if t:
+            t.interactive = "terminal"
+            t.char = T_TERM
+    for _ in range(_scaled_count(rng, area, OBJ_DENSITY["cctv"])):
+        t = probe()
+        if t:
+            t.interactive = "cctv"
+            t.char = T_CCTV
+    for _ in range(_scaled_count(rng, area, OBJ_DENSITY["item"])):
+        t = probe()
+        if t:
+            t.item_drop = rng.choice(ITEM_IDS)
+            t.char = T_ITEM
+    for i in start:
+        ch[i] = c_floor; ck.interactive[i] = 0; ck.item[i] = -1
+    restyle_chunk(ck)
+    return ck
+
+def _zone_areas(world: World, ck: Chunk) -> List[Tuple[Zone, int]]:
+    """청크 안(맵 안쪽) 구역별 칸 수"""
+    bw, bh = _chunk_extent(world, ck)
+    counts = [0] * len(ZONE_BY_CODE)
+    for ly in range(bh):
+        row = ck.zone[ly * CHUNK: ly * CHUNK + bw]
+        for z in set(row):
+            counts[z] += row.count(z)
+    return [(ZONE_BY_CODE[z], n) for z, n in enumerate(counts) if n]
+
+NPC_ROLES   = ["stranger", "merchant", "quest", "faction"]
+NPC_WEIGHTS = [60, 15, 10, 15]
+
+def make_npc(role: str, x: int, y: int, zone: Zone, rng: random.Random) -> NPC:
+    npc = NPC(x=x, y=y, role=role, zone=zone)
+    if role == "merchant":
+        npc.char = T_MERCH
+        npc.name = "상인"
+        npc.shop_inv = rng.sample(list(ITEM_DB.keys()), min(4, len(ITEM_DB)))
+    elif role == "quest":
+        npc.name = "의뢰인"
+        available = [q for q in QUEST_POOL]
+        if available:
+            npc.quest_id = rng.choice(available).id
+    elif role == "faction":
+        npc.faction = rng.choice(["CORP", "CITIZENS", "GHOSTS"])
+        npc.name = {"CORP":"기업원","CITIZENS":"시민군","GHOSTS":"고스트"}[npc.faction]
+    return npc
+
+def generate_chunk_npcs(world: World, ck: Chunk) -> List[NPC]:
+    """구역마다 면적 비례 개수를 그 구역 스폰 칸에서 뽑는다 (재시도 없음)"""
+    rng = random.Random(chunk_seed(world.seed, ck.cx, ck.cy) ^ 0x4E5043)
     npcs = []
-    roles = ["stranger"]*60 + ["merchant"]*15 + ["quest"]*10 + ["faction"]*15
-    random.shuffle(roles)
-    att = 0
-    for role in roles:
-        placed = False
-        while not placed and att < 10000:
-            att += 1
-            x = random.randint(1, MAP_W-2)
-            y = random.randint(1, MAP_H-2)
-            if tiles[y][x].walkable:
-                z = tiles[y][x].zone
-                npc = NPC(x=x, y=y, role=role, zone=z)
-                if role == "merchant":
-                    npc.char = T_MERCH
-                    npc.name = "상인"
-                    npc.shop_inv = random.sample(list(ITEM_DB.keys()), min(4, len(ITEM_DB)))
-                elif role == "quest":
-                    npc.name = "의뢰인"
-                    available = [q for q in QUEST_POOL]
-                    if available:
-                        npc.quest_id = random.choice(available).id
-                elif role == "faction":
-                    npc.faction = random.choice(["CORP", "CITIZENS", "GHOSTS"])
-                    npc.name = {"CORP":"기업원","CITIZENS":"시민군","GHOSTS":"고스트"}[npc.faction]
-                npcs.append(npc)
-                placed = True
+    for z, area in _zone_areas(world, ck):
+        spots = spawn_spots(world, ck, z)
+        for _ in range(_scaled_count(rng, area, NPC_DENSITY)):
+            role = rng.choices(NPC_ROLES, NPC_WEIGHTS)[0]
+            if spots:
+                i = rng.choice(spots)
+                npcs.append(make_npc(role, ck.ox + (i & CHUNK_MASK), ck.oy + (i >> CHUNK_SHIFT), z, rng))
     return npcs
 
-def generate_enemies(tiles) -> List[Enemy]:
+ENEMY_TYPES_BY_ZONE = {
+    Zone.NEON_COMMERCIAL:  ["drone"],
+    Zone.RESIDENTIAL:      ["gang", "drone"],
+    Zone.LOW_SIGNAL:       ["gang", "error"],
+    Zone.INDUSTRIAL:       ["drone", "error"],
+    Zone.ROOFTOP_NETWORK:  ["drone", "gang"],
+}
+
+def generate_chunk_enemies(world: World, ck: Chunk) -> List[Enemy]:
+    rng = random.Random(chunk_seed(world.seed, ck.cx, ck.cy) ^ 0x454E4D)
     enemies = []
-    types_by_zone = {
-        Zone.NEON_COMMERCIAL:  ["drone"],
-        Zone.RESIDENTIAL:      ["gang", "drone"],
-        Zone.LOW_SIGNAL:       ["gang", "error"],
-        Zone.INDUSTRIAL:       ["drone", "error"],
-        Zone.ROOFTOP_NETWORK:  ["drone", "gang"],
-    }
-    cx, cy = MAP_W // 2, MAP_H // 2
-    for _ in range(60):
-        x = random.randint(1, MAP_W-2)
-        y = random.randint(1, MAP_H-2)
-        if abs(x - cx) < 15 and abs(y - cy) < 15:
-            continue   # 스타트 지점 15칸 이내 스폰 금지
-        if tiles[y][x].walkable:
-            z = _zone_at(x, y)
-            etype = random.choice(types_by_zone.get(z, ["gang"]))
-            enemies.append(make_enemy(etype, x, y))
+    cx, cy = world.w // 2, world.h // 2
+    for z, area in _zone_areas(world, ck):
+        spots = spawn_spots(world, ck, z)
+        types = ENEMY_TYPES_BY_ZONE.get(z, ["gang"])
+        for _ in range(_scaled_count(rng, area, ENEMY_DENSITY)):
+            if not spots:
+                break
+            i = rng.choice(spots)
+            x, y = ck.ox + (i & CHUNK_MASK), ck.oy + (i >> CHUNK_SHIFT)
+            if abs(x - cx) < 15 and abs(y - cy) < 15:
+                continue   # 스타트 지점 15칸 이내 스폰 금지
+            enemies.append(make_enemy(rng.choice(types), x, y))
     return enemies
 
 
@@ -652,13 +1563,25 @@ class CombatState:
         if len(self.log) > 8:
             self.log.pop(0)
 
-def player_attack(cs: CombatState, player: Player) -> str:
+# 피해 공식 — 게임(정수)과 밸런스 시뮬레이터(NumPy 배열)가 함께 쓴다.
+# 배열일 때는 mx=np.maximum
+PLAYER_ROLL = 3       # 플레이어 공격 편차 ±
+ENEMY_ROLL  = 2       # 적 공격 편차 ±
+SKILL_MULT  = 2       # 강타 배율 (전투 Lv3+)
+
+def strike(atk, roll, combat_lv, mx=max):
+    """플레이어 일반 공격의 방어 전 피해"""
+    return mx(1, atk + roll) + combat_lv // 2
+
+def mitigate(dmg, defense, mx=max):
+    """방어력 적용 후 실제 피해 (최소 1)"""
+    return mx(1, dmg - defense)
+
+def player_attack(cs: CombatState, player: Player, rng: random.Random = random) -> str:
     base = player.stats.total_attack(player.inventory)
-    variance = random.randint(-3, 3)
-    dmg = max(1, base + variance)
-    # 전투 스킬 보너스
-    combat_level = player.stats.skills["combat"].level
-    dmg += combat_level // 2
+    # 전투 스킬 보너스 포함
+    dmg = strike(base, rng.randint(-PLAYER_ROLL, PLAYER_ROLL),
+                 player.stats.skills["combat"].level)
     actual = cs.enemy.take_damage(dmg)
     player.stats.skill_xp("combat", 8)
     return f"공격! {actual} 피해"
@@ -666,7 +1589,7 @@ def player_attack(cs: CombatState, player: Player) -> str:
 def player_skill_use(cs: CombatState, player: Player) -> str:
     level = player.stats.skills["combat"].level
     if level >= 3:
-        dmg = player.stats.total_attack(player.inventory) * 2
+        dmg = player.stats.total_attack(player.inventory) * SKILL_MULT
         actual = cs.enemy.take_damage(dmg)
         return f"강타! {actual} 대미지"
     elif level >= 2:
@@ -675,11 +1598,12 @@ def player_skill_use(cs: CombatState, player: Player) -> str:
     else:
         return "스킬 부족 (전투Lv2 필요)"
 
-def enemy_attack(cs: CombatState, player: Player) -> str:
+def enemy_attack(cs: CombatState, player: Player, rng: random.Random = random) -> str:
     if not cs.enemy:
         return ""
     base = cs.enemy.attack
-    dmg = max(1, base + random.randint(-2, 2) - player.stats.total_defense(player.inventory))
+    dmg = mitigate(base + rng.randint(-ENEMY_ROLL, ENEMY_ROLL),
+                   player.stats.total_defense(player.inventory))
     player.stats.hp = max(0, player.stats.hp - dmg)
     player.stats.stress = min(100, player.stats.stress + 10)
     player.stats.clamp()
@@ -714,50 +1638,905 @@ EVENTS_BY_ZONE = {
 
 @dataclass
 class EventLog:
+    """화면 하단 로그 (최근 7줄). 버스에 MESSAGE를 받을 쪽이 있으면 문장도 레코드로 남긴다"""
     messages: deque = field(default_factory=lambda: deque(maxlen=7))
     active: Optional[str] = None
     active_timer: float = 0.0
+    bus: Optional["EventBus"] = field(default=None, repr=False, compare=False)
 
     def push(self, msg: str):
+        if self.bus and self.bus.wants(Ev.MESSAGE):
+            self.bus.publish(Ev.MESSAGE, key=msg)
         self.messages.appendleft(msg)
         self.active = msg
-        self.active_timer = time.time()
+        self.active_timer = 0.0
 
-    def tick(self):
-        if self.active and time.time() - self.active_timer > 3.5:
-            self.active = None
+    def tick(self, dt: float):
+        if self.active:
+            self.active_timer += dt
+            if self.active_timer > 3.5:
+                self.active = None
+
+
+# ── 이벤트 버스 ──
+# 게임 사실(전투 결과, 구매, 퀘스트 진행 …)을 고정 크기 레코드로 미리 잡아 둔 링 버퍼에 쌓는다.
+# 소비자는 두 부류다. on()으로 건 핸들러는 publish 안에서 바로 불리고 (퀘스트 트리거, 알림),
+# 커서를 든 쪽(EventWriter)은 나중에 밀린 구간을 한꺼번에 읽는다. 링이 한 바퀴 돌 때까지
+# 못 읽은 레코드는 덮어쓰여 잃는다 (writer.lost).
+EVENT_RING      = 4096        # 링 버퍼 레코드 수 (2의 거듭제곱)
+EVENT_FLUSH_SEC = 1.0         # 이벤트 파일 쓰기 주기
+EVENT_VERSION   = 1
+
+class Ev(IntEnum):
+    """버스 레코드 종류. a/b/key의 뜻은 종류마다 다르다"""
+    MESSAGE = 1     # key: 화면 로그 문장
+    GAME    = 2     # a: GameEvent 값, key: 이벤트 키 (퀘스트 목표가 구독)
+    COMBAT  = 3     # a: EV_START~EV_FLEE, b: 시작이면 적 HP / 승리면 보상 XP, key: 적 id
+    BUY     = 4     # a: 지불한 가격, key: 아이템 id
+    QUEST   = 5     # a: 목표 번호 (퀘스트 완료면 -1), b: 진행도 (완료면 보상 크레딧), key: 퀘스트 id
+    LEVEL   = 6     # a: 새 레벨
+    SESSION = 7     # a: EV_NEW~EV_END, b: 월드 시드 & EV_SEED_MASK
+
+EV_START, EV_WIN, EV_LOSE, EV_FLEE = range(4)               # Ev.COMBAT
+EV_NEW, EV_LOAD, EV_JOIN, EV_LEAVE, EV_END = range(5)       # Ev.SESSION
+EV_SEED_MASK = 0x7FFFFFFF                                   # a/b 칸은 부호 있는 32비트
+COMBAT_RESULTS = ("start", "win", "lose", "flee")
+SESSION_KINDS  = ("new", "load", "join", "leave", "end")
+
+class EventBus:
+    """게임 사실 링 버퍼 (SoA). publish는 배열 몇 칸에 쓰고 그 종류의 핸들러를 부르는 것이
+    전부다. 틱과 위치는 gs에서, 행위자는 who(서버에서는 처리 중인 세션 ID)에서 채운다"""
+    def __init__(self, gs: "GameState", size: int = EVENT_RING):
+        self.gs   = gs
+        self.mask = size - 1
+        self.kind  = bytearray(size)
+        self.actor = array("H", bytes(2 * size))
+        self.tick  = array("I", bytes(4 * size))
+        self.x     = array("H", bytes(2 * size))
+        self.y     = array("H", bytes(2 * size))
+        self.a     = array("i", bytes(4 * size))
+        self.b     = array("i", bytes(4 * size))
+        self.key: List[Optional[str]] = [None] * size
+        self.seq = 0                # 지금까지 발행한 레코드 수
+        self.who = 0
+        self.followers = 0          # 커서로 전부 읽어 가는 소비자 수 (EventWriter)
+        self.handlers: Dict[Ev, list] = {}
+
+    def on(self, kind: Ev, fn):
+        """fn(a, b, key)를 kind 레코드가 발행될 때마다 부른다"""
+        self.handlers.setdefault(kind, []).append(fn)
+
+    def wants(self, kind: Ev) -> bool:
+        """kind를 받을 소비자가 있는지. 잦은 발행처는 이걸 먼저 보고 건너뛴다"""
+        return self.followers > 0 or kind in self.handlers
+
+    def publish(self, kind: Ev, a: int = 0, b: int = 0, key: Optional[str] = None):
+        gs, i = self.gs, self.seq & self.mask
+        self.kind[i], self.actor[i], self.tick[i] = kind, self.who, gs.ticks
+        self.x[i], self.y[i] = gs.player.x, gs.player.y
+        self.a[i], self.b[i], self.key[i] = a, b, key
+        self.seq += 1
+        for fn in self.handlers.get(kind, ()):
+            fn(a, b, key)
+
+    def since(self, seq: int) -> Tuple[int, int]:
+        """seq 이후 아직 링에 남은 구간 [lo, hi). lo > seq면 그 사이는 덮어쓰였다"""
+        return max(seq, self.seq - self.mask - 1), self.seq
+
+
+# 이벤트 파일 (리틀 엔디언, 추가 전용):
+#   헤더 <4s H>          매직 NDEV, 버전 (빈 파일에 처음 쓸 때만)
+#   키 정의 <B H H> + utf-8  첫 바이트 0, 키 번호, 길이. 번호 0은 키 표 초기화 (쓰기 시작마다)
+#   레코드 <B H I H H i i H> 종류, 행위자, 틱, x, y, a, b, 키 번호 (0이면 없음)
+# 같은 문자열은 처음 한 번만 정의하고 이후에는 번호로 가리킨다.
+_EV_HDR = struct.Struct("<4sH")
+_EV_KEY = struct.Struct("<BHH")
+_EV_REC = struct.Struct("<BHIHHiiH")
+
+class EventWriter:
+    """버스를 커서로 따라가며 EVENT_FLUSH_SEC마다 밀린 레코드를 한 덩어리로 인코딩하고,
+    파일 쓰기는 스레드 풀로 넘긴다. 게임 루프가 내는 비용은 publish뿐이다"""
+    def __init__(self, bus: EventBus, path: str):
+        self.bus, self.path = bus, path
+        bus.followers += 1
+        self.cursor = 0
+        self.keys: Dict[str, int] = {}
+        self.lost = 0               # 읽기 전에 덮어쓰인 레코드 수
+        self.written = 0            # 파일에 쓴 바이트 수
+        self.failed: Optional[str] = None
+        self._fresh = True          # 처음 쓰는 덩어리는 키 표 초기화로 시작
+        self._pending: Optional[asyncio.Future] = None
+
+    def batch(self) -> bytes:
+        bus = self.bus
+        lo, hi = bus.since(self.cursor)
+        self.lost += lo - self.cursor
+        self.cursor = hi
+        if lo == hi:
+            return b""
+        out = bytearray()
+        if self._fresh:
+            out += _EV_KEY.pack(0, 0, 0)
+            self._fresh = False
+        keys, pack, mask = self.keys, _EV_REC.pack, bus.mask
+        for n in range(lo, hi):
+            i = n & mask
+            k, kid = bus.key[i], 0
+            if k is not None:
+                kid = keys.get(k, 0)
+                if not kid:
+                    if len(keys) >= 0xFFFF:
+                        keys.clear()
+                        out += _EV_KEY.pack(0, 0, 0)
+                    kid = keys[k] = len(keys) + 1
+                    raw = k.encode("utf-8")[:0xFFFF]
+                    out += _EV_KEY.pack(0, kid, len(raw)) + raw
+            out += pack(bus.kind[i], bus.actor[i], bus.tick[i], bus.x[i], bus.y[i],
+                        bus.a[i], bus.b[i], kid)
+        return bytes(out)
+
+    def write(self, data: bytes):
+        """파일 끝에 붙인다 (스레드 풀에서 불린다)"""
+        with open(self.path, "ab") as f:
+            if f.tell() == 0:
+                f.write(_EV_HDR.pack(b"NDEV", EVENT_VERSION))
+            f.write(data)
+        self.written += len(data)
+
+    async def flush(self):
+        data = self.batch()
+        if not data or self.failed:
+            return
+        self._pending = asyncio.get_running_loop().run_in_executor(None, self.write, data)
+        try:
+            await asyncio.shield(self._pending)     # 취소돼도 쓰던 덩어리는 마저 쓴다
+        except OSError as e:
+            self.failed = e.strerror or str(e)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(EVENT_FLUSH_SEC)
+            await self.flush()
+
+    async def close(self):
+        """run을 취소한 뒤 부른다. 쓰던 덩어리를 기다리고 남은 레코드를 마저 쓴다"""
+        if self._pending:
+            try:
+                await self._pending
+            except OSError:
+                pass
+        await self.flush()
+
+
+def read_events(path: str):
+    """이벤트 파일 → (종류, 행위자, 틱, x, y, a, b, 키) 튜플들. 끝이 잘린 레코드는 버린다"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _EV_HDR.size:
+        raise ValueError("빈 이벤트 파일")
+    magic, ver = _EV_HDR.unpack_from(data)
+    if magic != b"NDEV" or ver != EVENT_VERSION:
+        raise ValueError(f"이벤트 파일 아님: {path}")
+    off, end = _EV_HDR.size, len(data)
+    keys: Dict[int, Optional[str]] = {0: None}
+    while off < end:
+        if data[off] == 0:
+            if off + _EV_KEY.size > end:
+                break
+            _, kid, n = _EV_KEY.unpack_from(data, off)
+            off += _EV_KEY.size
+            if not kid:
+                keys = {0: None}
+                continue
+            if off + n > end:
+                break
+            keys[kid] = data[off:off + n].decode("utf-8", "replace")
+            off += n
+            continue
+        if off + _EV_REC.size > end:
+            break
+        kind, actor, tick, x, y, a, b, kid = _EV_REC.unpack_from(data, off)
+        off += _EV_REC.size
+        yield Ev(kind), actor, tick, x, y, a, b, keys.get(kid)
 
 
 # ═══════════════════════════════════════════
 #  § 14. 게임 상태 통합
 # ═══════════════════════════════════════════
-class GameState:
+class RngStreams:
+    """GameState 전용 시드 난수 스트림. 서로 독립이라 한 계통의 호출 횟수가
+    바뀌어도 다른 계통의 난수열은 그대로다. 월드 생성은 청크별 시드를 쓴다."""
+    STREAMS = ("world", "combat", "events", "ai", "npc")
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        for i, name in enumerate(self.STREAMS):
+            setattr(self, name, random.Random(chunk_seed(seed, 0x5EED, i + 1)))
+
+
+class SpatialIndex:
+    """균일 격자 버킷 공간 해시. 객체는 x, y 속성을 가져야 한다"""
+    def __init__(self, shift: int = 3):
+        self.shift = shift                       # 버킷 크기 = 1 << shift
+        self.buckets: Dict[Tuple[int,int], list] = {}
+        self.count = 0
+
+    def _key(self, x: int, y: int) -> Tuple[int,int]:
+        return (x >> self.shift, y >> self.shift)
+
+    def add(self, obj):
+        self.buckets.setdefault(self._key(obj.x, obj.y), []).append(obj)
+        self.count += 1
+
+    def remove(self, obj) -> bool:
+        key = self._key(obj.x, obj.y)
+        b = self.buckets.get(key)
+        if b:
+            for i, o in enumerate(b):
+                if o is obj:
+                    b[i] = b[-1]; b.pop()
+                    if not b:
+                        del self.buckets[key]
+                    self.count -= 1
+                    return True
+        return False
+
+    def move(self, obj, nx: int, ny: int):
+        if self._key(obj.x, obj.y) == self._key(nx, ny):
+            obj.x, obj.y = nx, ny
+            return
+        self.remove(obj)
+        obj.x, obj.y = nx, ny
+        self.add(obj)
+
+    def in_rect(self, x0: int, y0: int, x1: int, y1: int):
+        """x0<=x<=x1, y0<=y<=y1 안의 객체"""
+        s = self.shift
+        for by in range(y0 >> s, (y1 >> s) + 1):
+            for bx in range(x0 >> s, (x1 >> s) + 1):
+                b = self.buckets.get((bx, by))
+                if b:
+                    for o in b:
+                        if x0 <= o.x <= x1 and y0 <= o.y <= y1:
+                            yield o
+
+    def near(self, x: int, y: int, r: int):
+        """맨해튼 거리 r 이내의 객체"""
+        for o in self.in_rect(x - r, y - r, x + r, y + r):
+            if abs(o.x - x) + abs(o.y - y) <= r:
+                yield o
+
+    def first_near(self, x: int, y: int, r: int = 1):
+        return next(self.near(x, y, r), None)
+
+    def order(self, objs: list) -> List[int]:
+        """버킷 안 순서대로 늘어놓은 objs 번호. 이 순서로 다시 add하면 버킷마다 순서가
+        같아진다 (remove가 자리를 바꾸므로 목록 순서로 다시 넣으면 질의 순서가 달라진다)"""
+        at = {id(o): i for i, o in enumerate(objs)}
+        return [at[id(o)] for b in self.buckets.values() for o in b if id(o) in at]
+
+
+class SampleSet:
+    """O(1) 추가/삭제/무작위 선택이 되는 집합 (리스트 + 위치 사전)"""
+    __slots__ = ("items", "pos")
+
     def __init__(self):
-        self.tiles   = generate_map()
-        self.player  = Player()
-        self.npcs    = generate_npcs(self.tiles)
-        self.enemies = generate_enemies(self.tiles)
+        self.items: list = []
+        self.pos: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, v) -> bool:
+        return v in self.pos
+
+    def add(self, v):
+        if v not in self.pos:
+            self.pos[v] = len(self.items)
+            self.items.append(v)
+
+    def discard(self, v):
+        i = self.pos.pop(v, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.pos[last] = i
+
+    def choice(self, rng: random.Random):
+        return self.items[int(rng.random() * len(self.items))]
+
+
+_DIRS4 = [(0,1),(0,-1),(1,0),(-1,0)]
+
+class ErrorAutomaton:
+    """오류 확산 셀룰러 오토마톤.
+    error_level > 0.5 인 칸 중 아직 번질 이웃이 있는 칸만 frontier에 두어
+    매 스텝 원천 선택이 O(1)이다. 이웃이 모두 막힌 원천은 뽑혔을 때 퇴출한다."""
+    SOURCE   = 0.5      # 원천 판정 임계값
+    SUSCEPT  = 0.3      # 이 값 미만인 이웃만 감염
+    CHANCE   = 0.25
+    AMOUNT   = 0.2
+
+    def __init__(self, world: World):
+        self.world = world
+        self.frontier = SampleSet()
+
+    def add_chunk(self, ck: Chunk):
+        """새 청크의 원천 + 이웃 청크 경계의 원천을 frontier에 등록"""
+        err = ck.error
+        for i in range(CHUNK * CHUNK):
+            if err[i] > self.SOURCE:
+                self.frontier.add((ck.ox + (i & CHUNK_MASK), ck.oy + (i >> CHUNK_SHIFT)))
+        chunks = self.world.chunks
+        for (dx, dy) in _DIRS4:
+            nb = chunks.get((ck.cx + dx, ck.cy + dy))
+            if nb is None:
+                continue
+            if dx:
+                lx = 0 if dx > 0 else CHUNK_MASK
+                cells = [ly * CHUNK + lx for ly in range(CHUNK)]
+            else:
+                ly = 0 if dy > 0 else CHUNK_MASK
+                cells = [ly * CHUNK + lx for lx in range(CHUNK)]
+            for i in cells:
+                if nb.error[i] > self.SOURCE:
+                    self.frontier.add((nb.ox + (i & CHUNK_MASK), nb.oy + (i >> CHUNK_SHIFT)))
+
+    def restore(self, cells: List[List[int]]):
+        """저장된 frontier를 순서 그대로 복원. 이후 스냅샷 복원 청크는 다시 등록하지 않는다"""
+        self.frontier = SampleSet()
+        for x, y in cells:
+            self.frontier.add((x, y))
+        if self.add_chunk in self.world.on_restore:
+            self.world.on_restore.remove(self.add_chunk)
+
+    def notify(self, x: int, y: int, level: float):
+        """외부에서 error_level을 바꿨을 때 frontier 동기화"""
+        if level > self.SOURCE:
+            self.frontier.add((x, y))
+        else:
+            self.frontier.discard((x, y))
+
+    def step(self, rng: random.Random, n: int = 1) -> int:
+        """확산 이벤트 n회 실행. 새로 오류 타일이 된 칸 수를 반환"""
+        frontier, chunks = self.frontier, self.world.chunks
+        ww, wh = self.world.w, self.world.h
+        stored = self.world.snapshot.table if self.world.snapshot else ()
+        c_err = CHAR_CODE[T_ERROR]
+        created = 0
+        for _ in range(n):
+            if not frontier:
+                break
+            ox, oy = frontier.choice(rng)
+            live = False
+            for dx, dy in _DIRS4:
+                nx, ny = ox + dx, oy + dy
+                if not (0 <= nx < ww and 0 <= ny < wh):
+                    continue
+                key = (nx >> CHUNK_SHIFT, ny >> CHUNK_SHIFT)
+                ck = chunks.get(key)
+                if ck is None:
+                    if key not in stored:
+                        live = True          # 아직 생성 안 된 청크 — 나중에 번질 수 있음
+                        continue
+                    ck = self.world.chunk(*key)  # 저장만 되어 있던 청크 — 저장 전과 같게 복원
+                i = ((ny & CHUNK_MASK) << CHUNK_SHIFT) | (nx & CHUNK_MASK)
+                if not ck.walkable[i] or ck.error[i] >= self.SUSCEPT:
+                    continue
+                live = True
+                if rng.random() < self.CHANCE:
+                    ck.error[i] += self.AMOUNT
+                    if ck.error[i] > self.SOURCE:
+                        ck.char[i] = c_err
+                        ck.sclass[i] = tile_class(ck, i)
+                        ck.paint += 1
+                        ck.cost_version += 1    # 통행은 그대로, 경로 비용만 바뀌었다
+                        self.world.atlas.dirty.add((ck.cx, ck.cy))
+                        frontier.add((nx, ny))
+                        created += 1
+            if not live:
+                frontier.discard((ox, oy))
+        return created
+
+
+class FlowField:
+    """목표 지점(플레이어)에서 시작하는 BFS 거리 지도.
+    목표 주변 (2r+1)² 창 안에서만 계산한다. 창 안 청크의 version이 바뀌었거나
+    목표가 마지막 계산 지점에서 slack칸 넘게 벗어난 뒤 처음 조회될 때만 다시 만든다.
+    추적자는 이웃 4칸 중 거리가 더 작은 칸으로 가면 되므로 추적자 수와 상관없이
+    한 걸음이 O(1)이다. 옛 목표 지점에 이미 닿은 추적자는 실제 목표로 직진한다."""
+    UNREACHED = 0xFFFF
+
+    def __init__(self, world: World, radius: int = FLOW_RADIUS, slack: int = 2):
+        self.world  = world
+        self.r      = radius
+        self.slack  = slack
+        self.size   = 2 * radius + 1
+        self.stride = self.size + 2     # 테두리 1칸 패딩 — BFS에서 경계 검사 생략
+        self.dist   = array('H', [self.UNREACHED]) * (self.stride * self.stride)
+        self.ox = self.oy = 0
+        self.tx = self.ty = -1          # dist가 반영하는 목표
+        self.gx = self.gy = -1          # 현재 목표
+        self._versions = None
+        self._built    = None
+        self.rebuilds  = 0
+
+    def set_target(self, x: int, y: int):
+        """틱마다 한 번 호출. 다시 계산할지는 첫 조회 때 결정"""
+        r, w = self.r, self.world
+        cx0, cx1 = max(0, x - r) >> CHUNK_SHIFT, min(w.w - 1, x + r) >> CHUNK_SHIFT
+        cy0, cy1 = max(0, y - r) >> CHUNK_SHIFT, min(w.h - 1, y + r) >> CHUNK_SHIFT
+        chunks = w.chunks
+        self._versions = (w, cx0, cy0, tuple(
+            ck.version if ck else -1
+            for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)
+            for ck in (chunks.get((cx, cy)),)))
+        self.gx, self.gy = x, y
+
+    def _stale(self) -> bool:
+        return (self._built != self._versions
+                or abs(self.gx - self.tx) + abs(self.gy - self.ty) > self.slack)
+
+    def _rebuild(self):
+        w, tx, ty = self.world, self.gx, self.gy
+        self._built = self._versions
+        self.tx, self.ty = tx, ty
+        self.rebuilds += 1
+        S, r = self.size, self.r
+        ox, oy = tx - r, ty - r
+        self.ox, self.oy = ox, oy
+
+        # 창 안 통행 가능 여부 (맵 밖/미생성 청크/패딩은 0)
+        W = self.stride
+        pas = bytearray(W * W)
+        chunks = w.chunks
+        x_lo, x_hi = max(ox, 0), min(ox + S, w.w)
+        for wy in range(S):
+            y = oy + wy
+            if not 0 <= y < w.h:
+                continue
+            row, base = (y & CHUNK_MASK) * CHUNK, (wy + 1) * W + 1 - ox
+            x = x_lo
+            while x < x_hi:
+                seg = min(x_hi, (x | CHUNK_MASK) + 1)
+                ck = chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+                if ck is not None:
+                    a = row + (x & CHUNK_MASK)
+                    pas[base + x: base + seg] = ck.walkable[a: a + seg - x]
+                x = seg
+
+        # 방문한 칸은 pas를 0으로 지워 검사 한 번으로 끝낸다
+        dist = self.dist = array('H', [self.UNREACHED]) * (W * W)
+        start = (r + 1) * W + r + 1
+        dist[start] = 0
+        pas[start] = 0
+        frontier = [start]
+        d = 0
+        while frontier:
+            d += 1
+            nxt = []
+            for i in frontier:
+                for j in (i - W, i + W, i - 1, i + 1):
+                    if pas[j]:
+                        pas[j] = 0
+                        dist[j] = d
+                        nxt.append(j)
+            frontier = nxt
+
+    def distance(self, x: int, y: int) -> Optional[int]:
+        """마지막 계산 지점까지의 걸음 수. 창 밖이거나 도달 불가면 None"""
+        if self._stale():
+            self._rebuild()
+        lx, ly = x - self.ox, y - self.oy
+        if not (0 <= lx < self.size and 0 <= ly < self.size):
+            return None
+        d = self.dist[(ly + 1) * self.stride + lx + 1]
+        return None if d == self.UNREACHED else d
+
+    def next_step(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """(x, y)에서 목표 쪽으로 한 칸. 이미 목표거나 경로가 없으면 None"""
+        if self._stale():
+            self._rebuild()
+        S, W = self.size, self.stride
+        lx, ly = x - self.ox, y - self.oy
+        if not (0 <= lx < S and 0 <= ly < S):
+            return None
+        dist = self.dist
+        i = (ly + 1) * W + lx + 1
+        here = dist[i]
+        if here == self.UNREACHED:
+            return None
+        if here == 0:                   # 옛 목표 지점 — 남은 몇 칸은 직진
+            dx, dy = self.gx - x, self.gy - y
+            for mx, my in ((dx > 0) - (dx < 0), 0), (0, (dy > 0) - (dy < 0)):
+                if (mx or my) and self.world.walkable_at(x + mx, y + my):
+                    return (x + mx, y + my)
+            return None
+        best, step = here, None
+        for dx, dy in _DIRS4:
+            d = dist[i + dy * W + dx]           # 패딩 칸은 항상 UNREACHED
+            if d < best:
+                best, step = d, (x + dx, y + dy)
+        return step
+
+
+_C_ERROR = CHAR_CODE[T_ERROR]
+
+class _Cluster:
+    __slots__ = ("key", "ck", "cost", "nodes", "edges", "inter")
+
+    def __init__(self, key, ck: Chunk):
+        self.key   = key        # (자기 version, 자기 cost_version, 4방향 이웃 version)
+        self.ck    = ck
+        # 칸별 진입 비용 (0=통행 불가)
+        self.cost  = bytearray(ck.walkable)
+        i = ck.char.find(_C_ERROR)
+        while i >= 0:
+            if self.cost[i]:
+                self.cost[i] = ERROR_STEP_COST
+            i = ck.char.find(_C_ERROR, i + 1)
+        self.nodes: List[Tuple[int,int]] = []
+        self.edges: Dict[Tuple[int,int], list] = {}   # 노드 → [(노드, 비용)], 처음 펼칠 때 계산
+        self.inter: Dict[Tuple[int,int], list] = {}   # 노드 → 이웃 클러스터 쪽 짝 노드
+
+
+class HierarchicalPathfinder:
+    """청크를 클러스터로 쓰는 HPA*.
+    클러스터 경계의 연속 통행 구간마다 입구 노드를 두고, 같은 클러스터 입구끼리는
+    클러스터 안 Dijkstra 비용으로 잇는다 (노드를 처음 펼칠 때 계산). 장거리 질의는
+    이 추상 그래프에서 A*로 풀고 구간마다 클러스터 안에서만 경로를 다시 펼친다.
+    클러스터 정보는 청크 version(자기 + 4방향 이웃)이나 자기 cost_version이 바뀌면 처음
+    조회될 때 그 클러스터만 다시 만든다. 캐시된 경로는 지나는 청크의 (version, cost_version)을
+    함께 저장해 두었다가, 바뀐 청크를 지나는 구간만 다시 탐색해 끼워 넣는다.
+    아직 생성되지 않은 청크는 막힌 것으로 본다."""
+    def __init__(self, world: World, cache_size: int = PATH_CACHE):
+        self.world = world
+        self.cache_size = cache_size
+        self.cache: OrderedDict = OrderedDict()     # (시작, 목표) → (경로, 청크 비용 키)
+        self._clusters: Dict[Tuple[int,int], _Cluster] = {}
+        self.stats = dict(hits=0, misses=0, repairs=0, cluster_builds=0)
+
+    # ── 클러스터 ──
+    def _version(self, cx: int, cy: int) -> int:
+        ck = self.world.chunks.get((cx, cy))
+        return -1 if ck is None else ck.version
+
+    def _cost_key(self, cx: int, cy: int) -> Tuple[int, int]:
+        ck = self.world.chunks.get((cx, cy))
+        return (-1, -1) if ck is None else (ck.version, ck.cost_version)
+
+    def _border(self, cx: int, cy: int, horizontal: bool) -> List[Tuple[Tuple[int,int], Tuple[int,int]]]:
+        """(cx,cy)와 동쪽(horizontal) 또는 남쪽 이웃 사이 입구 쌍 [(내 칸, 이웃 칸)].
+        경계의 연속 통행 구간마다 가운데 칸이 후보이고, 양쪽 연결 요소가 같은 구간들은
+        처음/가운데/끝 세 개만 남긴다 (노이즈 많은 경계에서 노드 수 억제)"""
+        chunks = self.world.chunks
+        a = chunks.get((cx, cy))
+        b = chunks.get((cx + 1, cy) if horizontal else (cx, cy + 1))
+        if a is None or b is None:
+            return []
+        la, lb = chunk_labels(a), chunk_labels(b)
+        groups: Dict[Tuple[int,int], list] = {}
+        run = []
+        for k in range(CHUNK + 1):
+            if k < CHUNK:
+                if horizontal:
+                    ia, ib = k * CHUNK + CHUNK_MASK, k * CHUNK
+                else:
+                    ia, ib = CHUNK_MASK * CHUNK + k, k
+                if la[ia] and lb[ib]:
+                    run.append((ia, ib))
+                    continue
+            if run:
+                ia, ib = run[len(run) // 2]
+                groups.setdefault((la[ia], lb[ib]), []).append((ia, ib))
+                run = []
+        pairs = []
+        for mids in groups.values():
+            if len(mids) > 3:
+                mids = [mids[0], mids[len(mids) // 2], mids[-1]]
+            for ia, ib in mids:
+                pairs.append(((a.ox + (ia & CHUNK_MASK), a.oy + (ia >> CHUNK_SHIFT)),
+                              (b.ox + (ib & CHUNK_MASK), b.oy + (ib >> CHUNK_SHIFT))))
+        return pairs
+
+    def _cluster(self, cx: int, cy: int) -> Optional[_Cluster]:
+        ck = self.world.chunks.get((cx, cy))
+        if ck is None:
+            return None
+        key = (ck.version, ck.cost_version, self._version(cx - 1, cy), self._version(cx + 1, cy),
+               self._version(cx, cy - 1), self._version(cx, cy + 1))
+        cl = self._clusters.get((cx, cy))
+        if cl is not None and cl.key == key:
+            return cl
+        self.stats["cluster_builds"] += 1
+        cl = _Cluster(key, ck)
+        for mine, other in self._border(cx, cy, True) + self._border(cx, cy, False):
+            cl.inter.setdefault(mine, []).append(other)
+        for other, mine in self._border(cx - 1, cy, True) + self._border(cx, cy - 1, False):
+            cl.inter.setdefault(mine, []).append(other)
+        cl.nodes = list(cl.inter)
+        self._clusters[(cx, cy)] = cl
+        return cl
+
+    def _edges(self, cl: _Cluster, n: Tuple[int,int]) -> list:
+        e = cl.edges.get(n)
+        if e is None:
+            dist, _ = self._search(cl, n)
+            e = cl.edges[n] = [(m, d) for m in cl.nodes if m != n
+                               for d in (dist[self._local(cl.ck, m)],) if d != 0xFFFF]
+        return e
+
+    @staticmethod
+    def _local(ck: Chunk, p: Tuple[int,int]) -> int:
+        return (p[1] - ck.oy) * CHUNK + (p[0] - ck.ox)
+
+    def _search(self, cl: _Cluster, src: Tuple[int,int], goal: Optional[Tuple[int,int]] = None):
+        """클러스터 안 Dijkstra — 비용이 작은 정수라 거리별 버킷을 쓴다.
+        goal이 있으면 도착 즉시 종료. (거리, 부모) 배열 반환, 0xFFFF=미도달"""
+        N, cost = CHUNK * CHUNK, cl.cost
+        s = self._local(cl.ck, src)
+        g = self._local(cl.ck, goal) if goal else -1
+        dist = array('H', [0xFFFF]) * N
+        parent = array('h', [-1]) * N
+        dist[s] = 0
+        buckets = [[s]]
+        d = 0
+        while d < len(buckets):
+            for i in buckets[d]:
+                if dist[i] != d:
+                    continue
+                if i == g:
+                    return dist, parent
+                lx = i & CHUNK_MASK
+                for j in (i - CHUNK, i + CHUNK, i - 1 if lx else -1, i + 1 if lx < CHUNK_MASK else -1):
+                    if 0 <= j < N and cost[j]:
+                        nd = d + cost[j]
+                        if nd < dist[j]:
+                            dist[j] = nd
+                            parent[j] = i
+                            while len(buckets) <= nd:
+                                buckets.append([])
+                            buckets[nd].append(j)
+            d += 1
+        return dist, parent
+
+    def _local_path(self, cl: _Cluster, a: Tuple[int,int], b: Tuple[int,int]) -> Optional[List[Tuple[int,int]]]:
+        """클러스터 안 a→b 칸 목록 (a 제외, b 포함)"""
+        ck = cl.ck
+        dist, parent = self._search(cl, a, b)
+        i = self._local(ck, b)
+        if dist[i] == 0xFFFF:
+            return None
+        out = []
+        while parent[i] != -1:
+            out.append((ck.ox + (i & CHUNK_MASK), ck.oy + (i >> CHUNK_SHIFT)))
+            i = parent[i]
+        out.reverse()
+        return out
+
+    # ── 탐색 ──
+    def _cluster_at(self, p: Tuple[int,int]) -> Optional[_Cluster]:
+        return self._cluster(p[0] >> CHUNK_SHIFT, p[1] >> CHUNK_SHIFT)
+
+    def _plan(self, s: Tuple[int,int], g: Tuple[int,int]) -> Optional[List[Tuple[int,int]]]:
+        scl, gcl = self._cluster_at(s), self._cluster_at(g)
+        if scl is None or gcl is None or not gcl.cost[self._local(gcl.ck, g)]:
+            return None
+        if scl is gcl:
+            path = self._local_path(scl, s, g)
+            if path is not None:
+                return path
+
+        # 시작/목표를 임시 노드로 연결. 목표 쪽은 g에서 잰 거리를 방향만 뒤집어 보정
+        sdist, _ = self._search(scl, s)
+        start_edges = [(n, d) for n in scl.nodes
+                       for d in (sdist[self._local(scl.ck, n)],) if d != 0xFFFF]
+        gdist, _ = self._search(gcl, g)
+        g_cost = gcl.cost[self._local(gcl.ck, g)]
+        to_goal = {n: gdist[i] - gcl.cost[i] + g_cost for n in gcl.nodes
+                   for i in (self._local(gcl.ck, n),) if gdist[i] != 0xFFFF}
+
+        # 추상 그래프 A* (휴리스틱: 맨해튼 — 한 칸 최소 비용이 1이라 허용 가능)
+        gx, gy = g
+        best = {s: 0}
+        parent = {s: None}
+        heap = [(abs(s[0] - gx) + abs(s[1] - gy), 0, s)]
+        while heap:
+            _, d, n = heapq.heappop(heap)
+            if n == g:
+                break
+            if d > best[n]:
+                continue
+            cl = self._cluster_at(n)
+            nbrs = list(start_edges) if n == s else list(self._edges(cl, n))
+            for m in cl.inter.get(n, ()):
+                mcl = self._cluster_at(m)
+                nbrs.append((m, mcl.cost[self._local(mcl.ck, m)]))
+            if n in to_goal:
+                nbrs.append((g, to_goal[n]))
+            for m, c in nbrs:
+                nd = d + c
+                if nd < best.get(m, 1 << 30):
+                    best[m] = nd
+                    parent[m] = n
+                    heapq.heappush(heap, (nd + abs(m[0] - gx) + abs(m[1] - gy), nd, m))
+        if g not in parent:
+            return None
+
+        # 추상 경로 → 실제 칸
+        nodes = []
+        n = g
+        while n is not None:
+            nodes.append(n)
+            n = parent[n]
+        nodes.reverse()
+        path: List[Tuple[int,int]] = []
+        for a, b in zip(nodes, nodes[1:]):
+            acl = self._cluster_at(a)
+            if abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 and self._cluster_at(b) is not acl:
+                path.append(b)                  # 클러스터 경계 넘기
+                continue
+            seg = self._local_path(acl, a, b)
+            if seg is None:
+                return None
+            path.extend(seg)
+        return path
+
+    def _deps(self, s: Tuple[int,int], path: List[Tuple[int,int]]) -> tuple:
+        keys = dict.fromkeys((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) for x, y in [s] + path)
+        return tuple((k, self._cost_key(*k)) for k in keys)
+
+    def find_path(self, sx: int, sy: int, gx: int, gy: int) -> Optional[List[Tuple[int,int]]]:
+        """(sx,sy)→(gx,gy) 칸 목록 (시작 제외, 목표 포함). 경로가 없으면 None"""
+        s, g = (sx, sy), (gx, gy)
+        if s == g:
+            return []
+        hit = self.cache.get((s, g))
+        if hit is not None:
+            path, deps = hit
+            stale = {k for k, v in deps if self._cost_key(*k) != v}
+            if not stale:
+                self.stats["hits"] += 1
+                self.cache.move_to_end((s, g))
+                return list(path)
+            path = self._repair(s, path, stale)
+        else:
+            self.stats["misses"] += 1
+            path = self._plan(s, g)
+        if path is None:
+            self.cache.pop((s, g), None)
+            return None
+        self.cache[(s, g)] = (tuple(path), self._deps(s, path))
+        self.cache.move_to_end((s, g))
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return path
+
+    def _repair(self, s: Tuple[int,int], path, stale: set) -> Optional[List[Tuple[int,int]]]:
+        """바뀐 청크를 지나는 구간만 다시 탐색해 교체. 양 끝이 바뀌었으면 전체 재탐색"""
+        self.stats["repairs"] += 1
+        full = [s] + list(path)
+        hit = [i for i, (x, y) in enumerate(full) if (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) in stale]
+        i, j = hit[0], hit[-1]
+        if i == 0 or j == len(full) - 1:
+            return self._plan(s, full[-1])
+        sub = self._plan(full[i - 1], full[j + 1])
+        if sub is None:
+            return self._plan(s, full[-1])
+        return full[1:i] + sub + full[j + 2:]
+
+
+class GameState:
+    def __init__(self, width: int = MAP_W, height: int = MAP_H, seed: Optional[int] = None,
+                 snapshot: Optional["WorldSnapshot"] = None):
+        self.seed    = seed if seed is not None else random.randrange(1 << 31)
+        self.rng     = RngStreams(self.seed)
+        self.world   = World(width, height, self.seed)
+        self.world.snapshot = snapshot
+        self.player  = Player(x=width // 2, y=height // 2)
+        self.npcs:    List[NPC]   = []
+        self.enemies: List[Enemy] = []
+        self.npc_index   = SpatialIndex()
+        self.enemy_index = SpatialIndex()
+        self.errors      = ErrorAutomaton(self.world)
+        self.flow        = FlowField(self.world)
+        self.pursuers: List[Enemy] = []     # 어그로 상태인 적
+        self.paths       = HierarchicalPathfinder(self.world)
+        self.travel: deque = deque()        # 자동 이동 남은 칸
+        self._travel_acc = 0.0
+        # 청크가 처음 생성될 때 그 청크의 NPC/적도 함께 배치
+        self.world.on_generate.append(self._on_chunk_generated)
+        self.world.on_restore.append(self.errors.add_chunk)
+        if snapshot is None:        # 불러오기는 엔티티를 복원한 뒤 load_game이 생성
+            self._ensure_active_chunks()
 
         self.weather     = Weather.RAIN
-        self.time_of_day = 0.3       # 0.0~1.0
-        self._start      = time.time()
+        self.clock       = DAY_LEN * 0.3   # 시뮬레이션 경과 시간 (초)
+        self.time_of_day = 0.3             # 0.0~1.0
+        self.ticks       = 0
 
-        self.event_log = EventLog()
+        self.bus       = EventBus(self)
+        self.event_log = EventLog(bus=self.bus)
         self.combat    = CombatState()
+        self.quests    = QuestEngine()
+        self.crowd     = CrowdSim()
+        self.bus.on(Ev.GAME, self._on_game_event)
+        self.bus.on(Ev.LEVEL, self._on_level_up)
 
         self.running   = True
-        self.ui_mode   = "world"   # world / inventory / quest / character / combat / shop
+        self.job_choice = JOB_NONE
+        self.ui_mode   = "world"   # world / inventory / quest / character / combat / shop / stash / map
+        self.minimap   = False     # 사이드 패널 미니맵
+        self.stash_cursor = 0
+        self.load_armed = False    # L/F9를 한 번 눌러 불러오기 확인을 기다리는 중
 
         self.watcher_pos: Optional[Tuple[int,int]] = None
         self._wtimer    = 0.0
-        self._tick_acc  = 0.0
+        self._wnext     = self.rng.ai.uniform(20, 50)
+        self._watcher_near = False
+        self._sync_acc  = 0.0
+        self._error_acc = 0.0
         self._notify    = ""       # 레벨업 등 알림
 
     # ── 타일 ──
     def tile(self, x, y) -> Optional[Tile]:
-        if 0 <= x < MAP_W and 0 <= y < MAP_H:
-            return self.tiles[y][x]
-        return None
+        return self.world.tile(x, y)
+
+    def viewport(self) -> Tuple[int, int]:
+        """플레이어 기준 뷰포트 좌상단 (맵 가장자리에서 고정)"""
+        p, w = self.player, self.world
+        return (max(0, min(p.x - VIEW_W // 2, w.w - VIEW_W)),
+                max(0, min(p.y - VIEW_H // 2, w.h - VIEW_H)))
+
+    def _ensure_active_chunks(self):
+        # 청크 생성 순서가 렌더링에 좌우되지 않도록 뷰포트도 여기서 생성한다
+        p = self.player
+        self.world.ensure_radius(p.x, p.y, SIM_RADIUS)
+        vx, vy = self.viewport()
+        self.world.ensure_rect(vx, vy, vx + VIEW_W - 1, vy + VIEW_H - 1)
+
+    # ── 직업 선택 ──
+    def choose_job(self, idx: int):
+        """idx: JOBS 인덱스 / JOB_RANDOM(무작위, 시작 아이템 없음) / JOB_NONE(기본값 유지)"""
+        self.job_choice = idx
+        p = self.player
+        if idx == JOB_NONE:
+            return
+        if idx == JOB_RANDOM:
+            p.job, p.job_desc = self.rng.events.choice(JOBS)
+            return
+        p.job, p.job_desc = JOBS[idx]
+        p.stats.credits = 400 if p.job == "택시 기사" else 200
+        for iid in JOB_ITEMS.get(p.job, []):
+            p.inventory.add(ITEM_DB[iid])
+
+    def _on_chunk_generated(self, ck: Chunk):
+        self.errors.add_chunk(ck)
+        for npc in generate_chunk_npcs(self.world, ck):
+            self.npcs.append(npc)
+            self.npc_index.add(npc)
+        for enemy in generate_chunk_enemies(self.world, ck):
+            self.spawn_enemy(enemy)
+
+    # ── 엔티티 ──
+    def spawn_enemy(self, enemy: Enemy):
+        self.enemies.append(enemy)
+        self.enemy_index.add(enemy)
+        if enemy.aggro:
+            self.pursuers.append(enemy)
+
+    def move_enemy(self, enemy: Enemy, nx: int, ny: int):
+        self.enemy_index.move(enemy, nx, ny)
+
+    def remove_enemy(self, enemy: Enemy):
+        enemy.aggro = False          # 추적 목록에서는 다음 갱신 때 빠진다
+        if self.enemy_index.remove(enemy):
+            for i, e in enumerate(self.enemies):
+                if e is enemy:
+                    del self.enemies[i]
+                    break
 
     # ── 이동 ──
     def move_player(self, dx: int, dy: int):
@@ -772,14 +2551,21 @@ class GameState:
             return
 
         if t and t.walkable:
+            prev = self.tile(p.x, p.y)
             p.x, p.y = nx, ny
             t.visit_count += 1
             p.visited_zones[t.zone] = p.visited_zones.get(t.zone, 0) + 1
 
+            # 퀘스트 이벤트 — 평범한 한 걸음은 아무것도 내보내지 않는다
+            if not prev or prev.zone != t.zone:
+                self.quest_event(GameEvent.ENTER_ZONE, t.zone.name)
+            if t.error_level > 0.5:
+                self.quest_event(GameEvent.ERROR_TILE)
+
             # 아이템 드롭 줍기
             if t.item_drop:
                 item = ITEM_DB.get(t.item_drop)
-                if item and p.inventory.add(item):
+                if item and self._give_item(item):
                     self.event_log.push(f"획득: {item.name}")
                     t.item_drop = None; t.char = T_FLOOR
                     p.stats.skill_xp("scavenging", 5)
@@ -801,9 +2587,6 @@ class GameState:
             # 스킬 경험
             p.stats.skill_xp("endurance", 1)
 
-            # 퀘스트 진행 체크
-            self._check_quest_progress()
-
     def _update_emotions(self, t: Tile):
         p = self.player
         props = ZONE_PROPS[t.zone]
@@ -831,10 +2614,11 @@ class GameState:
             chance += 0.06
         if self.time_of_day > 0.75 or self.time_of_day < 0.1:
             chance += 0.04
-        if random.random() < chance:
+        ev = self.rng.events
+        if ev.random() < chance:
             pool = EVENTS_BY_ZONE.get(t.zone, [])
             if pool:
-                self.event_log.push(random.choice(pool))
+                self.event_log.push(ev.choice(pool))
 
     def _try_enemy_encounter(self):
         p = self.player
@@ -847,13 +2631,13 @@ class GameState:
         # 수배 레벨에 따라 증가
         chance += p.reputation.wanted_level * 0.01
 
-        for enemy in self.enemies:
-            if enemy.is_alive() and abs(enemy.x - p.x) + abs(enemy.y - p.y) <= 1:
+        for enemy in self.enemy_index.near(p.x, p.y, 1):
+            if enemy.is_alive():
                 # 직접 접촉 → 전투 시작
                 self._start_combat(enemy)
                 return
 
-        if random.random() < chance:
+        if self.rng.combat.random() < chance:
             # 구역 기반 랜덤 조우
             zone_enemies = {
                 Zone.NEON_COMMERCIAL: "drone",
@@ -864,13 +2648,14 @@ class GameState:
             }
             etype = zone_enemies.get(t.zone, "gang")
             enemy = make_enemy(etype, p.x, p.y)
-            self.enemies.append(enemy)
+            self.spawn_enemy(enemy)
             self._start_combat(enemy)
 
     def _start_combat(self, enemy: Enemy):
         self.combat = CombatState(active=True, enemy=enemy)
         self.combat.push_log(f"⚠ {enemy.name} 등장!")
         self.ui_mode = "combat"
+        self.bus.publish(Ev.COMBAT, EV_START, enemy.hp, enemy.id)
 
     def resolve_combat_action(self, action: CombatAction, item_idx: int = -1):
         cs = self.combat
@@ -878,7 +2663,7 @@ class GameState:
         if not cs.active or not cs.enemy: return
 
         if action == CombatAction.ATTACK:
-            msg = player_attack(cs, p)
+            msg = player_attack(cs, p, self.rng.combat)
             cs.push_log(f"▶ {msg}")
         elif action == CombatAction.SKILL:
             msg = player_skill_use(cs, p)
@@ -896,9 +2681,10 @@ class GameState:
                 cs.push_log("아이템 없음")
                 return
         elif action == CombatAction.FLEE:
-            if random.randint(1, 100) <= cs.flee_chance:
+            if self.rng.combat.randint(1, 100) <= cs.flee_chance:
                 cs.result = "flee"
                 cs.push_log("▶ 도주 성공!")
+                self.bus.publish(Ev.COMBAT, EV_FLEE, 0, cs.enemy.id)
                 self._end_combat()
                 return
             else:
@@ -911,7 +2697,7 @@ class GameState:
             return
 
         # 적 턴
-        msg = enemy_attack(cs, p)
+        msg = enemy_attack(cs, p, self.rng.combat)
         cs.push_log(f"◀ {msg}")
 
         if not p.stats.is_alive():
@@ -921,13 +2707,15 @@ class GameState:
 
     def _on_combat_win(self, enemy: Enemy):
         p = self.player
-        p.stats.gain_xp(enemy.xp_reward)
+        self.bus.publish(Ev.COMBAT, EV_WIN, enemy.xp_reward, enemy.id)
+        if p.stats.gain_xp(enemy.xp_reward):
+            self.bus.publish(Ev.LEVEL, p.stats.level)
         p.stats.credits += enemy.credit_reward
         for drop_id in enemy.drop_items:
-            if random.random() < 0.5:
+            if self.rng.combat.random() < 0.5:
                 item = ITEM_DB.get(drop_id)
                 if item:
-                    p.inventory.add(deepcopy(item))
+                    self._give_item(item)
                     self.event_log.push(f"드롭: {item.name}")
         # 파벌 평판
         if enemy.faction == "CORP":
@@ -942,17 +2730,22 @@ class GameState:
 
     def _on_combat_lose(self):
         p = self.player
+        self.bus.publish(Ev.COMBAT, EV_LOSE, 0, self.combat.enemy.id)
         p.stats.hp = p.stats.max_hp // 3
         p.stats.stress = min(100, p.stats.stress + 30)
         p.stats.credits = max(0, p.stats.credits - 50)
-        p.x, p.y = MAP_W // 2, MAP_H // 2
+        p.x, p.y = self.world.w // 2, self.world.h // 2
         self.event_log.push("병원에서 눈을 떴다. -50₵")
         p.reputation.add_crime(0)
         self._end_combat()
 
     def _end_combat(self):
         # 처치된 적 제거
-        self.enemies = [e for e in self.enemies if e.is_alive()]
+        e = self.combat.enemy
+        if e and not e.is_alive():
+            self.remove_enemy(e)
+        elif e:                      # 도주 — 5초간 추적하지 않는다
+            e.aggro, e.alert_timer = False, self.clock + 5.0
         self.combat.active = False   # ← 이게 없으면 move_player가 영구 차단됨
         self.ui_mode = "world"
 
@@ -968,46 +2761,61 @@ class GameState:
             p.fov_bonus_turns = item.duration
         if item.stealth_bonus:
             p.stealth_active = item.duration
-        if item.stackable:
-            item.qty -= 1
-            if item.qty <= 0:
-                p.inventory.items[idx] = None
-        else:
-            p.inventory.items[idx] = None
+        p.inventory.take(idx, 1 if item.stackable else None)
         p.stats.clamp()
+        self.quest_event(GameEvent.USE_ITEM, item.id)
+
+    def equip_item(self, idx: int) -> str:
+        item = self.player.inventory.items[idx]
+        msg = self.player.inventory.equip(idx)
+        if item and item.equippable:
+            self.quest_event(GameEvent.USE_ITEM, item.id)
+        return msg
+
+    def _give_item(self, defn: ItemDef, qty: int = 1) -> bool:
+        if not self.player.inventory.add(defn, qty):
+            return False
+        self.quest_event(GameEvent.GET_ITEM, defn.id)
+        return True
 
     # ── NPC 상호작용 ──
     def interact(self):
         if self.ui_mode not in ("world",): return
         p = self.player
-        for npc in self.npcs:
-            if abs(npc.x - p.x) + abs(npc.y - p.y) <= 1:
-                npc.memory += 1
-                p.npc_contacts += 1
-                p.isolation = max(0, p.isolation - 5)
-                p.network_score += 1
-                p.stats.skill_xp("negotiation", 8)
-
-                if npc.role == "merchant":
-                    self.ui_mode = "shop"
-                    self._current_npc = npc
-                    return
-                elif npc.role == "quest" and npc.quest_id:
-                    self._offer_quest(npc)
-                elif npc.faction:
-                    delta = 5 if npc.mood > 0.5 else -2
-                    p.reputation.modify(npc.faction, delta)
-                    self.event_log.push(f"[{npc.name}] {npc.get_line()} (평판 변화)")
-                else:
-                    self.event_log.push(f"[{npc.name}] {npc.get_line()}")
-
-                p.reputation.modify("CITIZENS", 1)
-                npc.mood = min(1.0, npc.mood + 0.05)
-                p.stats.clamp()
+        npc = self.npc_index.first_near(p.x, p.y, 1)
+        if npc:
+            npc.memory += 1
+            p.npc_contacts += 1
+            p.isolation = max(0, p.isolation - 5)
+            p.network_score += 1
+            p.stats.skill_xp("negotiation", 8)
+            self.quest_event(GameEvent.NPC_CONTACT, npc.faction)
+
+            if npc.role == "merchant" and not in_hours(self.time_of_day, SHOP_HOURS):
+                self.event_log.push(f"[{npc.name}] 오늘 장사 끝났어. 내일 와.")
+            elif npc.role == "merchant":
+                self.ui_mode = "shop"
+                self._current_npc = npc
                 return
+            elif npc.role == "quest" and npc.quest_id:
+                self._offer_quest(npc)
+            elif npc.faction:
+                delta = 5 if npc.mood > 0.5 else -2
+                p.reputation.modify(npc.faction, delta)
+                self.event_log.push(f"[{npc.name}] {npc.get_line(self.rng.events)} (평판 변화)")
+            else:
+                self.event_log.push(f"[{npc.name}] {npc.get_line(self.rng.events)}")
 
-        # 오브젝트 상호작용
+            p.reputation.modify("CITIZENS", 1)
+            npc.mood = min(1.0, npc.mood + 0.05)
+            p.stats.clamp()
+            return
+
+        # 오브젝트 상호작용 (문은 올라설 수 없으니 인접 칸도 본다)
         t = self.tile(p.x, p.y)
+        if not (t and t.interactive):
+            t = next((d for d in (self.tile(p.x + dx, p.y + dy) for dx, dy in _DIRS4)
+                      if d and d.interactive == "door"), None)
         if t and t.interactive:
             self._interact_object(t)
             return
@@ -1020,31 +2828,20 @@ class GameState:
             p.stats.skill_xp("data_resist", 10)
             p.sync_score += 1
             self.event_log.push("터미널 접속. 데이터 흐름 감지.")
-            # 퀘스트 진행
-            for q in p.active_quests:
-                if q.id == "deliver_chip" and not q.completed_obj[2]:
-                    q.complete_objective(2)
-                    self.event_log.push("▶ 퀘스트: 서버 터미널 사용 완료")
+            self.quest_event(GameEvent.USE_TERMINAL, t.zone.name)
         elif t.interactive == "cctv":
             p.stats.skill_xp("stealth", 15)
             p.reputation.modify("CORP", -3)
             p.reputation.modify("CITIZENS", 2)
             self.event_log.push("CCTV 루프 걸었다.")
             t.interactive = ""; t.char = T_FLOOR
-            # 퀘스트
-            for q in p.active_quests:
-                if q.id == "intel_gather":
-                    for i, obj in enumerate(q.completed_obj):
-                        if not obj and "CCTV" in q.objectives[i]:
-                            q.complete_objective(i); break
+            self.quest_event(GameEvent.LOOP_CCTV, t.zone.name)
         elif t.interactive == "door":
-            has_battery = any(it and it.id == "battery" for it in p.inventory.items)
-            if has_battery:
+            if p.inventory.has("battery"):
                 t.walkable = True; t.interactive = ""; t.char = T_FLOOR
+                self.world.links.open_tile(*t.pos)
                 self.event_log.push("배터리팩으로 문 개방.")
-                for i, it in enumerate(p.inventory.items):
-                    if it and it.id == "battery":
-                        p.inventory.remove(i); break
+                p.inventory.remove(p.inventory.find("battery"))
             else:
                 self.event_log.push("잠긴 문. (배터리팩 필요)")
 
@@ -1059,45 +2856,53 @@ class GameState:
             return
         quest = next((q for q in QUEST_POOL if q.id == qid), None)
         if quest:
-            new_q = deepcopy(quest)
+            new_q = quest.clone()
             new_q.giver = npc.name
             p.active_quests.append(new_q)
+            self.quests.subscribe(new_q)
             self.event_log.push(f"퀘스트 수락: {new_q.title}")
             # 데이터 칩 퀘스트 → 아이템 지급
             if qid == "deliver_chip":
-                p.inventory.add(deepcopy(ITEM_DB["data_chip"]))
-
-    def _check_quest_progress(self):
-        p = self.player
-        t = self.tile(p.x, p.y)
-        if not t: return
-        for q in p.active_quests:
-            if q.completed: continue
-            if q.id == "find_person":
-                if t.zone == Zone.LOW_SIGNAL and not q.completed_obj[0]:
-                    q.complete_objective(0); self.event_log.push("▶ 퀘스트: 저신호 구역 탐색 완료")
-                if p.npc_contacts >= 3 and not q.completed_obj[1]:
-                    q.complete_objective(1); self.event_log.push("▶ 퀘스트: 단서 수집 완료")
-            if q.id == "fix_errors" and t.error_level > 0.5:
-                cnt = sum(1 for obj in q.completed_obj if obj)
-                if cnt < 3 and not q.completed_obj[min(cnt, 2)]:
-                    q.complete_objective(min(cnt, 2))
-                    self.event_log.push(f"▶ 퀘스트: 오류 지점 {cnt+1}/3 확인")
-            if q.completed:
+                self._give_item(ITEM_DB["data_chip"])
+            # 이미 목표 구역 안에서 받았다면 바로 인정
+            t = self.tile(p.x, p.y)
+            if t:
+                self.quest_event(GameEvent.ENTER_ZONE, t.zone.name)
+
+    def quest_event(self, event: GameEvent, key: Optional[str] = None):
+        self.bus.publish(Ev.GAME, event.value, 0, key)
+
+    def _on_game_event(self, a: int, b: int, key: Optional[str]):
+        """이벤트를 구독 중인 목표에만 전달하고 다 채운 퀘스트는 완료 처리"""
+        for q, i in self.quests.emit(GameEvent(a), key):
+            obj = q.objectives[i]
+            self.bus.publish(Ev.QUEST, i, q.progress[i], q.id)
+            if q.completed_obj[i]:
+                self.event_log.push(f"▶ 퀘스트: {obj.text} 완료")
+            else:
+                self.event_log.push(f"▶ 퀘스트: {obj.text} {q.progress[i]}/{obj.count}")
+            if q.completed and q in self.player.active_quests:
                 self._complete_quest(q)
 
     def _complete_quest(self, q: Quest):
         p = self.player
+        self.bus.publish(Ev.QUEST, -1, q.reward_credits, q.id)
         p.stats.credits += q.reward_credits
-        p.stats.gain_xp(q.reward_xp)
+        if p.stats.gain_xp(q.reward_xp):
+            self.bus.publish(Ev.LEVEL, p.stats.level)
         if q.reward_item:
             item = ITEM_DB.get(q.reward_item)
-            if item: p.inventory.add(deepcopy(item))
+            if item: self._give_item(item)
         p.completed_quests.append(q.id)
         p.active_quests.remove(q)
+        self.quests.unsubscribe(q)
         p.network_score += 3
         self.event_log.push(f"✓ 퀘스트 완료: {q.title} (+{q.reward_credits}₵)")
 
+    def _on_level_up(self, a: int, b: int, key: Optional[str]):
+        self._notify = f"LEVEL UP  Lv{a}"
+        self.event_log.push(f"레벨 업! Lv{a}")
+
     # ── 상점 ──
     def buy_item(self, item_id: str) -> str:
         p = self.player
@@ -1109,133 +2914,919 @@ class GameState:
         price = int(item.price * rep_discount)
         if p.stats.credits < price:
             return f"크레딧 부족 ({price}₵)"
-        if not p.inventory.add(deepcopy(item)):
+        if not self._give_item(item):
             return "인벤토리 가득"
         p.stats.credits -= price
+        self.bus.publish(Ev.BUY, price, 0, item.id)
         return f"구매: {item.name} -{price}₵"
 
-    # ── 배경 틱 ──
-    def tick(self, dt: float):
-        elapsed = time.time() - self._start
-        self.time_of_day = (elapsed % DAY_LEN) / DAY_LEN
+    # ── 보관함 (시작점) ──
+    def at_stash(self) -> bool:
+        p = self.player
+        return abs(p.x - self.world.w // 2) + abs(p.y - self.world.h // 2) <= STASH_RADIUS
 
-        if random.random() < 0.0008:
-            self.weather = random.choice(list(Weather))
-        if random.random() < 0.004:
-            self._spread_error()
+    def stash_deposit(self, idx: int) -> str:
+        p = self.player
+        item = p.inventory.take(idx)
+        if not item:
+            return "빈 슬롯"
+        if p.stash.put(item) < 0:
+            p.inventory.put(item)
+            return "보관함 가득"
+        return f"보관: {item.name} ×{item.qty}"
+
+    def stash_withdraw(self, idx: int) -> str:
+        p = self.player
+        item = p.stash.items[idx] if 0 <= idx < len(p.stash.items) else None
+        if not item:
+            return "빈 칸"
+        if p.inventory.put(item) < 0:
+            return "인벤토리 가득"
+        p.stash.take(idx)
+        return f"꺼냄: {item.name} ×{item.qty}"
 
-        self._update_watcher(dt)
-        self.event_log.tick()
-        self.player.reputation.tick(dt)
+    # ── 배경 틱 ──
+    def tick(self, dt: float):
+        """고정 스텝 dt(초)만큼 시뮬레이션. 모든 변화율은 초 단위"""
+        self.tick_world(dt)
+        self.tick_player(dt)
+
+    def tick_world(self, dt: float):
+        """플레이어와 무관한 도시 진행 (시간/날씨/오류 확산/구역 집계)"""
+        self.clock += dt
+        self.ticks += 1
+        self.time_of_day = (self.clock % DAY_LEN) / DAY_LEN
+
+        if self.rng.events.random() < rate_chance(WEATHER_RATE, dt):
+            self.weather = self.rng.events.choice(list(Weather))
+        self._error_acc += ERROR_RATE * dt
+        if self._error_acc >= 1.0:
+            n = min(int(self._error_acc), ERROR_TICK_BUDGET)
+            self._error_acc -= n
+            with PROF("t.error"):
+                self._spread_error(n)
+        self.crowd.tick(dt, self.time_of_day, self.weather)
+
+    def tick_player(self, dt: float):
+        """현재 플레이어 주변 시뮬레이션과 플레이어 상태"""
+        with PROF("t.chunk"):
+            self._ensure_active_chunks()
+        with PROF("t.ai"):
+            self.flow.set_target(self.player.x, self.player.y)
+            self._update_pursuers(dt)
+            self._update_travel(dt)
+        with PROF("t.npc"):
+            self._update_npcs(dt)
+        with PROF("t.watch"):
+            self._update_watcher(dt)
+        self.event_log.tick(dt)
+        with PROF("t.rep"):
+            self.player.reputation.tick(dt)
 
         p = self.player
-        p.fatigue   = max(0, p.fatigue - 0.008)
-        p.isolation = min(100, p.isolation + 0.003)
+        p.fatigue   = max(0, p.fatigue - 0.114 * dt)
+        p.isolation = min(100, p.isolation + 0.043 * dt)
         if 0.25 < self.time_of_day < 0.6:
-            p.stability = min(100, p.stability + 0.005)
+            p.stability = min(100, p.stability + 0.071 * dt)
         p.clamp_emotions()
 
         # 수면 부족 패널티
         if p.stats.sleep < 20:
-            p.stats.stress = min(100, p.stats.stress + 0.05)
-            p.anxiety = min(100, p.anxiety + 0.05)
+            p.stats.stress = min(100, p.stats.stress + 0.71 * dt)
+            p.anxiety = min(100, p.anxiety + 0.71 * dt)
         # 굶주림 패널티
         if p.stats.hunger < 15:
-            p.stats.hp = max(1, p.stats.hp - 0.02)
+            p.stats.hp = max(1, p.stats.hp - 0.29 * dt)
         # 스태미나 자연 회복
-        p.stats.stamina = min(p.stats.max_stamina, p.stats.stamina + 0.3)
+        p.stats.stamina = min(p.stats.max_stamina, p.stats.stamina + 4.3 * dt)
         p.stats.clamp()
 
-    def _spread_error(self):
-        error_tiles = [
-            (x, y) for y in range(MAP_H) for x in range(MAP_W)
-            if self.tiles[y][x].error_level > 0.5
-        ]
-        if not error_tiles: return
-        ox, oy = random.choice(error_tiles)
-        for dx, dy in [(0,1),(0,-1),(1,0),(-1,0)]:
-            nx, ny = ox+dx, oy+dy
-            t = self.tile(nx, ny)
-            if t and t.walkable and t.error_level < 0.3 and random.random() < 0.25:
-                t.error_level += 0.2
-                if t.error_level > 0.5:
-                    t.char = T_ERROR
-                    self.player.decay_score += 1
+    def _spread_error(self, steps: int = 1):
+        """오류 확산 steps회. 빨리 감기는 _error_acc에 이벤트 수를 더해 두면
+        tick_world가 틱마다 ERROR_TICK_BUDGET회씩 나눠 처리한다"""
+        self.player.decay_score += self.errors.step(self.rng.world, steps)
 
     def _update_watcher(self, dt: float):
         self._wtimer += dt
-        if self._wtimer > random.uniform(20, 50):
+        if self._wtimer > self._wnext:
             self._wtimer = 0
-            angle = random.uniform(0, math.pi * 2)
-            dist  = random.uniform(10, 22)
+            ai = self.rng.ai
+            self._wnext  = ai.uniform(20, 50)
+            angle = ai.uniform(0, math.pi * 2)
+            dist  = ai.uniform(10, 22)
             wx = int(self.player.x + dist * math.cos(angle))
             wy = int(self.player.y + dist * math.sin(angle))
-            wx = max(0, min(MAP_W-1, wx))
-            wy = max(0, min(MAP_H-1, wy))
+            wx = max(0, min(self.world.w-1, wx))
+            wy = max(0, min(self.world.h-1, wy))
             self.watcher_pos = (wx, wy)
         if self.watcher_pos:
             wx, wy = self.watcher_pos
             dx, dy = self.player.x - wx, self.player.y - wy
             dist = math.hypot(dx, dy)
-            if dist < 5:
-                self.event_log.push("∆가 가까이 있다.")
-                self.player.anxiety += 4
-                self.player.sync_score += 1
+            near = dist < 5
+            if near:
+                if not self._watcher_near:
+                    self.event_log.push("∆가 가까이 있다.")
+                self.player.anxiety += WATCHER_ANXIETY * dt
+                self._sync_acc += WATCHER_SYNC_RATE * dt
+                if self._sync_acc >= 1.0:
+                    self.player.sync_score += int(self._sync_acc)
+                    self._sync_acc -= int(self._sync_acc)
                 self.player.clamp_emotions()
-            if dist > 3 and random.random() < 0.04:
-                mx = (1 if dx > 0 else -1 if dx < 0 else 0)
-                my = (1 if dy > 0 else -1 if dy < 0 else 0)
-                nwx, nwy = wx + mx, wy + my
-                t = self.tile(nwx, nwy)
-                if t and t.walkable:
-                    self.watcher_pos = (nwx, nwy)
+            self._watcher_near = near
+            if dist > 3 and self.rng.ai.random() < rate_chance(WATCHER_STEP_RATE, dt):
+                step = self.flow.next_step(wx, wy)
+                if step is None:        # 거리 지도 밖 — 예전처럼 직선으로 접근
+                    mx = (1 if dx > 0 else -1 if dx < 0 else 0)
+                    my = (1 if dy > 0 else -1 if dy < 0 else 0)
+                    t = self.tile(wx + mx, wy + my)
+                    if t and t.walkable:
+                        step = (wx + mx, wy + my)
+                if step:
+                    self.watcher_pos = step
+
+    def _update_npcs(self, dt: float):
+        """NPC 일과 (배회 / 상점 영업 / 파벌 집회). 뷰포트 주변만 개별로 움직인다"""
+        rng, clock = self.rng.npc, self.clock
+        vx, vy = self.viewport()
+        m = NPC_LOD_MARGIN
+        near = list(self.npc_index.in_rect(vx - m, vy - m, vx + VIEW_W - 1 + m, vy + VIEW_H - 1 + m))
+        chance = rate_chance(NPC_WANDER_RATE, dt)
+        k = 1.0 - math.exp(-dt / NPC_MOOD_TAU)
+        for npc in near:
+            if npc.synced == clock:             # 이번 틱에 다른 플레이어 주변에서 이미 갱신
+                continue
+            if clock - npc.synced > 2 * dt:
+                self._resync_npc(npc)
+            else:
+                npc.mood += (self.crowd.mood[npc.zone.value] - npc.mood) * k
+            npc.synced = clock
+            if rng.random() >= chance:
+                continue
+            goal = npc.goal(self.time_of_day)
+            if goal is None:
+                dx, dy = _DIRS4[rng.randrange(4)]
+                if abs(npc.x + dx - npc.home_x) + abs(npc.y + dy - npc.home_y) > NPC_HOME_R:
+                    dx, dy = -dx, -dy
+                steps = ((dx, dy),)
+            else:
+                gx, gy = goal[0] - npc.x, goal[1] - npc.y
+                if abs(gx) + abs(gy) <= (0 if npc.role == "merchant" else 2):
+                    continue
+                sx = (gx > 0) - (gx < 0); sy = (gy > 0) - (gy < 0)
+                steps = ((sx, 0), (0, sy)) if abs(gx) >= abs(gy) else ((0, sy), (sx, 0))
+            for dx, dy in steps:
+                if (dx or dy) and self._npc_free(npc.x + dx, npc.y + dy):
+                    self.npc_index.move(npc, npc.x + dx, npc.y + dy)
+                    break
+
+    def _npc_free(self, x: int, y: int) -> bool:
+        p = self.player
+        return ((x, y) != (p.x, p.y) and self.world.walkable_at(x, y)
+                and self.npc_index.first_near(x, y, 0) is None)
+
+    def _resync_npc(self, npc: NPC):
+        """멀리 있던 NPC를 경과 시간만큼 한 번에 따라잡기 (기분 수렴 + 일과 위치)"""
+        crowd = self.crowd.mood[npc.zone.value]
+        away = self.clock - npc.synced if npc.synced >= 0 else math.inf
+        npc.mood += (crowd - npc.mood) * (1.0 - math.exp(-away / NPC_MOOD_TAU))
+        if away < NPC_RESETTLE:
+            return
+        rng = self.rng.npc
+        gx, gy = npc.goal(self.time_of_day) or (npc.home_x, npc.home_y)
+        spots = [(gx, gy)] + [(gx + rng.randint(-2, 2), gy + rng.randint(-2, 2)) for _ in range(4)]
+        for x, y in spots:
+            if (x, y) == (npc.x, npc.y) or self._npc_free(x, y):
+                self.npc_index.move(npc, x, y)
+                return
 
-    # ── 저장/불러오기 ──
-    def save(self) -> str:
+    def _update_pursuers(self, dt: float):
+        """주변 적의 어그로 판정과 거리 지도를 따라가는 추적 이동"""
+        if self.combat.active:
+            return
+        p = self.player
+        aggro_r = AGGRO_RADIUS // 2 if p.stealth_active > 0 else AGGRO_RADIUS
+        for e in self.enemy_index.near(p.x, p.y, aggro_r):
+            if not e.aggro and e.alert_timer <= self.clock and e.is_alive():
+                e.aggro, e.move_acc = True, 0.0
+                self.pursuers.append(e)
+        if not self.pursuers:
+            return
+
+        flow, index = self.flow, self.enemy_index
+        keep = []
+        for e in self.pursuers:
+            if not e.aggro or not e.is_alive():
+                continue
+            if self.combat.active:              # 이번 틱에 다른 적과 전투 시작
+                keep.append(e)
+                continue
+            d = abs(e.x - p.x) + abs(e.y - p.y)
+            if d > FLOW_RADIUS:
+                e.aggro = False                 # 놓쳤다
+                continue
+            e.move_acc = min(2.0, e.move_acc + e.speed * ENEMY_STEP_RATE * dt)
+            while e.move_acc >= 1.0 and d > 1:
+                e.move_acc -= 1.0
+                step = flow.next_step(e.x, e.y)
+                if step is None:
+                    e.aggro = False             # 경로가 끊겼다
+                    break
+                if index.first_near(step[0], step[1], 0) is None:
+                    self.move_enemy(e, *step)
+                    d = abs(e.x - p.x) + abs(e.y - p.y)
+            if not e.aggro:
+                continue
+            keep.append(e)
+            if d <= 1 and self.ui_mode == "world":
+                self._start_combat(e)
+        self.pursuers = keep
+
+    # ── 자동 이동 ──
+    def travel_to(self, x: int, y: int) -> str:
         p = self.player
-        data = {
-            "pos": [p.x, p.y],
-            "job": p.job,
-            "credits": p.stats.credits,
-            "hp": p.stats.hp,
-            "level": p.stats.level,
-            "xp": p.stats.xp,
-            "hunger": p.stats.hunger,
-            "sleep": p.stats.sleep,
-            "wanted": p.reputation.wanted_level,
-            "emotions": [p.fatigue, p.isolation, p.stability, p.anxiety],
-        }
+        path = self.paths.find_path(p.x, p.y, x, y)
+        if not path:
+            self.travel.clear()
+            return "경로 없음"
+        self.travel = deque(path)
+        self._travel_acc = 0.0
+        return f"자동 이동: {len(path)}칸"
+
+    def _update_travel(self, dt: float):
+        if not self.travel:
+            return
+        if self.ui_mode != "world" or self.combat.active:
+            self.travel.clear()
+            return
+        self._travel_acc += TRAVEL_RATE * dt
+        p = self.player
+        while self._travel_acc >= 1.0 and self.travel:
+            self._travel_acc -= 1.0
+            nx, ny = self.travel[0]
+            self.move_player(nx - p.x, ny - p.y)
+            if (p.x, p.y) != (nx, ny):
+                # 막혔다 (문이 닫혔거나 맵이 바뀜) — 남은 목적지로 한 번 다시 탐색
+                goal = self.travel[-1]
+                self.travel.clear()
+                if self.ui_mode == "world" and abs(nx - p.x) + abs(ny - p.y) == 1:
+                    self.travel_to(*goal)
+                return
+            self.travel.popleft()
+            if self.ui_mode != "world":        # 이동 중 전투/상점 등
+                self.travel.clear()
+                return
+
+    # ── 저장/불러오기 ──
+    def save(self, path: str = SAVE_FILE, compress: bool = False) -> str:
         try:
-            with open(SAVE_FILE, "w") as f:
-                json.dump(data, f)
+            save_game(self, path, compress)
             return "저장 완료"
-        except:
+        except OSError:
             return "저장 실패"
 
+    def load(self, path: str = SAVE_FILE) -> str:
+        """세이브를 읽어 이 객체의 상태를 통째로 교체"""
+        if path == SAVE_FILE and not os.path.exists(path) and os.path.exists(LEGACY_SAVE):
+            path = LEGACY_SAVE
+        try:
+            gs = load_game(path)
+        except (OSError, ValueError, KeyError, struct.error):
+            return "불러오기 실패"
+        old, bus = self.world.snapshot, self.bus
+        self.__dict__.update(gs.__dict__)
+        self.world.on_generate[:] = [self._on_chunk_generated]
+        self.bus = self.event_log.bus = bus      # 버스(와 그 구독자)는 불러와도 이어 쓴다
+        if old is not None and old is not self.world.snapshot:
+            old.close()
+        bus.publish(Ev.SESSION, EV_LOAD, self.seed & EV_SEED_MASK)
+        return "불러오기 완료"
+
+
+# ═══════════════════════════════════════════
+#  § 15. 저장 / 불러오기
+# ═══════════════════════════════════════════
+# 세이브 파일 (리틀 엔디언):
+#   헤더 <4s H H I I>  매직 NDSV, 버전, 플래그, 메타 JSON 길이, 청크 수
+#   메타 JSON          플레이어/엔티티/시계/날씨/난수 상태 등
+#   청크 표 <i i Q I I> (cx, cy, 파일 오프셋, 저장 길이, crc32)
+#   청크 블록          8바이트 정렬. _CHUNK_FIELDS 순서로 배열을 이어 붙인 것
+# 청크 블록은 mmap으로 열어 두고 월드가 요청할 때만 복원한다.
+SAVE_VERSION  = 1
+SAVE_ZLIB     = 0x1             # 플래그: 청크 블록 zlib 압축
+_SAVE_HDR     = struct.Struct("<4sHHII")
+_CHUNK_ENT    = struct.Struct("<iiQII")
+_CHUNK_FIELDS = ("char", "zone", "walkable", "neon", "interactive", "seen",
+                 "visits", "error", "item")
+_BIG_ENDIAN   = sys.byteorder == "big"
+
+
+def pack_chunk(ck: Chunk) -> bytes:
+    parts = []
+    for name in _CHUNK_FIELDS:
+        a = getattr(ck, name)
+        if _BIG_ENDIAN and isinstance(a, array):
+            a = array(a.typecode, a); a.byteswap()
+        parts.append(a.tobytes() if isinstance(a, array) else bytes(a))
+    return b"".join(parts)
+
+
+def unpack_chunk(cx: int, cy: int, buf, restyle: bool = True) -> Chunk:
+    ck = Chunk(cx, cy)
+    n, pos = CHUNK * CHUNK, 0
+    for name in _CHUNK_FIELDS:
+        a = getattr(ck, name)
+        size = n * (a.itemsize if isinstance(a, array) else 1)
+        part = buf[pos:pos + size]
+        if len(part) != size:
+            raise ValueError(f"청크 ({cx},{cy}) 데이터가 잘림")
+        if isinstance(a, array):
+            a = array(a.typecode); a.frombytes(part)
+            if _BIG_ENDIAN:
+                a.byteswap()
+            setattr(ck, name, a)
+        else:
+            a[:] = part
+        pos += size
+    if restyle:
+        restyle_chunk(ck)
+    return ck
+
+
+class WorldSnapshot:
+    """세이브 파일을 mmap으로 열어 두고 요청된 청크만 꺼내는 읽기 전용 뷰"""
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        try:
+            self.buf = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, ver, flags, meta_len, count = _SAVE_HDR.unpack_from(self.buf, 0)
+            if magic != b"NDSV":
+                raise ValueError("세이브 파일 형식이 아님")
+            if ver > SAVE_VERSION:
+                raise ValueError(f"더 새로운 세이브 버전: {ver}")
+            self.version, self.flags = ver, flags
+            pos = _SAVE_HDR.size
+            self.meta = json.loads(self.buf[pos:pos + meta_len].decode("utf-8"))
+            pos += meta_len
+            self.table: Dict[Tuple[int,int], Tuple[int,int,int]] = {}
+            for _ in range(count):
+                cx, cy, off, ln, crc = _CHUNK_ENT.unpack_from(self.buf, pos)
+                self.table[(cx, cy)] = (off, ln, crc)
+                pos += _CHUNK_ENT.size
+        except Exception:
+            self.close()
+            raise
+
+    def stored(self, key: Tuple[int,int]) -> Tuple[bytes, int, bool]:
+        """파일에 적힌 그대로의 청크 블록 사본 (블록, crc32, zlib 여부)"""
+        off, ln, crc = self.table[key]
+        return self.buf[off:off + ln], crc, bool(self.flags & SAVE_ZLIB)
+
+    def raw(self, key: Tuple[int,int]) -> bytes:
+        """압축을 푼 청크 블록"""
+        return _stored_to_blob(self.stored(key), key, False)
+
+    def restore(self, cx: int, cy: int) -> Optional[Chunk]:
+        if (cx, cy) not in self.table:
+            return None
+        return unpack_chunk(cx, cy, self.raw((cx, cy)))
+
+    def close(self):
+        if getattr(self, "buf", None) is not None:
+            self.buf.close()
+            self.buf = None
+        self._f.close()
+
+
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+_PLAIN = (int, float, str, bool, type(None))
+_MISSING = object()
+
+def _dump(obj, skip=()) -> dict:
+    """dataclass의 단순 필드를 JSON용 dict로 (Enum은 이름)"""
+    names = _FIELD_NAMES.get(type(obj))
+    if names is None:
+        names = _FIELD_NAMES[type(obj)] = tuple(f.name for f in fields(obj))
+    out = {}
+    for name in names:
+        if name in skip:
+            continue
+        v = getattr(obj, name)
+        out[name] = v.name if isinstance(v, Enum) else v
+    return out
+
+def _apply(obj, data: dict):
+    """_dump 결과를 객체에 덮어쓰기. 모르는 키는 무시 (버전 호환)"""
+    for k, v in data.items():
+        cur = getattr(obj, k, _MISSING)
+        if cur is _MISSING:
+            continue
+        if type(cur) not in _PLAIN:
+            if isinstance(cur, Enum):
+                v = type(cur)[v]
+            elif isinstance(cur, tuple):
+                v = tuple(v)
+        setattr(obj, k, v)
+
+def _item_copy(iid: Optional[str], qty: int = 1, dur: Optional[int] = None) -> Optional[Item]:
+    if iid not in ITEM_DB:
+        return None
+    it = ITEM_DB[iid].make(qty)
+    if dur is not None:
+        it.durability = dur
+    return it
+
+def _inv_meta(inv: Inventory) -> dict:
+    """차 있는 칸만 [슬롯, id, 수량, 내구도]로 기록 (수천 칸 보관함도 작게)"""
+    return dict(slots=inv.slots,
+                items=[[i, it.id, it.qty, it.durability] for i, it in enumerate(inv.items) if it])
+
+def _restore_inv(inv: Inventory, d: dict):
+    inv.slots = d["slots"]
+    inv.items = [None] * inv.slots
+    for idx, *e in d["items"]:
+        inv.items[idx] = _item_copy(*e)
+    inv.reindex()
+
+
+def _player_meta(p: Player) -> dict:
+    inv = p.inventory
+    return dict(
+        base=_dump(p, skip=("stats", "inventory", "stash", "reputation", "visited_zones",
+                            "active_quests", "completed_quests")),
+        stats=_dump(p.stats, skip=("skills",)),
+        skills={k: _dump(s) for k, s in p.stats.skills.items()},
+        inventory=dict(_inv_meta(inv), max_weight=inv.max_weight,
+                       equipped={k: [it.id, it.qty, it.durability] if it else None
+                                 for k, it in inv.equipped.items()}),
+        stash=_inv_meta(p.stash),
+        reputation=_dump(p.reputation),
+        visited_zones={z.name: n for z, n in p.visited_zones.items()},
+        active_quests=[dict(id=q.id, completed_obj=q.completed_obj, progress=q.progress,
+                            completed=q.completed, failed=q.failed, giver=q.giver)
+                       for q in p.active_quests],
+        completed_quests=list(p.completed_quests),
+    )
+
+def _restore_player(p: Player, d: dict):
+    _apply(p, d["base"])
+    _apply(p.stats, d["stats"])
+    for k, sd in d.get("skills", {}).items():
+        if k in p.stats.skills:
+            _apply(p.stats.skills[k], sd)
+    inv, di = p.inventory, d["inventory"]
+    inv.max_weight = di["max_weight"]
+    _restore_inv(inv, di)
+    inv.equipped = {k: _item_copy(*e) if isinstance(e, list) else _item_copy(e)
+                    for k, e in di["equipped"].items()}
+    if "stash" in d:
+        _restore_inv(p.stash, d["stash"])
+    _apply(p.reputation, d["reputation"])
+    p.visited_zones = {Zone[k]: n for k, n in d["visited_zones"].items()}
+    pool = {q.id: q for q in QUEST_POOL}
+    p.active_quests = []
+    for qd in d["active_quests"]:
+        if qd["id"] in pool:
+            q = pool[qd["id"]].clone()
+            _apply(q, qd)
+            p.active_quests.append(q)
+    p.completed_quests = list(d["completed_quests"])
+
+
+def _rng_state(r: random.Random) -> list:
+    ver, internal, gauss = r.getstate()
+    return [ver, list(internal), gauss]
+
+
+def game_meta(gs: "GameState") -> dict:
+    ev = gs.event_log
+    at = {id(e): i for i, e in enumerate(gs.enemies)}
+    return dict(
+        seed=gs.seed, width=gs.world.w, height=gs.world.h,
+        clock=gs.clock, time_of_day=gs.time_of_day, ticks=gs.ticks,
+        weather=gs.weather.name, job_choice=gs.job_choice,
+        watcher=dict(pos=gs.watcher_pos, timer=gs._wtimer, next=gs._wnext,
+                     near=gs._watcher_near, sync_acc=gs._sync_acc),
+        error_acc=gs._error_acc,
+        frontier=gs.errors.frontier.items,
+        crowd=dict(mood=gs.crowd.mood, acc=gs.crowd._acc),
+        rng={name: _rng_state(getattr(gs.rng, name)) for name in RngStreams.STREAMS},
+        events=list(ev.messages),
+        player=_player_meta(gs.player),
+        npcs=[_dump(n) for n in gs.npcs],
+        # 전투 중 저장되면 상대 적은 목록에 남아 있다가 재전투 가능 상태로 복원된다
+        enemies=[_dump(e) for e in gs.enemies],
+        # 공간 색인 버킷/추적 목록 순서 — 같은 순서로 질의해야 불러온 뒤에도 난수 소비가 같다
+        npc_order=gs.npc_index.order(gs.npcs),
+        enemy_order=gs.enemy_index.order(gs.enemies),
+        pursuers=[at[id(e)] for e in gs.pursuers if id(e) in at],
+        flow=None if gs.flow.tx < 0 or gs.flow._stale() else [gs.flow.tx, gs.flow.ty],
+        travel=[list(t) for t in gs.travel], travel_acc=gs._travel_acc,
+    )
+
+
+@dataclass
+class SaveImage:
+    """capture_save가 뜬 세이브 내용. 이후 단계(write_save)는 게임 상태를
+    건드리지 않으므로 다른 스레드에서 돌려도 된다"""
+    meta: bytes
+    keys: List[Tuple[int,int]]
+    sources: list                   # 청크별 pack_chunk 결과 또는 스냅샷 stored() 튜플
+    compress: bool
+    snapshot: Optional[WorldSnapshot]
+
+def _stored_to_blob(src: Tuple[bytes, int, bool], key, compress: bool) -> bytes:
+    """스냅샷 블록을 검증하고 요청한 압축 형식으로 맞춘다"""
+    data, crc, zipped = src
+    if zlib.crc32(data) != crc:
+        raise ValueError(f"청크 {key} 체크섬 불일치")
+    if zipped == compress:
+        return data
+    if zipped:
+        return zlib.decompress(data)
+    return zlib.compress(data, 1)
+
+def capture_save(gs: "GameState", compress: bool = False) -> SaveImage:
+    """저장할 상태를 한 시점에 고정해 복사 (게임 루프 스레드에서)"""
+    world, snap = gs.world, gs.world.snapshot
+    keys = sorted(set(world.chunks) | (set(snap.table) if snap else set()))
+    meta = json.dumps(game_meta(gs), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    sources = []
+    for key in keys:
+        ck = world.chunks.get(key)
+        sources.append(pack_chunk(ck) if ck is not None else snap.stored(key))
+    return SaveImage(meta, keys, sources, compress, snap)
+
+def write_save(img: SaveImage, path: str):
+    """SaveImage를 파일로 (압축/체크섬/쓰기). 게임 상태와 무관"""
+    blobs = []
+    for key, src in zip(img.keys, img.sources):
+        if isinstance(src, tuple):
+            blobs.append(_stored_to_blob(src, key, img.compress))
+        else:
+            blobs.append(zlib.compress(src, 1) if img.compress else src)
+
+    off = _SAVE_HDR.size + len(img.meta) + _CHUNK_ENT.size * len(img.keys)
+    table, offsets = bytearray(), []
+    for key, blob in zip(img.keys, blobs):
+        off = (off + 7) & ~7
+        offsets.append(off)
+        table += _CHUNK_ENT.pack(key[0], key[1], off, len(blob), zlib.crc32(blob))
+        off += len(blob)
+
+    flags = SAVE_ZLIB if img.compress else 0
+    with open(path, "wb") as f:
+        f.write(_SAVE_HDR.pack(b"NDSV", SAVE_VERSION, flags, len(img.meta), len(img.keys)))
+        f.write(img.meta)
+        f.write(table)
+        for o, blob in zip(offsets, blobs):
+            f.write(bytes(o - f.tell()))
+            f.write(blob)
+
+def commit_save(gs: "GameState", img: SaveImage, tmp: str, path: str):
+    """임시 파일을 세이브 자리로 옮긴다. 캡처 때 열려 있던 스냅샷은 닫고
+    새 파일로 다시 연다 (같은 경로 덮어쓰기 대비). 게임 루프 스레드에서"""
+    world, snap = gs.world, img.snapshot
+    if snap is None or world.snapshot is not snap:
+        os.replace(tmp, path)
+        return
+    snap.close()
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        path = snap.path
+        raise
+    finally:
+        world.snapshot = WorldSnapshot(path)
+
+def save_game(gs: "GameState", path: str = SAVE_FILE, compress: bool = False):
+    """전체 상태를 버전 세이브로 기록. 임시 파일에 쓰고 교체하므로
+    쓰는 도중 실패해도 기존 세이브는 남는다. 아직 복원 안 된 스냅샷 청크도 옮긴다."""
+    img = capture_save(gs, compress)
+    write_save(img, path + ".tmp")
+    commit_save(gs, img, path + ".tmp", path)
+
+
+def _load_legacy(path: str) -> "GameState":
+    """v0 JSON 세이브: 플레이어 일부 필드만 있고 월드는 새로 생성"""
+    with open(path, encoding="utf-8") as f:
+        d = json.load(f)
+    gs = GameState()
+    p = gs.player
+    p.x, p.y = d["pos"]
+    p.job = d.get("job", p.job)
+    for k in ("credits", "hp", "level", "xp", "hunger", "sleep"):
+        if k in d:
+            setattr(p.stats, k, d[k])
+    p.reputation.wanted_level = d.get("wanted", 0)
+    if "emotions" in d:
+        p.fatigue, p.isolation, p.stability, p.anxiety = d["emotions"]
+    gs._ensure_active_chunks()
+    return gs
+
+
+def _saved_order(order: Optional[List[int]], n: int) -> List[int]:
+    """저장된 색인 순서 + 거기 빠진 번호 (순서가 없는 옛 세이브는 목록 순서)"""
+    order = list(order or ())
+    seen = set(order)
+    return order + [i for i in range(n) if i not in seen]
+
+def load_game(path: str = SAVE_FILE) -> "GameState":
+    with open(path, "rb") as f:
+        head = f.read(4)
+    if head[:1] == b"{":
+        return _load_legacy(path)
+    snap = WorldSnapshot(path)
+    try:
+        m = snap.meta
+        gs = GameState(m["width"], m["height"], m["seed"], snapshot=snap)
+        gs.clock, gs.time_of_day, gs.ticks = m["clock"], m["time_of_day"], m["ticks"]
+        gs.weather    = Weather[m["weather"]]
+        gs.job_choice = m["job_choice"]
+        w = m["watcher"]
+        gs.watcher_pos = tuple(w["pos"]) if w["pos"] else None
+        gs._wtimer, gs._wnext = w["timer"], w["next"]
+        gs._watcher_near, gs._sync_acc = w["near"], w["sync_acc"]
+        gs._error_acc = m["error_acc"]
+        if "crowd" in m:
+            gs.crowd.mood[:] = m["crowd"]["mood"]
+            gs.crowd._acc = m["crowd"]["acc"]
+        for name, (ver, internal, gauss) in m["rng"].items():
+            getattr(gs.rng, name).setstate((ver, tuple(internal), gauss))
+        gs.event_log.messages.extend(m["events"])
+        _restore_player(gs.player, m["player"])
+        gs.quests.reset(gs.player.active_quests)
+        for nd in m["npcs"]:
+            npc = NPC(nd["x"], nd["y"])
+            _apply(npc, nd)
+            gs.npcs.append(npc)
+        for ed in m["enemies"]:
+            enemy = make_enemy(ed["id"], ed["x"], ed["y"])
+            _apply(enemy, ed)
+            gs.enemies.append(enemy)
+        for i in _saved_order(m.get("npc_order"), len(gs.npcs)):
+            gs.npc_index.add(gs.npcs[i])
+        for i in _saved_order(m.get("enemy_order"), len(gs.enemies)):
+            gs.enemy_index.add(gs.enemies[i])
+        gs.pursuers = ([gs.enemies[i] for i in m["pursuers"]] if "pursuers" in m
+                       else [e for e in gs.enemies if e.aggro])
+        if "frontier" in m:
+            gs.errors.restore(m["frontier"])
+        gs.travel.extend(tuple(t) for t in m.get("travel", ()))
+        gs._travel_acc = m.get("travel_acc", 0.0)
+        gs._ensure_active_chunks()
+        if m.get("flow"):                   # 저장 전과 같은 목표로 거리 지도를 다시 만든다
+            gs.flow.set_target(*m["flow"])
+            gs.flow._rebuild()
+        gs.world.atlas.absorb_stored(snap)
+    except Exception:
+        snap.close()
+        raise
+    return gs
+
 
 # ═══════════════════════════════════════════
-#  § 15. 렌더러
+#  § 16. 렌더러
 # ═══════════════════════════════════════════
+# 8방향 옥탄트 변환 (xx, xy, yx, yy)
+_OCTANTS = [(1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1)]
+
+class FieldOfView:
+    """재귀 섀도캐스팅 시야. 결과는 뷰포트 크기 비트맵으로 보관하고
+    (월드, 플레이어 위치, 반경, 뷰포트, 주변 청크 version)이 같으면 재계산하지 않는다.
+    새로 보인 칸은 청크 seen 배열에 기록한다."""
+    def __init__(self, w: int = VIEW_W, h: int = VIEW_H):
+        self.w, self.h = w, h
+        self.bitmap = bytearray(w * h)
+        self._key = None
+        self.recomputes = 0
+
+    def compute(self, world: World, px: int, py: int, r: int, vx: int, vy: int) -> bytearray:
+        cx0, cx1 = max(0, px - r) >> CHUNK_SHIFT, min(world.w - 1, px + r) >> CHUNK_SHIFT
+        cy0, cy1 = max(0, py - r) >> CHUNK_SHIFT, min(world.h - 1, py + r) >> CHUNK_SHIFT
+        world.ensure_rect(px - r, py - r, px + r, py + r)
+        chunks = world.chunks
+        versions = tuple(chunks[(cx, cy)].version
+                         for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1))
+        key = (world, px, py, r, vx, vy, versions)
+        if key == self._key:
+            return self.bitmap
+        self._key = key
+        self.recomputes += 1
+
+        bm = self.bitmap = bytearray(self.w * self.h)
+        vw, vh = self.w, self.h
+        ww, wh = world.w, world.h
+
+        def blocked(x, y) -> bool:
+            if not (0 <= x < ww and 0 <= y < wh):
+                return True
+            ck = chunks[(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)]
+            return not ck.walkable[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+        def mark(x, y):
+            sx, sy = x - vx, y - vy
+            if 0 <= sx < vw and 0 <= sy < vh and 0 <= x < ww and 0 <= y < wh:
+                bm[sy * vw + sx] = 1
+
+        r2 = r * r
+
+        def cast(row, start, end, xx, xy, yx, yy):
+            if start < end:
+                return
+            new_start = 0.0
+            for j in range(row, r + 1):
+                dx, dy = -j - 1, -j
+                in_wall = False
+                while dx <= 0:
+                    dx += 1
+                    x, y = px + dx * xx + dy * xy, py + dx * yx + dy * yy
+                    l_slope = (dx - 0.5) / (dy + 0.5)
+                    r_slope = (dx + 0.5) / (dy - 0.5)
+                    if start < r_slope:
+                        continue
+                    if end > l_slope:
+                        break
+                    if dx * dx + dy * dy <= r2:
+                        mark(x, y)
+                    b = blocked(x, y)
+                    if in_wall:
+                        if b:
+                            new_start = r_slope
+                            continue
+                        in_wall = False
+                        start = new_start
+                    elif b and j < r:
+                        in_wall = True
+                        cast(j + 1, start, l_slope, xx, xy, yx, yy)
+                        new_start = r_slope
+                if in_wall:
+                    break
+
+        mark(px, py)
+        for oct_ in _OCTANTS:
+            cast(1, 1.0, 0.0, *oct_)
+
+        # 보인 칸을 seen 메모리에 일괄 반영 (새로 밝힌 칸이 있는 청크는 지도 층에 알린다)
+        dirty = world.atlas.dirty
+        for sy in range(vh):
+            row = bm[sy * vw:(sy + 1) * vw]
+            if not any(row):
+                continue
+            y = vy + sy
+            for sx in range(vw):
+                if row[sx]:
+                    x = vx + sx
+                    ck = chunks[(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)]
+                    i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+                    if not ck.seen[i]:
+                        ck.seen[i] = 1
+                        dirty.add((ck.cx, ck.cy))
+        return bm
+
+
+SCREEN_W = PANEL_X + PANEL_W + 8
+SCREEN_H = VIEW_H + 3
+
+# 지도 (CityAtlas 표시)
+MINIMAP_LEVEL = 1                       # 미니맵 한 칸 = ATLAS_CELL << 1 타일
+MINIMAP_ROWS  = 7
+ATLAS_SHADES  = "·░▒▓"                  # 탐색 비율 순
+_POI_GLYPHS   = ((8, T_CHEST), (1, T_TERM), (2, T_DOOR), (4, T_CCTV), (POI_ITEM, T_ITEM))
+
+class ScreenBuffer:
+    """더블 버퍼 화면 모델.
+    back 버퍼에 (글리프, 스타일) 셀을 그린 뒤 flush()가 front 버퍼와 비교해
+    바뀐 셀만 내보낸다. 같은 스타일이 이어지면 SGR은 한 번만 쓴다.
+    스타일 문자열은 StyleTable의 값처럼 SGR 초기화를 포함한 완성형이어야 한다.
+    전각 문자는 두 칸을 차지하며 오른쪽 칸은 '' 로 표시한다."""
+    def __init__(self, w: int, h: int):
+        self.w, self.h = w, h
+        self.glyph = [[' '] * w for _ in range(h)]
+        self.style = [[''] * w for _ in range(h)]
+        self._front_glyph: List[Optional[list]] = [None] * h
+        self._front_style: List[Optional[list]] = [None] * h
+        self._full = True
+        self.last_bytes = 0          # 직전 flush 출력 길이
+
+    def clear(self):
+        for y in range(self.h):
+            self.glyph[y] = [' '] * self.w
+            self.style[y] = [''] * self.w
+
+    def invalidate(self):
+        """다음 flush에서 화면 전체를 다시 그린다 (외부 출력 이후 등)"""
+        self._front_glyph = [None] * self.h
+        self._front_style = [None] * self.h
+        self._full = True
+
+    def put(self, y: int, x: int, text: str, style: str = ""):
+        if not 0 <= y < self.h:
+            return
+        gr, sr, w = self.glyph[y], self.style[y], self.w
+        if 0 < x < w and gr[x] == '':                # 기존 전각 문자 오른쪽 반을 덮음
+            gr[x-1] = ' '
+        for ch in text:
+            if x >= w:
+                break
+            cw = 2 if wcwidth(ch) == 2 else 1
+            if x >= 0:
+                if cw == 2:
+                    if x + 1 >= w:
+                        break
+                    gr[x+1] = ''; sr[x+1] = style
+                # 뒤에 남은 전각 문자 오른쪽 반 정리
+                if x + cw < w and gr[x+cw] == '':
+                    gr[x+cw] = ' '
+                gr[x] = ch; sr[x] = style
+            x += cw
+
+    def put_cell(self, y: int, x: int, ch: str, style: str = ""):
+        """폭 1 글리프 전용 빠른 경로 (전각 문자가 없는 월드 영역용)"""
+        self.glyph[y][x] = ch
+        self.style[y][x] = style
+
+    def flush(self, term: Terminal) -> str:
+        out = [term.clear] if self._full else []
+        normal = term.normal
+        cur = None
+        for y in range(self.h):
+            gb, sb = self.glyph[y], self.style[y]
+            gf, sf = self._front_glyph[y], self._front_style[y]
+            if gf is not None and gb == gf and sb == sf:
+                continue
+            cursor = -1
+            for x in range(self.w):
+                g = gb[x]
+                if gf is not None and g == gf[x] and sb[x] == sf[x]:
+                    continue
+                if g == '':                          # 전각 문자의 오른쪽 반
+                    continue
+                if cursor != x:
+                    out.append(term.move_yx(y, x))
+                st = sb[x]
+                if st != cur:
+                    out.append(st or normal)         # 스타일은 초기화 포함 완성형
+                    cur = st
+                out.append(g)
+                cursor = x + (2 if x + 1 < self.w and gb[x+1] == '' else 1)
+            self._front_glyph[y] = gb[:]
+            self._front_style[y] = sb[:]
+        if cur:
+            out.append(normal)
+        self._full = False
+        s = ''.join(out)
+        self.last_bytes = len(s.encode('utf-8'))
+        return s
+
+
+class StyleTable:
+    """시작 시 한 번 만드는 이스케이프 문자열 표.
+    모든 값은 SGR 초기화(normal)로 시작하는 완성형이라 ScreenBuffer.flush가
+    이어 붙이지 않고 그대로 내보낸다."""
+    COLORS = ("magenta", "cyan", "green", "yellow", "blue", "red", "white")
+
+    def __init__(self, term: Terminal):
+        n = term.normal
+        def bold(c): return n + term.bold + getattr(term, c)
+        def c256(v): return n + term.color(v)
+
+        self.named = {c: n + getattr(term, c) for c in self.COLORS}
+        self.named.update(bold=n + term.bold, normal=n)
+        self.player, self.hostile = bold("white"), bold("red")
+        self.message, self.notify = bold("cyan"), bold("yellow")
+        self.seen = c256(236)
+        # 타일 스타일 클래스 → 이스케이프
+        tile = [n] * N_STYLE_CLASSES
+        for z in Zone:
+            tile[SC_ZONE + z.value] = self.named[ZONE_COLORS[z]]
+        tile[SC_DIM], tile[SC_DARK]  = c256(245), c256(238)
+        tile[SC_WALL], tile[SC_ROAD] = c256(240), c256(244)
+        tile[SC_ITEM], tile[SC_INTERACT] = bold("cyan"), bold("yellow")
+        tile[SC_ERROR], tile[SC_NEON]    = bold("red"), bold("magenta")
+        tile[SC_VISITED] = c256(208)
+        self.tile = tile
+        self.npc  = [self.named[ZONE_COLORS[z]] for z in ZONE_BY_CODE]   # Zone.value 순
+
+
 class Renderer:
     def __init__(self, term: Terminal, gs: GameState):
         self.term = term
         self.gs   = gs
+        self.styles = StyleTable(term)
+        self.screen = ScreenBuffer(SCREEN_W, SCREEN_H)
+        self.fov    = FieldOfView(VIEW_W, VIEW_H)
         self._last_mode: str = ""   # 이전 모드 추적 (오버레이 깜빡임 방지)
 
     def _c(self, color: str) -> str:
-        t = self.term
-        mapping = {
-            "magenta": t.magenta, "cyan": t.cyan, "green": t.green,
-            "yellow": t.yellow, "blue": t.blue, "red": t.red,
-            "white": t.white, "bold": t.bold, "normal": t.normal,
-        }
-        return mapping.get(color, "")
-
-    def _fov(self) -> set:
+        return self.styles.named.get(color, "")
+
+    def _fov(self, vx: int, vy: int) -> bytearray:
         p = self.gs.player
         r = p.fov_radius(self.gs.weather)
-        return {(p.x+dx, p.y+dy) for dy in range(-r, r+1)
-                for dx in range(-r, r+1) if dx*dx+dy*dy <= r*r}
+        return self.fov.compute(self.gs.world, p.x, p.y, r, vx, vy)
 
     def render(self):
         gs   = self.gs
@@ -1254,7 +3845,7 @@ class Renderer:
         else:
             # inventory / quest / character / shop
             # 모드 진입 시 한 번만 월드 배경을 그리고,
-            # 이후는 오버레이 패널만 덮어씌워서 깜빡임 제거
+            # 이후는 오버레이 패널만 덮어씌운다
             if mode_changed:
                 self._render_world()
             overlay = {
@@ -1262,88 +3853,83 @@ class Renderer:
                 "quest":     self._render_quest_overlay,
                 "character": self._render_character_overlay,
                 "shop":      self._render_shop_overlay,
+                "stash":     self._render_stash_overlay,
+                "map":       self._render_overview,
             }.get(mode)
             if overlay:
                 overlay()
 
+        out = self.screen.flush(self.term)
+        if out:
+            print(out, end='', flush=True)
+
     def _render_world(self):
-        term = self.term
         gs   = self.gs
         p    = gs.player
-        visible  = self._fov()
-        npc_map  = {(n.x, n.y): n for n in gs.npcs}
-        enemy_map= {(e.x, e.y): e for e in gs.enemies if e.is_alive()}
+        scr  = self.screen
+        w        = gs.world
+        vx, vy   = gs.viewport()
+        w.ensure_rect(vx, vy, vx + VIEW_W - 1, vy + VIEW_H - 1)
+        chunks   = w.chunks
+
+        visible  = self._fov(vx, vy)
+        x1, y1   = vx + VIEW_W - 1, vy + VIEW_H - 1
+        npc_map  = {(n.x, n.y): n for n in gs.npc_index.in_rect(vx, vy, x1, y1)}
+        enemy_map= {(e.x, e.y): e for e in gs.enemy_index.in_rect(vx, vy, x1, y1)
+                    if e.is_alive()}
         cur_tile = gs.tile(p.x, p.y)
         zone     = cur_tile.zone if cur_tile else Zone.RESIDENTIAL
+        distorted = p.is_distorted()
 
-        vx = max(0, min(p.x - VIEW_W // 2, MAP_W - VIEW_W))
-        vy = max(0, min(p.y - VIEW_H // 2, MAP_H - VIEW_H))
+        sty = self.styles
+        tile_st, npc_st = sty.tile, sty.npc
+        s_player, s_hostile, s_seen = sty.player, sty.hostile, sty.seen
 
-        out = [term.home]   # term.clear 제거 - 행 단위 덮어쓰기로 깜빡임 방지
+        scr.clear()
 
+        # 지형: 청크 행 조각마다 코드 → 글리프/스타일 표 조회로 한 번에 채운다
         for sy in range(VIEW_H):
-            row = term.move_yx(sy, 0)
-            for sx in range(VIEW_W):
-                wx, wy = vx + sx, vy + sy
-                if not (0 <= wx < MAP_W and 0 <= wy < MAP_H):
-                    row += ' '; continue
-
-                is_vis    = (wx, wy) in visible
-                is_player = (wx == p.x and wy == p.y)
-                is_watch  = gs.watcher_pos == (wx, wy)
-                npc       = npc_map.get((wx, wy))
-                enemy     = enemy_map.get((wx, wy))
-                t         = gs.tiles[wy][wx]
-
-                if is_player:
-                    row += term.bold + term.white + T_PLAYER + term.normal
-                elif is_watch and is_vis:
-                    row += term.bold + term.red + T_ENEMY_D + term.normal
-                elif enemy and is_vis:
-                    row += term.bold + term.red + enemy.char + term.normal
-                elif npc and is_vis:
-                    col = self._c(ZONE_COLORS.get(npc.zone, "white"))
-                    ch = T_MERCH if npc.role == "merchant" else T_NPC
-                    row += col + ch + term.normal
-                elif not is_vis:
-                    if t.visit_count > 0:
-                        row += term.color(236) + T_DARK + term.normal
-                    else:
-                        row += ' '
-                else:
-                    ch = t.char
-                    if p.is_distorted() and t.error_level > 0.3 and random.random() < 0.25:
-                        ch = random.choice(['%','!','?','#','&'])
-                    if t.visit_count > 15:
-                        row += term.color(208) + ch + term.normal
-                    elif t.is_neon:
-                        row += term.bold + term.magenta + ch + term.normal
-                    elif t.error_level > 0.5:
-                        row += term.bold + term.red + ch + term.normal
-                    elif t.interactive in ("terminal", "cctv", "door", "chest"):
-                        row += term.bold + term.yellow + ch + term.normal
-                    elif t.item_drop:
-                        row += term.bold + term.cyan + ch + term.normal
-                    elif t.char in (T_WALL, T_BUILD):
-                        row += term.color(240) + ch + term.normal
-                    elif t.char == T_ROAD:
-                        row += term.color(244) + ch + term.normal
-                    else:
-                        light = ZONE_PROPS[t.zone]['light']
-                        col_n = ZONE_COLORS.get(t.zone, "white")
-                        if light < 0.4:
-                            row += term.color(238) + ch + term.normal
-                        elif light < 0.7:
-                            row += term.color(245) + ch + term.normal
-                        else:
-                            row += self._c(col_n) + ch + term.normal
-            out.append(row + term.clear_eol)  # 행 끝 잔상 제거
+            wy = vy + sy
+            if not 0 <= wy < w.h:
+                continue
+            gr, sr = scr.glyph[sy], scr.style[sy]
+            row = (wy & CHUNK_MASK) * CHUNK
+            x, x_end = max(vx, 0), min(vx + VIEW_W, w.w)
+            while x < x_end:
+                seg = min(x_end, (x | CHUNK_MASK) + 1)
+                ck  = chunks[(x >> CHUNK_SHIFT, wy >> CHUNK_SHIFT)]
+                a, b = row + (x & CHUNK_MASK), row + (x & CHUNK_MASK) + seg - x
+                s0 = x - vx
+                vis = visible[sy * VIEW_W + s0: sy * VIEW_W + s0 + seg - x]
+                gr[s0:s0 + seg - x] = [TILE_CHARS[c] if v else T_DARK if sn else ' '
+                                       for c, v, sn in zip(ck.char[a:b], vis, ck.seen[a:b])]
+                sr[s0:s0 + seg - x] = [tile_st[c] if v else s_seen if sn else ''
+                                       for c, v, sn in zip(ck.sclass[a:b], vis, ck.seen[a:b])]
+                if distorted:
+                    err = ck.error
+                    for k in range(seg - x):
+                        if vis[k] and err[a + k] > 0.3 and random.random() < 0.25:
+                            gr[s0 + k] = random.choice(['%','!','?','#','&'])
+                x = seg
+
+        # 엔티티: 우선순위 낮은 것부터 덮어쓴다 (NPC < 적 < 감시자 < 플레이어)
+        def overlay(ox, oy, ch, st):
+            sx, sy = ox - vx, oy - vy
+            if visible[sy * VIEW_W + sx]:
+                scr.glyph[sy][sx] = ch; scr.style[sy][sx] = st
+        for (nx, ny), npc in npc_map.items():
+            overlay(nx, ny, T_MERCH if npc.role == "merchant" else T_NPC, npc_st[npc.zone.value])
+        for (ex, ey), enemy in enemy_map.items():
+            overlay(ex, ey, enemy.char, s_hostile)
+        if gs.watcher_pos and vx <= gs.watcher_pos[0] <= x1 and vy <= gs.watcher_pos[1] <= y1:
+            overlay(*gs.watcher_pos, T_ENEMY_D, s_hostile)
+        if vx <= p.x <= x1 and vy <= p.y <= y1:
+            scr.glyph[p.y - vy][p.x - vx] = T_PLAYER
+            scr.style[p.y - vy][p.x - vx] = s_player
 
         # ── 사이드 패널 ──
         def pl(y, txt, color=""):
-            s = term.move_yx(y, PANEL_X)
-            s += (self._c(color) if color else "") + txt + (term.normal if color else "")
-            out.append(s)
+            scr.put(y, PANEL_X, txt, self._c(color) if color else "")
 
         tod = gs.time_of_day
         tl = "새벽" if tod < 0.25 else "낮" if tod < 0.5 else "저녁" if tod < 0.75 else "심야"
@@ -1392,35 +3978,93 @@ class Renderer:
         for i, ev in enumerate(list(gs.event_log.messages)[:4]):
             msg = ev[:20] if len(ev) > 20 else ev
             pl(22+i, f"│ {msg:<20} │")
+        if gs.minimap:          # 감정/수배 자리를 덮어쓴다
+            self._render_minimap(pl)
+        if PROF.overlay:        # 감정/수배/이벤트 자리를 덮어쓴다
+            self._render_profile_panel(pl)
         pl(26, "├──────────────────────┤")
         pl(27, "│WASD이동 E상호작용    │")
-        pl(28, "│I인벤 J퀘스트 C캐릭  │")
-        pl(29, "│S저장  Q종료          │")
+        pl(28, "│I인벤 J퀘 C캐릭 B보관 │")
+        pl(29, "│F5저장 H귀환 M맵 Q종료│")
         pl(30, "└──────────────────────┘")
 
         # 활성 메시지
         if gs.event_log.active:
-            out.append(term.move_yx(VIEW_H, 0) + term.bold + term.cyan
-                       + f" ▶ {gs.event_log.active:<50}" + term.normal)
+            scr.put(VIEW_H, 0, f" ▶ {gs.event_log.active:<50}", sty.message)
 
         # 왜곡 노이즈
-        if p.is_distorted() and random.random() < 0.12:
+        if distorted and random.random() < 0.12:
             ny = random.randint(0, VIEW_H-1)
             nx = random.randint(0, VIEW_W-1)
-            out.append(term.move_yx(ny, nx) + term.bold + term.red
-                       + random.choice(['%','#','!']) + term.normal)
+            scr.put_cell(ny, nx, random.choice(['%','#','!']), s_hostile)
 
         # 알림
         if gs._notify:
-            out.append(term.move_yx(VIEW_H//2, VIEW_W//2 - 10)
-                       + term.bold + term.yellow
-                       + f"  ★ {gs._notify} ★  " + term.normal)
+            scr.put(VIEW_H//2, VIEW_W//2 - 10, f"  ★ {gs._notify} ★  ", sty.notify)
             gs._notify = ""
 
-        print(''.join(out), end='', flush=True)
+
+    def _atlas_cell(self, z: int, err: int, seen: int, poi: int) -> Tuple[str, str]:
+        """지도 한 칸 → (글리프, 스타일). 가 본 적 없는 곳은 비운다"""
+        if not seen:
+            return ' ', ''
+        tile_st = self.styles.tile
+        if poi:
+            for bit, ch in _POI_GLYPHS:
+                if poi & bit:
+                    return ch, tile_st[SC_ITEM if bit == POI_ITEM else SC_INTERACT]
+        if err >= 64:                       # 4분의 1 이상 오류 타일
+            return T_ERROR, tile_st[SC_ERROR]
+        return ATLAS_SHADES[seen * len(ATLAS_SHADES) // 256], self.styles.npc[z - 1] if z else self.styles.seen
+
+    def _render_minimap(self, pl):
+        """사이드 패널 미니맵 — 플레이어 중심, MINIMAP_LEVEL 단계"""
+        gs, scr = self.gs, self.screen
+        p, at = gs.player, gs.world.atlas
+        at.refresh(p.x, p.y)
+        k = min(MINIMAP_LEVEL, len(at.dims) - 1)
+        c, cols = at.cell_size(k), PANEL_W - 2
+        pl(12, f"│ [지도] 1칸={c}타일{'':<{6 - len(str(c))}}│", "bold")
+        for r in range(MINIMAP_ROWS):
+            pl(13 + r, "│" + " " * cols + "│")
+            wy = p.y + (r - MINIMAP_ROWS // 2) * c
+            for col in range(cols):
+                ch, st = self._atlas_cell(*at.sample(k, p.x + (col - cols // 2) * c, wy))
+                scr.put_cell(13 + r, PANEL_X + 1 + col, ch, st)
+        scr.put_cell(13 + MINIMAP_ROWS // 2, PANEL_X + 1 + cols // 2, T_PLAYER, self.styles.player)
+
+    def _render_overview(self):
+        """도시 전체 지도 (M). 맵 크기에 맞는 단계에서 화면 칸마다 한 칸씩만 읽는다"""
+        gs, scr = self.gs, self.screen
+        p, w = gs.player, gs.world
+        at = w.atlas
+        at.refresh(p.x, p.y)
+        scale = max(w.w / VIEW_W, w.h / VIEW_H)             # 화면 한 칸이 덮는 타일 수
+        k = at.level_for(scale)
+        for sy in range(VIEW_H):
+            gr, sr = scr.glyph[sy], scr.style[sy]
+            wy = int((sy + 0.5) * scale)
+            for sx in range(VIEW_W):
+                gr[sx], sr[sx] = self._atlas_cell(*at.sample(k, int((sx + 0.5) * scale), wy))
+        px, py = int(p.x / scale), int(p.y / scale)
+        if 0 <= px < VIEW_W and 0 <= py < VIEW_H:
+            scr.put_cell(py, px, T_PLAYER, self.styles.player)
+        scr.put(VIEW_H, 0, f" 도시 지도  1칸≈{scale:.0f}타일  "
+                f"{T_TERM}단말 {T_DOOR}문 {T_CCTV}CCTV {T_ITEM}아이템 {T_ERROR}오류  M/Q 닫기"
+                .ljust(VIEW_W + 8), self.styles.message)
+
+    def _render_profile_panel(self, pl):
+        """F3 디버그 오버레이 — 구간별 최근 실행 시간 p50/p95/p99 (ms)"""
+        pl(12, "│ 구간   p50  p95  p99 │", "bold")
+        rows = PROF.summary()[:13]
+        for r, (name, (p50, p95, p99, _mx)) in enumerate(rows):
+            col = "red" if p95 > 1000 / MAX_FPS else "yellow" if p95 > 1000 / MAX_FPS / 2 else ""
+            pl(13+r, f"│{name[:7]:<7}{p50:>5.1f}{p95:>5.1f}{p99:>5.1f}│", col)
+        for r in range(len(rows), 13):
+            pl(13+r, "│                      │")
 
     def _render_combat(self):
-        term = self.term
+        scr  = self.screen
         cs   = self.gs.combat
         p    = self.gs.player
         e    = cs.enemy
@@ -1431,14 +4075,9 @@ class Renderer:
         W, H = 50, 22
         ox = (VIEW_W - W) // 2
         oy = (VIEW_H - H) // 2
-        out = []
 
         def box(y, txt, color=""):
-            s = term.move_yx(oy+y, ox)
-            s += (self._c(color) if color else "")
-            s += txt.ljust(W)
-            s += (term.normal if color else "")
-            out.append(s)
+            scr.put(oy+y, ox, txt.ljust(W), self._c(color) if color else "")
 
         box(0,  "╔" + "═"*(W-2) + "╗", "bold")
         box(1,  f"║  ⚔  전투  //  {e.name:<20}   ║", "bold")
@@ -1473,19 +4112,15 @@ class Renderer:
                 f"스트레스:{p.stats.stress:>3}  ║")
         box(21, "╚" + "═"*(W-2) + "╝")
 
-        print(''.join(out), end='', flush=True)
 
     def _render_inventory_overlay(self):
-        term = self.term
+        scr  = self.screen
         inv  = self.gs.player.inventory
-        out  = []
         W, H = 46, 22
         ox, oy = 2, 2
 
         def box(y, txt, color=""):
-            s = term.move_yx(oy+y, ox)
-            s += (self._c(color) if color else "") + txt.ljust(W) + (term.normal if color else "")
-            out.append(s)
+            scr.put(oy+y, ox, txt.ljust(W), self._c(color) if color else "")
 
         box(0, "╔" + "═"*(W-2) + "╗", "bold")
         box(1, "║  인벤토리                               ║", "bold")
@@ -1509,19 +4144,15 @@ class Renderer:
         box(19, "╠" + "═"*(W-2) + "╣")
         box(20, "║  E[번호]: 사용/장착   I: 닫기          ║")
         box(21, "╚" + "═"*(W-2) + "╝")
-        print(''.join(out), end='', flush=True)
 
     def _render_quest_overlay(self):
-        term = self.term
+        scr  = self.screen
         p    = self.gs.player
-        out  = []
         W, H = 46, 22
         ox, oy = 2, 2
 
         def box(y, txt, color=""):
-            s = term.move_yx(oy+y, ox)
-            s += (self._c(color) if color else "") + txt.ljust(W) + (term.normal if color else "")
-            out.append(s)
+            scr.put(oy+y, ox, txt.ljust(W), self._c(color) if color else "")
 
         box(0, "╔" + "═"*(W-2) + "╗", "bold")
         box(1, "║  퀘스트 로그                            ║", "bold")
@@ -1535,7 +4166,8 @@ class Renderer:
                 done = q.completed_obj[i]
                 mark = "✓" if done else "·"
                 col = "green" if done else ""
-                box(row, f"║    {mark} {obj[:38]:<38}  ║", col); row+=1
+                text = obj.text if done or obj.count == 1 else f"{obj.text} {q.progress[i]}/{obj.count}"
+                box(row, f"║    {mark} {text[:38]:<38}  ║", col); row+=1
             box(row, f"║    보상: {q.reward_credits}₵  {q.reward_xp}XP              ║"); row+=1
             if row > 18: break
         while row < 20:
@@ -1546,20 +4178,16 @@ class Renderer:
         if p.completed_quests:
             box(22, "╠" + "═"*(W-2) + "╣") if H > 22 else None
         box(min(22, H-1), "╚" + "═"*(W-2) + "╝")
-        print(''.join(out), end='', flush=True)
 
     def _render_character_overlay(self):
-        term = self.term
+        scr  = self.screen
         p    = self.gs.player
         st   = p.stats
-        out  = []
         W = 46
         ox, oy = 2, 2
 
         def box(y, txt, color=""):
-            s = term.move_yx(oy+y, ox)
-            s += (self._c(color) if color else "") + txt.ljust(W) + (term.normal if color else "")
-            out.append(s)
+            scr.put(oy+y, ox, txt.ljust(W), self._c(color) if color else "")
 
         box(0, "╔" + "═"*(W-2) + "╗", "bold")
         box(1, "║  캐릭터 정보                            ║", "bold")
@@ -1581,21 +4209,48 @@ class Renderer:
         box(20, "╠" + "═"*(W-2) + "╣")
         box(21, "║  C: 닫기                                ║")
         box(22, "╚" + "═"*(W-2) + "╝")
-        print(''.join(out), end='', flush=True)
+
+    def _render_stash_overlay(self):
+        scr   = self.screen
+        gs    = self.gs
+        inv   = gs.player.inventory
+        stash = gs.player.stash
+        W = 46
+        ox, oy = 2, 2
+
+        def box(y, txt, color=""):
+            scr.put(oy+y, ox, txt.ljust(W), self._c(color) if color else "")
+
+        def line(it):
+            return f"{it.name:<12} ×{it.qty:<3} {it.grade.value[0]:<4}" if it else "─" * 22
+
+        box(0, "╔" + "═"*(W-2) + "╗", "bold")
+        box(1, f"║  보관함  {stash.used()}/{stash.slots}칸                     ║", "bold")
+        box(2, "╠" + "═"*(W-2) + "╣")
+        box(3, f"║  [소지품] 무게 {inv.total_weight():.1f}/{inv.max_weight}              ║")
+        for i, it in enumerate(inv.items[:INV_SLOTS]):
+            box(4+i, f"║  [{i+1}] {line(it)}           ║")
+        box(12, "╠" + "═"*(W-2) + "╣")
+        box(13, "║  [보관함]                               ║")
+        top = gs.stash_cursor - gs.stash_cursor % 8
+        for r, i in enumerate(range(top, min(top + 8, stash.slots))):
+            mark = "▶" if i == gs.stash_cursor else " "
+            box(14+r, f"║ {mark}{i+1:>4} {line(stash.items[i])}          ║",
+                "cyan" if i == gs.stash_cursor else "")
+        box(22, "╠" + "═"*(W-2) + "╣")
+        box(23, "║  숫자: 맡기기  W/S A/D: 이동  E: 꺼내기  ║")
+        box(24, "╚" + "═"*(W-2) + "╝")
 
     def _render_shop_overlay(self):
-        term = self.term
+        scr  = self.screen
         gs   = self.gs
         npc  = getattr(gs, "_current_npc", None)
         if not npc: return
-        out  = []
         W = 46
         ox, oy = 2, 2
 
         def box(y, txt, color=""):
-            s = term.move_yx(oy+y, ox)
-            s += (self._c(color) if color else "") + txt.ljust(W) + (term.normal if color else "")
-            out.append(s)
+            scr.put(oy+y, ox, txt.ljust(W), self._c(color) if color else "")
 
         box(0, "╔" + "═"*(W-2) + "╗", "bold")
         box(1, f"║  상점  [{npc.name}]                      ║", "bold")
@@ -1610,15 +4265,18 @@ class Renderer:
         box(13, "╠" + "═"*(W-2) + "╣")
         box(14, "║  숫자키: 구매   E/Q: 닫기               ║")
         box(15, "╚" + "═"*(W-2) + "╝")
-        print(''.join(out), end='', flush=True)
 
 
 # ═══════════════════════════════════════════
-#  § 16. 입력 처리
+#  § 17. 입력 처리
 # ═══════════════════════════════════════════
 def handle_input(key, gs: GameState) -> bool:
     k = str(key)
     kn = key.name if hasattr(key, 'name') else ""
+    load_key = gs.ui_mode == "world" and (kn == 'KEY_F9' or k.lower() == 'l')
+    if gs.load_armed and not load_key:
+        gs.load_armed = False    # 다른 키는 불러오기를 취소하고 평소대로 처리한다
+        gs.event_log.push("불러오기 취소")
 
     if gs.ui_mode == "combat":
         return _handle_combat_input(k, kn, gs)
@@ -1626,12 +4284,21 @@ def handle_input(key, gs: GameState) -> bool:
         return _handle_inventory_input(k, kn, gs)
     if gs.ui_mode == "shop":
         return _handle_shop_input(k, kn, gs)
+    if gs.ui_mode == "stash":
+        return _handle_stash_input(k, kn, gs)
     if gs.ui_mode in ("quest", "character"):
         if k in ('j','J','c','C','q','Q','i','I'):
             gs.ui_mode = "world"
         return False
+    if gs.ui_mode == "map":
+        if k in ('m', 'M'):
+            gs.ui_mode, gs.minimap = "world", False
+        elif k in ('q', 'Q') or kn == 'KEY_ESCAPE':
+            gs.ui_mode = "world"
+        return False
 
     # ── 월드 모드 ──
+    gs.travel.clear()            # 아무 키나 누르면 자동 이동 취소
     move_map = {
         'w':(0,-1), 'a':(-1,0), 's':(0,1), 'd':(1,0),
         'KEY_UP':(0,-1), 'KEY_DOWN':(0,1),
@@ -1649,9 +4316,32 @@ def handle_input(key, gs: GameState) -> bool:
         gs.ui_mode = "quest"
     elif k.lower() == 'c':
         gs.ui_mode = "character"
-    elif k.lower() == 's':
-        msg = gs.save()
-        gs.event_log.push(msg)
+    elif k.lower() == 'b':
+        if gs.at_stash():
+            gs.ui_mode = "stash"
+        else:
+            gs.event_log.push("보관함은 시작점에서만 열 수 있다. (H: 귀환)")
+    elif k.lower() == 'h':
+        gs.event_log.push(gs.travel_to(gs.world.w // 2, gs.world.h // 2))
+    elif k.lower() == 'm':           # 끔 → 미니맵 → 전체 지도
+        if gs.minimap:
+            gs.ui_mode = "map"
+        else:
+            gs.minimap = True
+    elif kn == 'KEY_F3':
+        PROF.toggle_overlay()
+    elif kn == 'KEY_F4':
+        gs.event_log.push(PROF.export())
+    elif kn == 'KEY_F5':
+        gs.event_log.push(gs.save())
+    elif load_key:
+        # 저장하지 않은 진행을 덮어쓰므로 한 번 더 눌러야 불러온다
+        if gs.load_armed:
+            gs.load_armed = False
+            gs.event_log.push(gs.load())
+        else:
+            gs.load_armed = True
+            gs.event_log.push("저장 안 한 진행은 사라진다. 불러오려면 L/F9 한 번 더")
     elif k.lower() == 'q':
         return True
     return False
@@ -1686,7 +4376,7 @@ def _handle_inventory_input(k, kn, gs: GameState) -> bool:
         item = gs.player.inventory.items[idx]
         if item:
             if item.equippable:
-                msg = gs.player.inventory.equip(idx)
+                msg = gs.equip_item(idx)
                 gs.event_log.push(msg)
             else:
                 gs._use_item(item, idx)
@@ -1706,9 +4396,23 @@ def _handle_shop_input(k, kn, gs: GameState) -> bool:
             gs.event_log.push(msg)
     return False
 
+def _handle_stash_input(k, kn, gs: GameState) -> bool:
+    if k.lower() in ('b', 'q'):
+        gs.ui_mode = "world"; return False
+    step = {'w': -1, 's': 1, 'a': -8, 'd': 8,
+            'KEY_UP': -1, 'KEY_DOWN': 1, 'KEY_LEFT': -8, 'KEY_RIGHT': 8}
+    d = step.get(k.lower()) or step.get(kn)
+    if d:
+        gs.stash_cursor = max(0, min(gs.player.stash.slots - 1, gs.stash_cursor + d))
+    elif k in [str(i) for i in range(1, INV_SLOTS + 1)]:
+        gs.event_log.push(gs.stash_deposit(int(k) - 1))
+    elif k.lower() == 'e' or k in ('\n', '\r') or kn == 'KEY_ENTER':
+        gs.event_log.push(gs.stash_withdraw(gs.stash_cursor))
+    return False
+
 
 # ═══════════════════════════════════════════
-#  § 17. 인트로 화면
+#  § 18. 인트로 화면
 # ═══════════════════════════════════════════
 def show_intro(term: Terminal, gs: GameState):
     print(term.clear + term.home)
@@ -1734,32 +4438,18 @@ def show_intro(term: Terminal, gs: GameState):
             key = term.inkey(timeout=60)
             k = str(key)
             if k in ('1','2','3','4','5'):
-                job, desc = JOBS[int(k)-1]
-                gs.player.job = job
-                gs.player.job_desc = desc
-                # 직업별 시작 아이템
-                job_items = {
-                    "배달 기사":   ["ration", "stim_pack"],
-                    "편의점 직원": ["ration", "ration", "coffee"],
-                    "서버 보조":   ["sniffer", "battery"],
-                    "택시 기사":   ["fake_id", "credits_50"],
-                    "무직":        ["knife", "stim_pack"],
-                }
-                gs.player.stats.credits = 400 if job == "택시 기사" else 200
-                for iid in job_items.get(job, []):
-                    gs.player.inventory.add(deepcopy(ITEM_DB[iid]))
+                gs.choose_job(int(k)-1)
                 break
             elif k in ('\n', '\r') or (hasattr(key, 'name') and key.name == 'KEY_ENTER'):
-                job, desc = random.choice(JOBS)
-                gs.player.job = job
-                gs.player.job_desc = desc
+                gs.choose_job(JOB_RANDOM)
                 break
             elif not key:
+                gs.choose_job(JOB_NONE)
                 break
 
 
 # ═══════════════════════════════════════════
-#  § 18. 엔딩
+#  § 19. 엔딩
 # ═══════════════════════════════════════════
 def show_ending(term: Terminal, gs: GameState):
     p = gs.player
@@ -1785,34 +4475,1597 @@ def show_ending(term: Terminal, gs: GameState):
 
 
 # ═══════════════════════════════════════════
-#  § 19. 메인 루프
+#  § 20. 헤드리스 실행 & 리플레이 & 벤치마크 & 전투 밸런스 & 이벤트 요약
+# ═══════════════════════════════════════════
+# 정책: (gs, rng) -> 행동 튜플
+#   ("move", dx, dy) / ("interact",) / ("combat", CombatAction) / ("wait",)
+_POLICY_MOVES = [(0,-1), (0,1), (-1,0), (1,0)]
+_POLICY_COMBAT = [CombatAction.ATTACK, CombatAction.ATTACK, CombatAction.SKILL,
+                  CombatAction.ITEM, CombatAction.FLEE]
+
+def random_policy(gs: GameState, rng: random.Random) -> tuple:
+    if gs.ui_mode == "combat":
+        return ("combat", rng.choice(_POLICY_COMBAT))
+    r = rng.random()
+    if r < 0.85:
+        return ("move",) + rng.choice(_POLICY_MOVES)
+    if r < 0.95:
+        return ("interact",)
+    return ("wait",)
+
+def scripted_policy(actions: List[tuple]):
+    """actions를 순서대로 반복. 전투 중에는 공격"""
+    it = iter(())
+    def policy(gs: GameState, rng: random.Random) -> tuple:
+        nonlocal it
+        if gs.ui_mode == "combat":
+            return ("combat", CombatAction.ATTACK)
+        a = next(it, None)
+        if a is None:
+            it = iter(actions)
+            a = next(it)
+        return a
+    return policy
+
+
+class HeadlessRunner:
+    """터미널 없이 GameState를 정책으로 구동한다"""
+    def __init__(self, gs: GameState, policy=random_policy, seed: int = 0):
+        self.gs     = gs
+        self.policy = policy
+        self.rng    = random.Random(seed)
+        self.steps    = 0
+        self.combats  = 0         # 시작된 전투 수
+        self.resolved = 0         # 끝난 전투 수
+
+    def apply(self, action: tuple):
+        gs = self.gs
+        kind = action[0]
+        if kind == "move":
+            gs.move_player(action[1], action[2])
+        elif kind == "interact":
+            gs.interact()
+        elif kind == "combat":
+            act = action[1]
+            idx = -1
+            if act == CombatAction.ITEM:
+                idx = next((i for i, it in enumerate(gs.player.inventory.items)
+                            if it and it.hp_restore > 0), -1)
+                if idx < 0:
+                    act = CombatAction.ATTACK
+            gs.resolve_combat_action(act, idx)
+
+    def _count(self, was_active: bool) -> bool:
+        """전투 시작/종료 전이를 센다. 지금 전투 중인지 돌려준다"""
+        active = self.gs.combat.active
+        if active and not was_active:
+            self.combats += 1
+        elif was_active and not active:
+            self.resolved += 1
+        return active
+
+    def run(self, steps: int, dt: float = SIM_DT):
+        gs = self.gs
+        in_combat = gs.combat.active
+        for _ in range(steps):
+            with PROF("input"):
+                self.apply(self.policy(gs, self.rng))
+            if gs.ui_mode not in ("world", "combat"):
+                gs.ui_mode = "world"          # 상점 등 UI는 바로 닫는다
+            in_combat = self._count(in_combat)
+            with PROF("tick"):
+                gs.tick(dt)
+            in_combat = self._count(in_combat)      # 추격하던 적이 틱 안에서 건 전투
+            self.steps += 1
+        return self
+
+
+class ReplayKey(str):
+    """리플레이 입력을 handle_input에 넘기기 위한 키 (blessed Keystroke 흉내)"""
+    def __new__(cls, token: str):
+        if token in _NAMED_KEYS:
+            k = super().__new__(cls, "")
+            k.name = token
+        else:
+            k = super().__new__(cls, token)
+            k.name = None
+        return k
+
+_NAMED_KEYS = ["KEY_UP", "KEY_DOWN", "KEY_LEFT", "KEY_RIGHT", "KEY_ENTER"]
+
+def key_token(key) -> Optional[str]:
+    """blessed 키 → 리플레이 토큰. 게임이 쓰지 않는 키는 None"""
+    name = getattr(key, "name", None)
+    if getattr(key, "is_sequence", False) or name:
+        return name if name in _NAMED_KEYS else None
+    k = str(key)
+    return k if len(k) == 1 and ord(k) < 0x80 else None
+
+def token_byte(token: str) -> int:
+    """토큰 → 1바이트 (ASCII 그대로, 0x80+i 는 _NAMED_KEYS[i])"""
+    return 0x80 + _NAMED_KEYS.index(token) if token in _NAMED_KEYS else ord(token)
+
+def byte_token(b: int) -> str:
+    return _NAMED_KEYS[b - 0x80] if b >= 0x80 else chr(b)
+
+
+class ReplayLog:
+    """(틱, 입력) 기록.
+    포맷: 헤더 <4s B I I I B> (매직, 버전, 시드, 폭, 높이, 직업 선택)
+         + 항목마다 [이전 항목과의 틱 차이 LEB128][키 바이트]
+    키 바이트는 ASCII 그대로, 0x80+i 는 _NAMED_KEYS[i]"""
+    MAGIC, VERSION = b"NDRP", 1
+    _HDR = struct.Struct("<4sBIIIB")
+
+    def __init__(self, seed: int, width: int, height: int, job: int = JOB_NONE):
+        self.seed, self.width, self.height, self.job = seed, width, height, job
+        self.events: List[Tuple[int, str]] = []
+
+    @classmethod
+    def for_game(cls, gs: "GameState") -> "ReplayLog":
+        return cls(gs.seed, gs.world.w, gs.world.h, gs.job_choice)
+
+    def record(self, tick: int, key):
+        token = key_token(key)
+        if token is not None:
+            self.events.append((tick, token))
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(self._HDR.pack(self.MAGIC, self.VERSION, self.seed,
+                                       self.width, self.height, self.job))
+        last = 0
+        for tick, token in self.events:
+            d = tick - last
+            last = tick
+            while True:
+                b = d & 0x7F
+                d >>= 7
+                out.append(b | 0x80 if d else b)
+                if not d:
+                    break
+            out.append(token_byte(token))
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ReplayLog":
+        magic, ver, seed, w, h, job = cls._HDR.unpack_from(data, 0)
+        if magic != cls.MAGIC or ver != cls.VERSION:
+            raise ValueError("리플레이 파일 형식이 아님")
+        log = cls(seed, w, h, job)
+        pos, tick = cls._HDR.size, 0
+        while pos < len(data):
+            d = shift = 0
+            while True:
+                b = data[pos]; pos += 1
+                d |= (b & 0x7F) << shift
+                shift += 7
+                if not b & 0x80:
+                    break
+            tick += d
+            log.events.append((tick, byte_token(data[pos])))
+            pos += 1
+        return log
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "ReplayLog":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def replay_session(log: ReplayLog, until_tick: Optional[int] = None) -> "GameState":
+    """리플레이를 터미널 없이 최대 속도로 재시뮬레이션"""
+    gs = GameState(log.width, log.height, log.seed)
+    gs._current_npc = None
+    gs.save = lambda *a, **kw: "저장 완료"     # 재생 중에는 세이브 파일을 건드리지 않는다
+    gs.load = lambda *a, **kw: "불러오기 생략"
+    gs.choose_job(log.job)
+    for tick, token in log.events:
+        if until_tick is not None and tick > until_tick:
+            break
+        while gs.ticks < tick:
+            gs.tick(SIM_DT)
+        if handle_input(ReplayKey(token), gs):
+            break
+    return gs
+
+
+def _spawn_bench_enemies(gs: GameState, count: int, rng: random.Random):
+    """플레이어 시뮬레이션 반경 안, 플레이어와 이어진 통행 칸에 적을 추가 배치"""
+    p, w = gs.player, gs.world
+    placed = 0
+    for _ in range(count * 2):
+        if placed >= count:
+            break
+        spot = w.sample_near(rng, p.x, p.y, SIM_RADIUS)
+        if spot and abs(spot[0] - p.x) + abs(spot[1] - p.y) > 3:
+            gs.spawn_enemy(make_enemy(rng.choice(["drone", "gang", "error"]), *spot))
+            placed += 1
+
+def bench_case(width: int, height: int, extra_enemies: int, steps: int, seed: int = 1) -> dict:
+    import tracemalloc
+    random.seed(seed)
+    t0 = time.perf_counter()
+    gs = GameState(width, height, seed)
+    _spawn_bench_enemies(gs, extra_enemies, random.Random(seed))
+    init_s = time.perf_counter() - t0
+
+    runner = HeadlessRunner(gs, random_policy, seed)
+    t0 = time.perf_counter()
+    runner.run(steps)
+    run_s = time.perf_counter() - t0
+
+    # 메모리는 별도 패스로 측정 (tracemalloc이 실행 속도를 크게 떨어뜨림)
+    random.seed(seed)
+    tracemalloc.start()
+    gs2 = GameState(width, height, seed)
+    _spawn_bench_enemies(gs2, extra_enemies, random.Random(seed))
+    HeadlessRunner(gs2, random_policy, seed).run(max(1, steps // 10))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return dict(size=f"{width}x{height}", enemies=len(gs.enemies), init_s=init_s,
+                steps_per_s=steps / run_s, combats_per_s=runner.combats / run_s,
+                combats=runner.combats, peak_mb=peak / 1e6, chunks=len(gs.world.chunks))
+
+BENCH_SIZES   = [(100, 100), (500, 500), (2000, 2000)]
+BENCH_ENEMIES = [0, 1000, 10000]
+
+def run_benchmark(steps: int = 5000, sizes=BENCH_SIZES, enemy_counts=BENCH_ENEMIES,
+                  seed: int = 1, out=sys.stdout) -> List[dict]:
+    rows = []
+    print(f"{'size':>10} {'enemies':>8} {'init s':>7} {'steps/s':>9} "
+          f"{'combat/s':>9} {'peak MB':>8} {'chunks':>6}", file=out)
+    for (w, h) in sizes:
+        for n in enemy_counts:
+            r = bench_case(w, h, n, steps, seed)
+            rows.append(r)
+            print(f"{r['size']:>10} {r['enemies']:>8} {r['init_s']:>7.3f} {r['steps_per_s']:>9.0f} "
+                  f"{r['combats_per_s']:>9.1f} {r['peak_mb']:>8.2f} {r['chunks']:>6}", file=out)
+    return rows
+
+
+# ── 프레임 프로파일러 ──
+PROF_WINDOW = 600          # 구간별로 기억하는 최근 샘플 수 (30fps면 약 20초)
+
+class _Section:
+    """한 구간의 최근 실행 시간(ms) 원형 버퍼. with 블록으로 잰다"""
+    __slots__ = ("samples", "pos", "count", "t0")
+
+    def __init__(self, window: int):
+        self.samples = array('d', bytes(8 * window))
+        self.pos = self.count = 0
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.samples[self.pos] = (time.perf_counter() - self.t0) * 1000.0
+        self.pos = (self.pos + 1) % len(self.samples)
+        self.count += 1
+
+    def recent(self) -> List[float]:
+        """시간순 최근 샘플"""
+        if self.count < len(self.samples):
+            return list(self.samples[:self.count])
+        return list(self.samples[self.pos:]) + list(self.samples[:self.pos])
+
+
+class _NoSection:
+    __slots__ = ()
+    def __enter__(self): pass
+    def __exit__(self, *exc): pass
+
+_NO_SECTION = _NoSection()
+
+
+class Profiler:
+    """서브시스템별 실행 시간 롤링 기록. 꺼져 있으면 PROF("...")는 빈 컨텍스트만
+    돌려주므로 헤드리스/벤치마크에도 그대로 둔다"""
+
+    def __init__(self, window: int = PROF_WINDOW):
+        self.window   = window
+        self.enabled  = False
+        self.overlay  = False
+        self.keep     = False          # --profile: 오버레이를 꺼도 계속 측정
+        self.sections: Dict[str, _Section] = {}
+        self._summary: List[tuple] = []
+        self._summary_at = 0.0
+
+    def __call__(self, name: str):
+        if not self.enabled:
+            return _NO_SECTION
+        sec = self.sections.get(name)
+        if sec is None:
+            sec = self.sections[name] = _Section(self.window)
+        return sec
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.keep
+
+    @staticmethod
+    def quantiles(samples: List[float]) -> Tuple[float, float, float, float]:
+        """(p50, p95, p99, 최대)"""
+        if not samples:
+            return (0.0, 0.0, 0.0, 0.0)
+        xs = sorted(samples)
+        n = len(xs) - 1
+        return (xs[n * 50 // 100], xs[n * 95 // 100], xs[n * 99 // 100], xs[n])
+
+    def summary(self, max_age: float = 0.25) -> List[Tuple[str, Tuple[float, float, float, float]]]:
+        """구간별 분위수. 오버레이용이라 max_age초 동안 결과를 재사용"""
+        now = time.perf_counter()
+        if now - self._summary_at > max_age:
+            self._summary = [(name, self.quantiles(sec.recent()))
+                             for name, sec in self.sections.items()]
+            self._summary_at = now
+        return self._summary
+
+    def export(self, path: str = PROFILE_FILE) -> str:
+        data = dict(window=self.window, unit="ms", sections={})
+        for name, sec in self.sections.items():
+            xs = sec.recent()
+            p50, p95, p99, mx = self.quantiles(xs)
+            data["sections"][name] = dict(count=sec.count, p50=p50, p95=p95, p99=p99, max=mx,
+                                          mean=sum(xs) / len(xs) if xs else 0.0, samples=xs)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError as e:
+            return f"프로파일 저장 실패: {e}"
+        return f"프로파일 저장: {path}"
+
+PROF = Profiler()
+
+
+# ── 전투 밸런스 (몬테카를로) ──
+# 정책: HP가 HEAL_AT 이하이면 회복 아이템, 전투 Lv3+면 강타, 아니면 일반 공격.
+# flee_at > 0이면 그 비율 이하에서 회복 대신 도주를 시도한다.
+BALANCE_LEVELS    = (1, 3, 5, 8)
+BALANCE_HEAL_AT   = 0.35
+BALANCE_MAX_TURNS = 60       # 넘기면 무승부(timeout)
+
+def combat_profile(job: str, level: int) -> Tuple[int, int, int, List[int]]:
+    """직업 시작 장비(장착 가능한 것은 장착)와 레벨로 (최대 HP, 공격, 방어, 회복량 목록).
+    게임과 같은 Stats/Inventory 코드로 계산한다"""
+    p = Player()
+    while p.stats.level < level:
+        p.stats.gain_xp(p.stats.xp_next)
+    for iid in JOB_ITEMS.get(job, ()):
+        p.inventory.add(ITEM_DB[iid])
+    for i, it in enumerate(p.inventory.items):
+        if it and it.equippable:
+            p.inventory.equip(i)
+    heals = sorted((it.hp_restore for it in p.inventory.items if it and it.hp_restore
+                    for _ in range(it.qty)), reverse=True)
+    return (p.stats.max_hp, p.stats.total_attack(p.inventory),
+            p.stats.total_defense(p.inventory), heals)
+
+def simulate_combat(fights: int, jobs: Optional[List[str]] = None,
+                    levels=BALANCE_LEVELS, enemies: Optional[List[str]] = None,
+                    combat_lv: int = 1, flee_at: float = 0.0, seed: int = 0,
+                    max_turns: int = BALANCE_MAX_TURNS) -> List[dict]:
+    """(직업, 레벨, 적) 칸마다 fights번의 전투를 NumPy 배열로 한꺼번에 굴린다.
+    칸마다 승률/패배율/도주율, 처치까지 턴(평균·p90), 잃은 HP 평균을 돌려준다"""
+    import numpy as np      # 선택 의존성 — 시뮬레이터를 쓸 때만 필요
+    jobs    = jobs or [name for name, _ in JOBS]
+    enemies = enemies or list(ENEMY_TEMPLATES)
+    cells = [(j, lv, e) for j in jobs for lv in levels for e in enemies]
+    C, F = len(cells), fights
+    profiles = {(j, lv): combat_profile(j, lv) for j in jobs for lv in levels}
+    K = max(1, max(len(h) for *_, h in profiles.values()))
+
+    # 칸 단위 파라미터 → (C, F) 배열
+    def col(values):
+        return np.repeat(np.asarray(values, dtype=np.int32)[:, None], F, axis=1)
+    pmax = col([profiles[j, lv][0] for j, lv, _ in cells])
+    patk = col([profiles[j, lv][1] for j, lv, _ in cells])
+    pdef = col([profiles[j, lv][2] for j, lv, _ in cells])
+    heal_tab = np.zeros((C, K + 1), dtype=np.int32)     # 마지막 열은 항상 0 (소진)
+    for c, (j, lv, _) in enumerate(cells):
+        h = profiles[j, lv][3]
+        heal_tab[c, :len(h)] = h
+    tmpl = [ENEMY_TEMPLATES[e] for _, _, e in cells]
+    ehp  = col([t.hp for t in tmpl])
+    eatk = col([t.attack for t in tmpl])
+    edef = col([t.defense for t in tmpl])
+
+    rng    = np.random.default_rng(seed & 0xFFFFFFFF)      # numpy는 음수 시드를 받지 않는다
+    php    = pmax.copy()
+    hptr   = np.zeros((C, F), dtype=np.int32)
+    turns  = np.zeros((C, F), dtype=np.int32)
+    result = np.zeros((C, F), dtype=np.int8)            # 0 진행 1 승 2 패 3 도주
+    rows_c = np.arange(C)[:, None]
+    flee_chance = CombatState.flee_chance
+    skill = combat_lv >= 3
+
+    for _ in range(max_turns):
+        act = result == 0
+        if not act.any():
+            break
+        turns += act
+        low = php <= pmax * (flee_at if flee_at > 0 else BALANCE_HEAL_AT)
+        # 도주 시도 — 실패하면 그 턴은 적 공격만 받는다
+        flee = act & low if flee_at > 0 else np.zeros_like(act)
+        ok = flee & (rng.integers(1, 101, size=(C, F)) <= flee_chance)
+        result[ok] = 3
+        # 회복
+        heal_amt = heal_tab[rows_c, hptr]
+        heal = act & ~flee & low & (heal_amt > 0)
+        php = np.where(heal, np.minimum(pmax, php + heal_amt), php)
+        hptr += heal
+        # 공격
+        hit = act & ~flee & ~heal
+        if skill:
+            raw = patk * SKILL_MULT
+        else:
+            raw = strike(patk, rng.integers(-PLAYER_ROLL, PLAYER_ROLL + 1, size=(C, F)),
+                         combat_lv, np.maximum)
+        ehp = np.where(hit, np.maximum(0, ehp - mitigate(raw, edef, np.maximum)), ehp)
+        result[hit & (ehp <= 0)] = 1
+        # 적 턴
+        hurt = (result == 0) & act
+        dmg = mitigate(eatk + rng.integers(-ENEMY_ROLL, ENEMY_ROLL + 1, size=(C, F)),
+                       pdef, np.maximum)
+        php = np.where(hurt, np.maximum(0, php - dmg), php)
+        result[hurt & (php <= 0)] = 2
+
+    won = result == 1
+    kill_turns = np.where(won, turns, np.nan)
+    any_win = won.any(axis=1)
+    safe = np.where(any_win[:, None], kill_turns, 0.0)  # 승리가 없는 칸은 nan 경고 없이 처리
+    t_mean = np.where(any_win, np.nanmean(safe, axis=1), np.nan)
+    t_p90  = np.where(any_win, np.nanpercentile(safe, 90, axis=1), np.nan)
+    hp_lost = (pmax - php).mean(axis=1)
+    rows = []
+    for c, (j, lv, e) in enumerate(cells):
+        rows.append(dict(job=j, level=lv, enemy=e, fights=F,
+                         win=float(won[c].mean()), lose=float((result[c] == 2).mean()),
+                         flee=float((result[c] == 3).mean()),
+                         timeout=float((result[c] == 0).mean()),
+                         turns_mean=float(t_mean[c]), turns_p90=float(t_p90[c]),
+                         hp_lost=float(hp_lost[c])))
+    return rows
+
+def run_balance(fights: int, levels=BALANCE_LEVELS, combat_lv: int = 1,
+                flee_at: float = 0.0, seed: int = 0, out=sys.stdout) -> List[dict]:
+    t0 = time.perf_counter()
+    rows = simulate_combat(fights, levels=levels, combat_lv=combat_lv,
+                           flee_at=flee_at, seed=seed)
+    el = time.perf_counter() - t0
+
+    def pad(txt: str, w: int) -> str:      # 한글은 두 칸
+        return txt + " " * max(0, w - sum(2 if wcwidth(ch) == 2 else 1 for ch in txt))
+    print(f"{'job':<12} {'lv':>3} {'enemy':<6} {'win%':>6} {'lose%':>6} {'flee%':>6} "
+          f"{'turns':>6} {'p90':>4} {'HP lost':>8}", file=out)
+    for r in rows:
+        print(f"{pad(r['job'], 12)} {r['level']:>3} {r['enemy']:<6} {r['win']*100:>6.1f} "
+              f"{r['lose']*100:>6.1f} {r['flee']*100:>6.1f} {r['turns_mean']:>6.2f} "
+              f"{r['turns_p90']:>4.0f} {r['hp_lost']:>8.1f}", file=out)
+    print(f"{len(rows) * fights} fights in {el:.2f}s", file=out)
+    return rows
+
+def event_stats(path: str = EVENT_FILE) -> dict:
+    """이벤트 파일 요약: 종류별 수, 세션, 적별 전투 결과, 구매, 퀘스트, 최고 레벨"""
+    kinds: Dict[str, int] = {}
+    sessions: Dict[str, int] = {}
+    combat: Dict[str, List[int]] = {}       # 적 id → 결과별 횟수 (COMBAT_RESULTS 순)
+    bought: Dict[str, List[int]] = {}       # 아이템 id → [개수, 크레딧]
+    steps, done, level, actors = 0, [], 1, set()
+    for kind, actor, tick, x, y, a, b, key in read_events(path):
+        kinds[kind.name] = kinds.get(kind.name, 0) + 1
+        actors.add(actor)
+        if kind == Ev.SESSION and 0 <= a < len(SESSION_KINDS):
+            sessions[SESSION_KINDS[a]] = sessions.get(SESSION_KINDS[a], 0) + 1
+        elif kind == Ev.COMBAT and 0 <= a < len(COMBAT_RESULTS):
+            combat.setdefault(key or "?", [0] * len(COMBAT_RESULTS))[a] += 1
+        elif kind == Ev.BUY:
+            row = bought.setdefault(key or "?", [0, 0])
+            row[0] += 1
+            row[1] += a
+        elif kind == Ev.QUEST:
+            if a < 0:
+                done.append(key)
+            else:
+                steps += 1
+        elif kind == Ev.LEVEL:
+            level = max(level, a)
+    return dict(records=sum(kinds.values()), kinds=kinds, sessions=sessions, actors=len(actors),
+                combat=combat, bought=bought, quest_steps=steps, quests_done=done, max_level=level)
+
+def print_event_stats(path: str = EVENT_FILE, out=sys.stdout) -> dict:
+    st = event_stats(path)
+    print(f"{path}: {st['records']} records  actors {st['actors']}  " + "  ".join(
+        f"{k} {v}" for k, v in st["sessions"].items()), file=out)
+    print("  " + "  ".join(f"{k} {v}" for k, v in sorted(st["kinds"].items())), file=out)
+    if st["combat"]:
+        print(f"  {'enemy':<8} " + " ".join(f"{r:>6}" for r in COMBAT_RESULTS), file=out)
+        for eid, row in sorted(st["combat"].items()):
+            print(f"  {eid:<8} " + " ".join(f"{n:>6}" for n in row), file=out)
+    if st["bought"]:
+        spent = sum(c for _, c in st["bought"].values())
+        top = sorted(st["bought"].items(), key=lambda kv: -kv[1][1])[:5]
+        print(f"  buy {sum(n for n, _ in st['bought'].values())} items {spent}₵  (" +
+              ", ".join(f"{iid}×{n} {c}₵" for iid, (n, c) in top) + ")", file=out)
+    print(f"  quest steps {st['quest_steps']}  done {len(st['quests_done'])}"
+          f"{' (' + ', '.join(st['quests_done']) + ')' if st['quests_done'] else ''}"
+          f"  max Lv{st['max_level']}", file=out)
+    return st
+
+
+# ═══════════════════════════════════════════
+#  § 21. 멀티플레이 서버
 # ═══════════════════════════════════════════
+# 서버가 도시 하나(GameState)를 들고 틱을 돌린다. 클라이언트는 키만 보내고
+# 자기 뷰포트 안에서 바뀐 셀만 바이너리 델타로 받는다.
+# 프레임: <H 길이> + 본문, 본문 첫 바이트가 종류
+#   C→S  J <B 직업>                       접속 (JOBS 인덱스 / JOB_RANDOM)
+#        K <B 키>                         입력 (token_byte 인코딩)
+#        A <H 세션 ID>                    관전 (0이면 가장 먼저 들어온 플레이어). 이후 입력은 무시
+#   S→C  W <BBH> 뷰 폭, 높이, 세션 ID
+#        V <bbH> 스크롤 dx, dy, 구간 수 + 구간마다 <HH 시작, 길이> + 셀 2바이트*길이
+#        S <hhhBIBBBBH> HP, 최대HP, 스트레스, 레벨, 크레딧, 구역, 날씨, 시각, 모드, 접속자 + 메시지(UTF-8)
+# 셀 = (NET_GLYPHS 번호, 스타일 번호) 2바이트. 0, 0은 빈칸
+# 관전자는 플레이어와 같은 V/S 프레임을 받는다. 밀렸다 따라잡으면 dx=dy=0, 화면 전체 한 구간짜리
+# V(키프레임)로 한 번에 맞춘다.
+NET_PORT       = 7077
+NET_HZ         = 10           # 뷰 델타 전송 주기
+NET_MAX_BUFFER = 64 * 1024    # 송신 버퍼가 이만큼 밀린 클라이언트는 이번 전송을 건너뛴다
+SPECTATE_MAX_BUFFER = 8 * 1024   # 관전자 송신 버퍼 한도. 넘으면 프레임을 버리고 나중에 키프레임
+SPAWN_SPREAD   = 12           # 접속 위치를 시작점에서 이만큼 흩뜨린다
+_NET_LEN    = struct.Struct("<H")
+_NET_WELCOME = struct.Struct("<BBH")
+_NET_VIEW   = struct.Struct("<bbH")
+_NET_RUN    = struct.Struct("<HH")
+_NET_SID    = struct.Struct("<H")
+_NET_STATUS = struct.Struct("<hhhBIBBBBH")
+
+NET_GLYPHS = [' ', T_DARK] + TILE_CHARS + [T_NPC, T_MERCH, T_ENEMY_D, T_ENEMY_G, T_PLAYER]
+NET_GLYPH  = {c: i for i, c in enumerate(NET_GLYPHS)}
+NG_TILE    = 2                                  # TILE_CHARS 코드 + NG_TILE
+NS_TILE    = 1                                  # 스타일 클래스 + NS_TILE
+NS_SEEN, NS_PLAYER, NS_HOSTILE, NS_OTHER = range(NS_TILE + N_STYLE_CLASSES, NS_TILE + N_STYLE_CLASSES + 4)
+NS_NPC     = NS_OTHER + 1                       # + Zone.value
+NET_MODES  = ("world", "inventory", "quest", "character", "combat", "shop", "stash")
+NET_WEATHER = list(Weather)
+
+# 접속마다 따로 갖는 GameState 속성. 서버는 처리할 세션의 값을 gs에 올려 놓고
+# 기존 메서드(handle_input, tick_player …)를 그대로 부른다
+SESSION_FIELDS = ("player", "ui_mode", "combat", "quests", "event_log", "travel", "_travel_acc",
+                  "stash_cursor", "_current_npc", "flow", "pursuers", "watcher_pos", "_wtimer",
+                  "_wnext", "_watcher_near", "_sync_acc", "_notify", "job_choice", "minimap",
+                  "load_armed")
+_SESSION_KEYS = frozenset(SESSION_FIELDS)
+
+def net_frame(payload: bytes) -> bytes:
+    return _NET_LEN.pack(len(payload)) + payload
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    n, = _NET_LEN.unpack(await reader.readexactly(_NET_LEN.size))
+    return await reader.readexactly(n)
+
+def net_styles(sty: StyleTable) -> List[str]:
+    """셀 스타일 번호 → 이스케이프 (클라이언트용)"""
+    return [""] + sty.tile + [sty.seen, sty.player, sty.hostile, sty.message] + sty.npc
+
+_VIEW_N    = VIEW_W * VIEW_H
+_VIEW_ALL  = (1 << 8 * _VIEW_N) - 1
+_NET_TG    = bytes((c + NG_TILE) & 0xFF for c in range(256))        # 타일 코드 → 글리프
+_NET_TS    = bytes((c + NS_TILE) & 0xFF for c in range(256))        # 스타일 클래스 → 스타일
+_NET_SG    = bytes([0, NET_GLYPH[T_DARK]]) + bytes(254)             # seen → 글리프
+_NET_SS    = bytes([0, NS_SEEN]) + bytes(254)
+_NET_MASK  = bytes([0]) + b"\xff" * 255
+
+def blank_cells() -> bytearray:
+    return bytearray(2 * _VIEW_N)
+
+def shift_cells(cells: bytearray, dx: int, dy: int, w: int = VIEW_W, h: int = VIEW_H) -> bytearray:
+    """뷰포트 원점이 (dx, dy)만큼 움직였을 때 이전 화면을 그만큼 민다. 새로 드러난 칸은 0"""
+    out = bytearray(2 * w * h)
+    if abs(dx) >= w or abs(dy) >= h:
+        return out
+    x0, x1 = max(0, -dx), min(w, w - dx)
+    for y in range(max(0, -dy), min(h, h - dy)):
+        src = (y + dy) * w
+        out[2 * (y * w + x0): 2 * (y * w + x1)] = cells[2 * (src + x0 + dx): 2 * (src + x1 + dx)]
+    return out
+
+class PlayerLayer:
+    """접속자 위치 비트맵 (모든 플레이어를 감싸는 상자). 전송마다 한 번 만들고
+    뷰마다 행 조각에서 bytearray.find로 찾으므로 한 곳에 몰려 있어도 싸다"""
+    __slots__ = ("x0", "y0", "x1", "y1", "w", "bits")
+
+    def __init__(self, spots):
+        spots = list(spots)
+        if not spots:
+            self.x0 = self.y0 = 0; self.x1 = self.y1 = -1; self.w = 0
+            self.bits = bytearray()
+            return
+        xs, ys = [x for x, _ in spots], [y for _, y in spots]
+        self.x0, self.y0, self.x1, self.y1 = min(xs), min(ys), max(xs), max(ys)
+        self.w = self.x1 - self.x0 + 1
+        self.bits = bytearray(self.w * (self.y1 - self.y0 + 1))
+        for x, y in spots:
+            self.bits[(y - self.y0) * self.w + x - self.x0] = 1
+
+    def in_rect(self, x0: int, y0: int, x1: int, y1: int):
+        """상자 안 플레이어 칸 (x, y)"""
+        xa, xb = max(x0, self.x0), min(x1, self.x1)
+        if xa > xb:
+            return
+        bits, w = self.bits, self.w
+        for y in range(max(y0, self.y0), min(y1, self.y1) + 1):
+            row = (y - self.y0) * w - self.x0
+            end = row + xb + 1
+            j = bits.find(1, row + xa, end)
+            while j >= 0:
+                yield j - row, y
+                j = bits.find(1, j + 1, end)
+
+def view_cells(gs: GameState, fov: FieldOfView, players: PlayerLayer,
+               cache: Optional[list] = None) -> bytearray:
+    """현재 올려진 플레이어의 뷰포트를 셀 배열로 (Renderer._render_world의 지도와 같은 규칙).
+    지형 층은 (뷰포트, 시야 재계산 횟수, 청크 paint)가 같으면 cache에서 재사용하고
+    엔티티만 다시 얹는다. 다른 플레이어가 밝힌 seen 칸은 자기 시야가 다시 계산될 때 반영된다"""
+    p, w = gs.player, gs.world
+    vx, vy = gs.viewport()
+    x1, y1 = vx + VIEW_W - 1, vy + VIEW_H - 1
+    w.ensure_rect(vx, vy, x1, y1)
+    r = p.fov_radius(gs.weather)
+    vis = fov.compute(w, p.x, p.y, r, vx, vy)
+    chunks = w.chunks
+    cx0, cx1 = max(vx, 0) >> CHUNK_SHIFT, min(x1, w.w - 1) >> CHUNK_SHIFT
+    cy0, cy1 = max(vy, 0) >> CHUNK_SHIFT, min(y1, w.h - 1) >> CHUNK_SHIFT
+    key = (vx, vy, fov.recomputes, tuple(chunks[(cx, cy)].paint for cy in range(cy0, cy1 + 1)
+                                         for cx in range(cx0, cx1 + 1)))
+    if cache and cache[0] == key:
+        cells = bytearray(cache[1])
+    else:
+        cells = _terrain_cells(w, vis, vx, vy)
+        if cache is not None:
+            cache[:] = [key, bytes(cells)]
+
+    def overlay(ox, oy, ch, st):
+        i = (oy - vy) * VIEW_W + ox - vx
+        if vis[i]:
+            cells[2 * i] = NET_GLYPH.get(ch, 0)
+            cells[2 * i + 1] = st
+    # 시야 밖은 어차피 안 그리므로 엔티티는 시야 반경 상자 안에서만 찾는다
+    bx0, by0 = max(vx, p.x - r), max(vy, p.y - r)
+    bx1, by1 = min(x1, p.x + r), min(y1, p.y + r)
+    for npc in gs.npc_index.in_rect(bx0, by0, bx1, by1):
+        overlay(npc.x, npc.y, T_MERCH if npc.role == "merchant" else T_NPC, NS_NPC + npc.zone.value)
+    for e in gs.enemy_index.in_rect(bx0, by0, bx1, by1):
+        if e.is_alive():
+            overlay(e.x, e.y, e.char, NS_HOSTILE)
+    if gs.watcher_pos and bx0 <= gs.watcher_pos[0] <= bx1 and by0 <= gs.watcher_pos[1] <= by1:
+        overlay(*gs.watcher_pos, T_ENEMY_D, NS_HOSTILE)
+    for ox, oy in players.in_rect(bx0, by0, bx1, by1):
+        overlay(ox, oy, T_PLAYER, NS_OTHER)
+    if vx <= p.x <= x1 and vy <= p.y <= y1:
+        i = (p.y - vy) * VIEW_W + p.x - vx
+        cells[2 * i], cells[2 * i + 1] = NET_GLYPH[T_PLAYER], NS_PLAYER
+    return cells
+
+def _terrain_cells(w: World, vis: bytearray, vx: int, vy: int) -> bytearray:
+    """지형 층. 셀마다 파이썬 루프를 돌지 않도록 청크 행 조각을 이어 붙이고,
+    보임/기억 선택은 화면 전체를 큰 정수 하나로 보고 비트 마스크로 한 번에 고른다"""
+    chunks = w.chunks
+    ch, sc, sn = bytearray(), bytearray(), bytearray()
+    for sy in range(VIEW_H):
+        wy = vy + sy
+        if not 0 <= wy < w.h:
+            pad = bytes(VIEW_W)
+            ch += pad; sc += pad; sn += pad
+            continue
+        row = (wy & CHUNK_MASK) * CHUNK
+        x, x_end = max(vx, 0), min(vx + VIEW_W, w.w)
+        if x > vx:
+            pad = bytes(x - vx)
+            ch += pad; sc += pad; sn += pad
+        while x < x_end:
+            seg = min(x_end, (x | CHUNK_MASK) + 1)
+            ck = chunks[(x >> CHUNK_SHIFT, wy >> CHUNK_SHIFT)]
+            a = row + (x & CHUNK_MASK)
+            b = a + seg - x
+            ch += ck.char[a:b]; sc += ck.sclass[a:b]; sn += ck.seen[a:b]
+            x = seg
+        if x_end < vx + VIEW_W:
+            pad = bytes(vx + VIEW_W - x_end)
+            ch += pad; sc += pad; sn += pad
+
+    m  = int.from_bytes(vis.translate(_NET_MASK), "little")
+    nm = ~m & _VIEW_ALL
+    def pick(shown: bytes, remembered: bytes) -> bytes:
+        return (int.from_bytes(shown, "little") & m
+                | int.from_bytes(remembered, "little") & nm).to_bytes(_VIEW_N, "little")
+    cells = blank_cells()
+    cells[0::2] = pick(ch.translate(_NET_TG), sn.translate(_NET_SG))
+    cells[1::2] = pick(sc.translate(_NET_TS), sn.translate(_NET_SS))
+    return cells
+
+def diff_runs(old: bytearray, new: bytearray, w: int = VIEW_W) -> List[Tuple[int, int]]:
+    """바뀐 셀 구간 [시작, 끝) (셀 단위). 한 칸짜리 틈은 헤더보다 싸므로 이어 붙인다"""
+    runs = []
+    stride = 2 * w
+    for a in range(0, len(new), stride):
+        b = a + stride
+        if old[a:b] == new[a:b]:
+            continue
+        diff = [old[j] != new[j] or old[j + 1] != new[j + 1] for j in range(a, b, 2)]
+        x, c0 = 0, a // 2
+        while x < w:
+            if not diff[x]:
+                x += 1
+                continue
+            start = x
+            while x < w and (diff[x] or (x + 1 < w and diff[x + 1])):
+                x += 1
+            runs.append((c0 + start, c0 + x))
+    return runs
+
+
+class ViewMirror:
+    """받는 쪽이 가진 화면 사본. 새 셀 배열과 비교해 V 프레임 본문을 만든다"""
+    def __init__(self):
+        self.cells = blank_cells()
+        self.origin: Optional[Tuple[int, int]] = None
+
+    def delta(self, cells: bytearray, vx: int, vy: int) -> Optional[bytes]:
+        dx = dy = 0
+        if self.origin is not None:
+            dx, dy = vx - self.origin[0], vy - self.origin[1]
+            if not (-128 <= dx < 128 and -128 <= dy < 128):
+                # 밀어서 맞출 수 없을 만큼 멀리 갔다 — 빈 사본과의 차이로는 클라이언트에
+                # 남은 옛 글리프가 지워지지 않으므로 화면 전체를 보낸다
+                self.origin, self.cells = (vx, vy), cells
+                return self.keyframe()
+            if dx or dy:
+                self.cells = shift_cells(self.cells, dx, dy)
+        self.origin = (vx, vy)
+        runs = diff_runs(self.cells, cells)
+        if not runs and not (dx or dy):
+            return None
+        out = bytearray(b"V" + _NET_VIEW.pack(dx, dy, len(runs)))
+        for a, b in runs:
+            out += _NET_RUN.pack(a, b - a)
+            out += cells[2 * a:2 * b]
+        self.cells = cells
+        return bytes(out)
+
+    def keyframe(self) -> bytes:
+        """지금 사본 전체 — 이전 화면이 무엇이든 이것만 받으면 맞춰진다"""
+        return b"V" + _NET_VIEW.pack(0, 0, 1) + _NET_RUN.pack(0, _VIEW_N) + bytes(self.cells)
+
+
+def apply_view(cells: bytearray, body: bytes) -> bytearray:
+    """V 프레임 본문을 받는 쪽 화면 사본에 적용한다 (ViewMirror.delta의 역)"""
+    dx, dy, nruns = _NET_VIEW.unpack_from(body)
+    if dx or dy:
+        cells = shift_cells(cells, dx, dy)
+    pos = _NET_VIEW.size
+    for _ in range(nruns):
+        a, n = _NET_RUN.unpack_from(body, pos)
+        pos += _NET_RUN.size
+        cells[2 * a:2 * (a + n)] = body[pos:pos + 2 * n]
+        pos += 2 * n
+    return cells
+
+
+def status_bytes(gs: GameState, online: int) -> bytes:
+    """S 프레임 본문 (현재 올려진 플레이어 기준)"""
+    p, st = gs.player, gs.player.stats
+    tile = gs.tile(p.x, p.y)
+    return (_NET_STATUS.pack(
+        int(st.hp), int(st.max_hp), int(st.stress), min(255, st.level),
+        max(0, int(st.credits)), (tile.zone if tile else Zone.RESIDENTIAL).value,
+        NET_WEATHER.index(gs.weather), int(gs.time_of_day * 255),
+        NET_MODES.index(gs.ui_mode) if gs.ui_mode in NET_MODES else 0, min(online, 0xFFFF))
+        + (gs.event_log.active or "").encode("utf-8"))
+
+
+class NetSession:
+    """접속 하나 — 플레이어 상태와 클라이언트가 가진 화면 사본"""
+    def __init__(self, sid: int, writer: asyncio.StreamWriter, state: dict):
+        self.sid, self.writer, self.state = sid, writer, state
+        self.fov = FieldOfView(VIEW_W, VIEW_H)
+        self.view = ViewMirror()                               # 클라이언트 화면
+        self.terrain: list = []                                # view_cells 지형 캐시
+        self.status = None
+        self.sent = 0                                          # 보낸 바이트
+
+
+class SpectatorHub:
+    """한 플레이어를 보는 관전자 묶음. 프레임마다 델타를 한 번만 인코딩해
+    같은 bytes를 모든 관전자에게 쓴다. 송신 버퍼가 밀린 관전자는 그동안의 프레임을 버리고,
+    버퍼가 비면 키프레임 하나로 합쳐 따라잡는다 (게임 루프는 관전자를 기다리지 않는다)."""
+    def __init__(self):
+        self.viewers: Dict[asyncio.StreamWriter, bool] = {}   # writer → 사본과 맞춰져 있는가
+        self.view = ViewMirror()
+        self.status = b""
+        self.frames = 0
+        self.dropped = 0
+        self.sent = 0
+
+    def add(self, writer: asyncio.StreamWriter):
+        self.viewers[writer] = False
+
+    def remove(self, writer: asyncio.StreamWriter):
+        self.viewers.pop(writer, None)
+
+    def close(self):
+        for w in self.viewers:
+            w.close()
+        self.viewers.clear()
+
+    def publish(self, cells: bytearray, vx: int, vy: int, status: bytes):
+        out = bytearray()
+        delta = self.view.delta(cells, vx, vy)
+        if delta:
+            out += net_frame(delta)
+        if status != self.status:
+            self.status = status
+            out += net_frame(b"S" + status)
+        frame = bytes(out)
+        key = None                          # 따라잡는 관전자가 있을 때만 한 번 만든다
+        self.frames += 1
+        for w, synced in list(self.viewers.items()):
+            if w.is_closing():
+                del self.viewers[w]
+                continue
+            if w.transport.get_write_buffer_size() > SPECTATE_MAX_BUFFER:
+                if synced:
+                    self.viewers[w] = False
+                self.dropped += 1
+                continue
+            if synced:
+                if frame:
+                    w.write(frame)
+                    self.sent += len(frame)
+            else:
+                if key is None:
+                    key = net_frame(self.view.keyframe()) + net_frame(b"S" + self.status)
+                w.write(key)
+                self.sent += len(key)
+                self.viewers[w] = True
+
+
+async def watch_client(hub: SpectatorHub, reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter, sid: int = 0):
+    """관전 접속 하나 — 환영 프레임을 보내고 허브에 건 뒤 끊길 때까지 입력은 읽어 버린다"""
+    writer.write(net_frame(b"W" + _NET_WELCOME.pack(VIEW_W, VIEW_H, sid & 0xFFFF)))
+    hub.add(writer)
+    try:
+        while True:
+            await read_frame(reader)
+    except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+        pass                                # 끊김 / 송출 종료
+    finally:
+        hub.remove(writer)
+        writer.close()
+
+
+class GameServer:
+    """도시 하나를 여러 터미널 클라이언트가 함께 쓰는 권위 서버.
+    모든 상태 변경은 이벤트 루프 스레드 한 곳에서 일어난다 (입력 처리, 틱, 전송)."""
+    def __init__(self, gs: GameState):
+        self.gs = gs
+        gs._current_npc = None
+        gs.save = lambda *a, **kw: "서버에서는 저장할 수 없다"
+        gs.load = lambda *a, **kw: "서버에서는 불러올 수 없다"
+        self.sessions: Dict[int, NetSession] = {}
+        self.hubs: Dict[int, SpectatorHub] = {}              # 세션 ID → 관전자
+        self._next_id = 1
+        self._bound: Optional[NetSession] = None
+        # 세션이 올라가 있지 않을 때 gs에 두는 서버 자신의 값. 내린 뒤에도 마지막 세션의
+        # 플레이어/로그가 gs에 남아 있으면 tick_world 같은 공용 코드가 그 세션 것을 건드린다
+        self._idle = {k: gs.__dict__[k] for k in SESSION_FIELDS}
+        self.rng = random.Random(gs.seed ^ 0x4E4554)
+        self.tick_cost: deque = deque(maxlen=PROF_WINDOW)     # 틱+전송 CPU 시간 (초)
+        self.late = 0                                         # 제때 못 돈 틱 수
+        self.sent = 0                                         # 보낸 바이트 합
+
+    # ── 세션 상태 올리기/내리기 ──
+    def _bind(self, s: NetSession):
+        """s의 상태를 gs에 올린다. 바꾸는 속성은 SESSION_FIELDS뿐이다"""
+        assert self._bound is None, "세션이 이미 올라가 있다"
+        assert s.state.keys() == _SESSION_KEYS, "세션 상태 필드 불일치"
+        d = self.gs.__dict__
+        for k in SESSION_FIELDS:
+            d[k] = s.state[k]
+        self.gs.bus.who = s.sid & 0xFFFF
+        self._bound = s
+
+    def _unbind(self):
+        d = self.gs.__dict__
+        self._bound.state = {k: d[k] for k in SESSION_FIELDS}
+        self._bound = None
+        for k in SESSION_FIELDS:
+            d[k] = self._idle[k]
+        self.gs.bus.who = 0
+
+    def _new_state(self) -> dict:
+        gs = self.gs
+        return dict(player=Player(x=gs.world.w // 2, y=gs.world.h // 2), ui_mode="world",
+                    combat=CombatState(), quests=QuestEngine(), event_log=EventLog(bus=gs.bus),
+                    travel=deque(), _travel_acc=0.0, stash_cursor=0, _current_npc=None,
+                    flow=FlowField(gs.world), pursuers=[], watcher_pos=None, _wtimer=0.0,
+                    _wnext=gs.rng.ai.uniform(20, 50), _watcher_near=False, _sync_acc=0.0,
+                    _notify="", job_choice=JOB_NONE, minimap=False, load_armed=False)
+
+    def join(self, writer: asyncio.StreamWriter, job: int) -> NetSession:
+        s = NetSession(self._next_id, writer, self._new_state())
+        self._next_id += 1
+        self._bind(s)
+        try:
+            self._spawn(self.gs.player)
+            self.gs.choose_job(job if job < len(JOBS) or job == JOB_RANDOM else JOB_NONE)
+            self.gs.bus.publish(Ev.SESSION, EV_JOIN, self.gs.seed & EV_SEED_MASK)
+            self.gs.event_log.push(f"도시 접속. 현재 {len(self.sessions) + 1}명.")
+        finally:
+            self._unbind()
+        self.sessions[s.sid] = s
+        writer.write(net_frame(b"W" + _NET_WELCOME.pack(VIEW_W, VIEW_H, s.sid & 0xFFFF)))
+        return s
+
+    def _spawn(self, p: Player):
+        """시작점과 이어진 근처 칸에 흩어 놓는다"""
+        spot = self.gs.world.sample_near(self.rng, p.x, p.y, SPAWN_SPREAD)
+        if spot:
+            p.x, p.y = spot
+
+    def handle(self, s: NetSession, key) -> bool:
+        """입력 하나. True면 접속 종료"""
+        self._bind(s)
+        try:
+            return handle_input(key, self.gs)
+        finally:
+            self._unbind()
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        s = None
+        try:
+            hello = await read_frame(reader)
+            if hello[:1] == b"A" and len(hello) == 3:
+                await self.watch(reader, writer, _NET_SID.unpack_from(hello, 1)[0])
+                return
+            s = self.join(writer, hello[1] if hello[:1] == b"J" and len(hello) == 2 else JOB_RANDOM)
+            while True:
+                msg = await read_frame(reader)
+                if msg[:1] == b"K" and len(msg) == 2 and self.handle(s, ReplayKey(byte_token(msg[1]))):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError):
+            pass
+        finally:
+            if s:
+                self._bind(s)
+                self.gs.bus.publish(Ev.SESSION, EV_LEAVE, self.gs.seed & EV_SEED_MASK)
+                self._unbind()
+                self.sessions.pop(s.sid, None)
+                hub = self.hubs.pop(s.sid, None)
+                if hub:
+                    hub.close()
+            writer.close()
+
+    async def watch(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, sid: int):
+        if not sid and self.sessions:
+            sid = min(self.sessions)
+        if sid not in self.sessions:
+            writer.close()
+            return
+        hub = self.hubs.setdefault(sid, SpectatorHub())
+        await watch_client(hub, reader, writer, sid)
+        if not hub.viewers and self.hubs.get(sid) is hub:
+            del self.hubs[sid]
+
+    # ── 시뮬레이션 & 전송 ──
+    def step(self, dt: float = SIM_DT):
+        gs = self.gs
+        with PROF("srv.world"):
+            gs.tick_world(dt)
+        with PROF("srv.players"):
+            for s in list(self.sessions.values()):
+                self._bind(s)
+                try:
+                    gs.tick_player(dt)
+                finally:
+                    self._unbind()
+
+    def broadcast(self, part: int = 0, parts: int = 1):
+        """sid % parts == part 인 세션에 전송 (틱마다 나눠 보내 부하를 고르게)"""
+        gs = self.gs
+        players = PlayerLayer((s.state["player"].x, s.state["player"].y) for s in self.sessions.values())
+        n = len(self.sessions)
+        for s in list(self.sessions.values()):
+            if s.sid % parts != part:
+                continue
+            w = s.writer
+            hub = self.hubs.get(s.sid)
+            # 밀린 클라이언트는 다음 전송에서 한 번에 따라잡는다. 관전자가 있으면 화면은 만든다
+            live = not w.is_closing() and w.transport.get_write_buffer_size() <= NET_MAX_BUFFER
+            if not live and not hub:
+                continue
+            self._bind(s)
+            try:
+                cells = view_cells(gs, s.fov, players, s.terrain)
+                vx, vy = gs.viewport()
+                status = status_bytes(gs, n)
+            finally:
+                self._unbind()
+            if hub:
+                hub.publish(cells, vx, vy, status)
+                self.sent += hub.sent
+                hub.sent = 0
+            if not live:
+                continue
+            out = bytearray()
+            delta = s.view.delta(cells, vx, vy)
+            if delta:
+                out += net_frame(delta)
+            if status != s.status:
+                s.status = status
+                out += net_frame(b"S" + status)
+            if out:
+                w.write(out)
+                s.sent += len(out)
+                self.sent += len(out)
+
+    async def run(self):
+        """고정 스텝으로 틱을 돌리고 NET_HZ마다 전송. 밀리면 따라잡지 않고 버린다"""
+        every = max(1, round(1.0 / (NET_HZ * SIM_DT)))
+        nxt = time.perf_counter()
+        while True:
+            c0 = time.process_time()
+            self.step()
+            with PROF("srv.net"):
+                self.broadcast(self.gs.ticks % every, every)
+            t1 = time.perf_counter()
+            self.tick_cost.append(time.process_time() - c0)
+            nxt += SIM_DT
+            if t1 > nxt + SIM_DT:
+                self.late += 1
+                nxt = t1
+            await asyncio.sleep(max(0.0, nxt - t1))
+
+
+async def serve(gs: GameState, host: str = "127.0.0.1", port: int = NET_PORT, events: str = ""):
+    srv = GameServer(gs)
+    server = await asyncio.start_server(srv.serve_client, host, port)
+    print(f"serving {host}:{port}  map {gs.world.w}x{gs.world.h} seed {gs.seed}", flush=True)
+    ev = EventWriter(gs.bus, events) if events else None
+    task = asyncio.create_task(ev.run()) if ev else None
+    try:
+        async with server:
+            await srv.run()
+    finally:
+        if ev:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await ev.close()
+
+
+async def run_client(term: Terminal, host: str, port: int, job: int = JOB_RANDOM,
+                     watch: Optional[int] = None):
+    """서버에 붙는 터미널 클라이언트. 받은 델타를 화면 사본에 적용해 그린다.
+    watch가 있으면 그 세션을 관전만 한다 (q로 나감)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    if watch is None:
+        writer.write(net_frame(b"J" + bytes([job])))
+    else:
+        writer.write(net_frame(b"A" + _NET_SID.pack(watch)))
+    styles = net_styles(StyleTable(term))
+    scr = ScreenBuffer(VIEW_W, VIEW_H + 2)
+    cells = blank_cells()
+    loop = asyncio.get_running_loop()
+
+    def on_key():
+        key = term.inkey(timeout=0)
+        while key:
+            token = key_token(key)
+            if watch is not None:
+                if token == 'q':
+                    writer.close()          # 읽기 쪽이 끊겨 루프가 끝난다
+                    return
+            elif token is not None:
+                writer.write(net_frame(b"K" + bytes([token_byte(token)])))
+            key = term.inkey(timeout=0)
+    loop.add_reader(sys.stdin.fileno(), on_key)
+    try:
+        while True:
+            try:
+                msg = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            kind, body = msg[:1], msg[1:]
+            if kind == b"V":
+                cells = apply_view(cells, body)
+                for y in range(VIEW_H):
+                    row = cells[2 * y * VIEW_W:2 * (y + 1) * VIEW_W]
+                    scr.glyph[y] = [NET_GLYPHS[g] for g in row[0::2]]
+                    scr.style[y] = [styles[st] for st in row[1::2]]
+            elif kind == b"S":
+                hp, mhp, stress, lv, cr, zone, weather, tod, mode, n = _NET_STATUS.unpack_from(body)
+                msg = body[_NET_STATUS.size:].decode("utf-8", "replace")
+                scr.glyph[VIEW_H] = [' '] * VIEW_W; scr.glyph[VIEW_H + 1] = [' '] * VIEW_W
+                scr.put(VIEW_H, 0, f"HP {hp}/{mhp}  ST {stress}  Lv{lv}  {cr}₵  "
+                        f"{ZONE_NAMES[ZONE_BY_CODE[zone]]}  {NET_WEATHER[weather].value}  "
+                        f"[{NET_MODES[mode]}]  접속 {n}")
+                scr.put(VIEW_H + 1, 0, msg)
+            print(scr.flush(term), end="", flush=True)
+    finally:
+        loop.remove_reader(sys.stdin.fileno())
+        writer.close()
+
+
+async def _bench_bots(port: int, clients: int, seconds: float) -> int:
+    """봇 클라이언트들 — 사람 손 속도로 한 방향으로 걷다가 가끔 꺾는다. 받은 프레임은 버린다"""
+    received = 0
+
+    async def bot(i: int):
+        rng = random.Random(i)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(net_frame(b"J" + bytes([i % len(JOBS)])))
+
+        async def drain():
+            nonlocal received
+            while True:
+                received += len(await read_frame(reader)) + _NET_LEN.size
+        rd = asyncio.create_task(drain())
+        key = rng.choice((b"w", b"a", b"s", b"d"))
+        try:
+            while True:
+                await asyncio.sleep(rng.uniform(0.15, 0.5))
+                if rng.random() < 0.2:
+                    key = rng.choice((b"w", b"a", b"s", b"d"))
+                writer.write(net_frame(b"K" + key))
+        finally:
+            rd.cancel()
+            writer.close()
+
+    bots = [asyncio.create_task(bot(i)) for i in range(clients)]
+    await asyncio.sleep(seconds)
+    for t in bots:
+        t.cancel()
+    await asyncio.gather(*bots, return_exceptions=True)
+    return received
+
+def _bench_bot_proc(port: int, clients: int, seconds: float, out):
+    out.put(asyncio.run(_bench_bots(port, clients, seconds)))
+
+async def _net_bench(clients: int, seconds: float, width: int, height: int, seed: int) -> dict:
+    import multiprocessing as mp
+    gs = GameState(width, height, seed)
+    srv = GameServer(gs)
+    server = await asyncio.start_server(srv.serve_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    # 봇은 다른 프로세스에서 — 서버 한 코어의 시간만 잰다
+    out = mp.Queue()
+    proc = mp.Process(target=_bench_bot_proc, args=(port, clients, seconds + 2.0, out), daemon=True)
+    proc.start()
+    runner = asyncio.create_task(srv.run())
+    await asyncio.sleep(2.0)                   # 접속/청크 생성 구간은 빼고 잰다
+    srv.tick_cost.clear()
+    t0, tick0, late0, sent0 = time.perf_counter(), gs.ticks, srv.late, srv.sent
+    cpu0 = time.process_time()
+    await asyncio.sleep(seconds / 2)
+    clients_mid = len(srv.sessions)
+    await asyncio.sleep(seconds / 2)
+    el = time.perf_counter() - t0
+    res = dict(clients=clients_mid, ticks_per_s=(gs.ticks - tick0) / el,
+               target_hz=1.0 / SIM_DT, late=srv.late - late0,
+               cpu=(time.process_time() - cpu0) / el,
+               tick_ms=Profiler.quantiles([c * 1e3 for c in srv.tick_cost]),
+               kb_per_client_s=(srv.sent - sent0) / el / max(1, clients) / 1024)
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    server.close()
+    await asyncio.get_running_loop().run_in_executor(None, proc.join, 10)
+    return res
+
+def run_net_bench(clients: int = 200, seconds: float = 10.0, width: int = 400,
+                  height: int = 400, seed: int = 0) -> dict:
+    """localhost에서 봇 클라이언트 여럿을 붙여 서버가 틱을 유지하는지 잰다"""
+    res = asyncio.run(_net_bench(clients, seconds, width, height, seed))
+    p50, p95, p99, _ = res["tick_ms"]
+    print(f"net bench: {res['clients']} clients  {res['ticks_per_s']:.1f}/{res['target_hz']:.0f} ticks/s  "
+          f"late {res['late']}  cpu {res['cpu'] * 100:.0f}%  "
+          f"tick cpu p50 {p50:.2f}ms p95 {p95:.2f}ms p99 {p99:.2f}ms  "
+          f"{res['kb_per_client_s']:.2f} KB/s per client")
+    return res
+
+
+# ═══════════════════════════════════════════
+#  § 22. 메인 루프
+# ═══════════════════════════════════════════
+def parse_args(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="NEON DRIFT v2")
+    ap.add_argument("--size", default=f"{MAP_W}x{MAP_H}",
+                    help="맵 크기 WxH (예: 2000x2000)")
+    ap.add_argument("--seed", type=int, default=None, help="월드 시드 (0 ~ 2^31-1)")
+    ap.add_argument("--headless", type=int, metavar="STEPS", default=None,
+                    help="터미널 없이 무작위 정책으로 STEPS 스텝 실행")
+    ap.add_argument("--bench", action="store_true", help="시뮬레이션 벤치마크 실행")
+    ap.add_argument("--bench-steps", type=int, default=5000)
+    ap.add_argument("--balance", type=int, metavar="FIGHTS", nargs="?", const=100000, default=None,
+                    help="직업×레벨×적 조합마다 FIGHTS번 전투 시뮬레이션 (numpy 필요)")
+    ap.add_argument("--balance-levels", default=",".join(map(str, BALANCE_LEVELS)),
+                    help="밸런스 시뮬레이션 레벨 목록 (예: 1,3,5)")
+    ap.add_argument("--combat-lv", type=int, default=1, help="밸런스 시뮬레이션 전투 스킬 레벨")
+    ap.add_argument("--flee-at", type=float, default=0.0,
+                    help="이 HP 비율 이하면 도주 시도 (0이면 도주 안 함)")
+    ap.add_argument("--balance-out", metavar="PATH", default=None,
+                    help="밸런스 결과를 JSON으로 저장")
+    ap.add_argument("--record", metavar="PATH", default=REPLAY_FILE,
+                    help="입력 리플레이 기록 파일 (빈 문자열이면 기록 안 함)")
+    ap.add_argument("--events", metavar="PATH", default=EVENT_FILE,
+                    help="게임 이벤트(전투/구매/퀘스트 …)를 PATH에 이어 기록 (빈 문자열이면 기록 안 함)")
+    ap.add_argument("--event-stats", metavar="PATH", nargs="?", const=EVENT_FILE, default=None,
+                    help="이벤트 파일을 요약해 출력")
+    ap.add_argument("--replay", metavar="PATH", default=None,
+                    help="리플레이 파일을 터미널 없이 재시뮬레이션")
+    ap.add_argument("--load", metavar="PATH", nargs="?", const=SAVE_FILE, default=None,
+                    help="세이브 파일에서 이어하기 (인트로 생략)")
+    ap.add_argument("--profile", metavar="PATH", nargs="?", const=PROFILE_FILE, default=None,
+                    help="서브시스템 실행 시간을 계속 측정하고 종료 시 PATH에 저장 (F3 오버레이, F4 저장)")
+    ap.add_argument("--autosave", type=float, metavar="SEC", default=AUTOSAVE_SEC,
+                    help=f"SEC초마다 {AUTOSAVE_FILE}에 자동 저장 (0이면 끔)")
+    ap.add_argument("--serve", type=int, metavar="PORT", nargs="?", const=NET_PORT, default=None,
+                    help="공유 도시 서버 실행")
+    ap.add_argument("--host", default="127.0.0.1", help="서버 주소 (--serve/--connect)")
+    ap.add_argument("--connect", type=int, metavar="PORT", nargs="?", const=NET_PORT, default=None,
+                    help="--host의 서버에 접속")
+    ap.add_argument("--watch", type=int, metavar="SID", nargs="?", const=0, default=None,
+                    help="--connect와 함께: 세션 SID를 관전만 한다 (생략하면 첫 플레이어)")
+    ap.add_argument("--spectate", type=int, metavar="PORT", nargs="?", const=NET_PORT, default=None,
+                    help="혼자 하는 판을 --host:PORT로 관전 송출 (--connect PORT --watch로 본다)")
+    ap.add_argument("--net-bench", type=int, metavar="CLIENTS", nargs="?", const=200, default=None,
+                    help="localhost에서 봇 CLIENTS명으로 서버 부하 측정")
+    args = ap.parse_args(argv)
+    try:
+        w, h = (int(v) for v in args.size.lower().split("x"))
+    except ValueError:
+        ap.error(f"잘못된 맵 크기: {args.size}")
+    if w < 10 or h < 10:
+        ap.error("맵 크기는 최소 10x10")
+    # 리플레이 헤더·이벤트 레코드·numpy 시드가 모두 받는 범위 (기본 시드와 같다)
+    if args.seed is not None and not 0 <= args.seed < 1 << 31:
+        ap.error(f"시드는 0 이상 {1 << 31} 미만: {args.seed}")
+    args.width, args.height = w, h
+    return args
+
+class FixedStepClock:
+    """고정 스텝 시뮬레이션 + 상한 있는 렌더 스케줄러"""
+    def __init__(self, step: float = SIM_DT, max_fps: float = MAX_FPS, max_steps: int = 8):
+        self.step      = step
+        self.frame     = 1.0 / max_fps
+        self.max_steps = max_steps        # 한 번에 따라잡을 최대 스텝 (멈춤 후 폭주 방지)
+        now = time.perf_counter()
+        self._last       = now
+        self._acc        = 0.0
+        self._next_frame = now
+
+    def steps(self) -> int:
+        """지난 호출 이후 실행해야 할 시뮬레이션 스텝 수"""
+        now = time.perf_counter()
+        self._acc += now - self._last
+        self._last = now
+        n = int(self._acc / self.step)
+        if n > self.max_steps:
+            n, self._acc = self.max_steps, 0.0
+        else:
+            self._acc -= n * self.step
+        return n
+
+    def should_render(self) -> bool:
+        now = time.perf_counter()
+        if now < self._next_frame:
+            return False
+        self._next_frame = max(self._next_frame + self.frame, now)
+        return True
+
+    def until_step(self) -> float:
+        """다음 시뮬레이션 스텝까지 남은 시간 (초, 0 이상)"""
+        return max(0.0, self.step - self._acc - (time.perf_counter() - self._last))
+
+    def until_frame(self) -> float:
+        """다음 렌더 프레임까지 남은 시간 (초, 0 이상)"""
+        return max(0.0, self._next_frame - time.perf_counter())
+
+    def idle_timeout(self) -> float:
+        """다음 스텝/프레임까지 입력을 기다려도 되는 시간"""
+        return min(self.until_step(), self.until_frame())
+
+class AsyncGame:
+    """asyncio 메인 루프. 입력 읽기 / 시뮬레이션 / 렌더 / 자동 저장 / 청크 선생성을
+    각각 태스크로 돌린다. GameState는 이벤트 루프 스레드에서만 만지고,
+    스레드 풀로는 상태와 무관한 파일 쓰기(세이브, 이벤트 기록)만 넘긴다."""
+    def __init__(self, term: Terminal, gs: "GameState", ren: "Renderer",
+                 rec: Optional[ReplayLog] = None, autosave: float = AUTOSAVE_SEC,
+                 spectate: Optional[Tuple[str, int]] = None,
+                 events: Optional[EventWriter] = None):
+        self.term, self.gs, self.ren, self.rec = term, gs, ren, rec
+        self.recording = rec is not None
+        self.autosave = autosave
+        self.spectate = spectate            # (주소, 포트) — 관전자에게 화면 송출
+        self.events   = events
+        self.hub = SpectatorHub()
+        self.clock  = FixedStepClock()
+        self.keys: deque = deque()         # 입력 태스크 → 시뮬레이션 태스크
+        self.key_ready = asyncio.Event()
+        self.saving: Optional[asyncio.Task] = None
+        # 저장/불러오기 키는 백그라운드 저장으로 돌린다 (인스턴스 속성이라 load 후에도 유지)
+        gs.save = self.request_save
+        gs.load = self.request_load
+
+    # ── 저장 ──
+    def request_save(self, path: str = SAVE_FILE, compress: bool = False,
+                     label: str = "저장") -> str:
+        if self.saving:
+            return "이미 저장 중"
+        try:
+            img = capture_save(self.gs, compress)
+        except (OSError, ValueError):
+            return f"{label} 실패"
+        self.saving = asyncio.get_running_loop().create_task(self._save(img, path, label))
+        return f"{label} 중..."
+
+    async def _save(self, img: SaveImage, path: str, label: str):
+        tmp = path + ".tmp"
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, write_save, img, tmp)
+            commit_save(self.gs, img, tmp, path)
+            msg = f"{label} 완료"
+        except (OSError, ValueError):
+            msg = f"{label} 실패"
+        finally:
+            self.saving = None
+        self.gs.event_log.push(msg)
+
+    def request_load(self, path: str = SAVE_FILE) -> str:
+        if self.saving:
+            return "저장 중 — 잠시 후 다시"
+        return GameState.load(self.gs, path)
+
+    # ── 태스크 ──
+    async def _read_input(self):
+        """stdin이 읽을 수 있게 되면 쌓인 키를 모두 큐로. 읽기를 기다리며 막히지 않는다"""
+        loop  = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        fd = sys.stdin.fileno()
+        try:
+            loop.add_reader(fd, ready.set)
+        except (NotImplementedError, ValueError, OSError):
+            fd = None                       # 지원 안 되는 환경이면 짧은 주기로 폴링
+        try:
+            while self.gs.running:
+                if fd is not None:
+                    await ready.wait()
+                    ready.clear()
+                else:
+                    await asyncio.sleep(0.005)
+                with PROF("inkey"):
+                    key = self.term.inkey(timeout=0)
+                    while key:
+                        self.keys.append(key)
+                        key = self.term.inkey(timeout=0)
+                if self.keys:
+                    self.key_ready.set()
+        finally:
+            if fd is not None:
+                loop.remove_reader(fd)
+
+    def _handle_keys(self) -> bool:
+        gs = self.gs
+        while self.keys:
+            key = self.keys.popleft()
+            if self.recording:
+                self.rec.record(gs.ticks, key)
+            with PROF("input"):
+                if handle_input(key, gs):
+                    return True
+            if self.recording and gs.world.snapshot is not None:
+                self.recording = False      # 도중에 불러오기 — 이후 입력은 재현 불가, 앞부분만 남긴다
+        return False
+
+    async def _simulate(self):
+        """입력 처리 → 고정 스텝 틱. 키가 들어오면 다음 스텝을 기다리지 않고 바로 처리"""
+        gs, clock = self.gs, self.clock
+        while gs.running:
+            with PROF("frame"):
+                if self._handle_keys():
+                    gs.running = False
+                    break
+                for _ in range(clock.steps()):
+                    with PROF("tick"):
+                        gs.tick(SIM_DT)
+            self.key_ready.clear()
+            try:
+                await asyncio.wait_for(self.key_ready.wait(), clock.until_step())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _render(self):
+        clock = self.clock
+        while self.gs.running:
+            if clock.should_render():
+                with PROF("render"):
+                    self.ren.render()
+            await asyncio.sleep(clock.until_frame())
+
+    async def _autosave(self):
+        gs = self.gs
+        while gs.running:
+            await asyncio.sleep(self.autosave)
+            if gs.running and gs.ui_mode == "world" and not self.saving:
+                gs.event_log.push(self.request_save(AUTOSAVE_FILE, label="자동 저장"))
+
+    async def _prefetch(self):
+        """다음 스텝/프레임까지 여유가 있을 때만 플레이어 근처 청크를 하나씩 미리 생성"""
+        gs = self.gs
+        while gs.running:
+            await asyncio.sleep(0.01)
+            if self.clock.idle_timeout() < 0.005:
+                continue
+            p = gs.player
+            with PROF("prefetch"):
+                gs.world.prefetch(p.x, p.y, SIM_RADIUS + CHUNK)
+
+    async def _open_spectate(self) -> Optional[asyncio.AbstractServer]:
+        host, port = self.spectate
+        try:
+            server = await asyncio.start_server(
+                lambda r, w: watch_client(self.hub, r, w, 1), host, port)
+        except OSError as e:
+            self.gs.event_log.push(f"관전 송출 실패: {e.strerror or e}")
+            return None
+        self.gs.event_log.push(f"관전 송출 {host}:{port}")
+        return server
+
+    async def _broadcast(self):
+        """관전 송출. 화면은 NET_HZ마다 한 번만 셀로 만들고 (시야는 렌더러 것을 같이 쓴다)
+        같은 bytes를 모든 관전자에게 보낸다. 관전자가 없으면 아무것도 하지 않는다"""
+        gs, hub, terrain = self.gs, self.hub, []
+        while gs.running:
+            await asyncio.sleep(1.0 / NET_HZ)
+            if not hub.viewers:
+                continue
+            with PROF("spectate"):
+                cells = view_cells(gs, self.ren.fov, PlayerLayer(()), terrain)
+                vx, vy = gs.viewport()
+                hub.publish(cells, vx, vy, status_bytes(gs, 1))
+
+    async def run(self):
+        tasks = [asyncio.create_task(self._simulate()),
+                 asyncio.create_task(self._read_input()),
+                 asyncio.create_task(self._render()),
+                 asyncio.create_task(self._prefetch())]
+        if self.autosave > 0:
+            tasks.append(asyncio.create_task(self._autosave()))
+        if self.events:
+            tasks.append(asyncio.create_task(self.events.run()))
+        server = await self._open_spectate() if self.spectate else None
+        if server:
+            tasks.append(asyncio.create_task(self._broadcast()))
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if server:
+                self.hub.close()
+                server.close()
+        if self.saving:                     # 쓰던 세이브는 끝까지 마친다
+            await self.saving
+        if self.events:
+            self.gs.bus.publish(Ev.SESSION, EV_END, self.gs.seed & EV_SEED_MASK)
+            await self.events.close()
+        for t in done:
+            t.result()                      # 태스크 예외 전파
+
+
 def main():
+    args = parse_args()
+    if args.bench:
+        run_benchmark(args.bench_steps)
+        return
+    if args.balance is not None:
+        try:
+            rows = run_balance(args.balance, [int(v) for v in args.balance_levels.split(",")],
+                               args.combat_lv, args.flee_at, args.seed or 0)
+        except ImportError:
+            sys.exit("전투 밸런스 시뮬레이터에는 numpy가 필요하다 (pip install numpy)")
+        if args.balance_out:
+            with open(args.balance_out, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False, indent=1)
+        return
+    if args.replay:
+        log = ReplayLog.load(args.replay)
+        t0 = time.perf_counter()
+        gs = replay_session(log)
+        el = time.perf_counter() - t0
+        p  = gs.player
+        print(f"replay: {len(log.events)} inputs, {gs.ticks} ticks in {el:.2f}s "
+              f"({gs.ticks / max(el, 1e-9):.0f} ticks/s)  pos=({p.x},{p.y}) "
+              f"Lv{p.stats.level} HP{p.stats.hp} {p.stats.credits}₵")
+        return
+    if args.event_stats:
+        try:
+            print_event_stats(args.event_stats)
+        except (OSError, ValueError) as e:
+            sys.exit(f"이벤트 파일을 읽을 수 없다: {e}")
+        return
+    if args.profile:
+        PROF.enabled = PROF.keep = True
+    if args.net_bench is not None:
+        run_net_bench(args.net_bench, 10.0, args.width, args.height, args.seed or 0)
+        return
+    if args.serve is not None:
+        try:
+            asyncio.run(serve(GameState(args.width, args.height, args.seed), args.host, args.serve,
+                              args.events))
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.connect is not None:
+        term = Terminal()
+        with term.fullscreen(), term.hidden_cursor(), term.cbreak():
+            try:
+                asyncio.run(run_client(term, args.host, args.connect, watch=args.watch))
+            except OSError as e:
+                sys.exit(f"접속 실패: {e}")
+        return
+    if args.headless is not None:
+        gs = GameState(args.width, args.height, args.seed)
+        t0 = time.perf_counter()
+        r  = HeadlessRunner(gs, random_policy, gs.seed).run(args.headless)
+        el = time.perf_counter() - t0
+        print(f"steps={r.steps} combats={r.combats} {r.steps / el:.0f} steps/s  "
+              f"pos=({gs.player.x},{gs.player.y}) Lv{gs.player.stats.level}")
+        if args.profile:
+            print(PROF.export(args.profile))
+        return
     term = Terminal()
-    gs   = GameState()
+    if args.load:
+        gs = load_game(args.load)
+    else:
+        gs = GameState(args.width, args.height, args.seed)
     ren  = Renderer(term, gs)
     gs._current_npc = None
+    events = EventWriter(gs.bus, args.events) if args.events else None
+    gs.bus.publish(Ev.SESSION, EV_LOAD if args.load else EV_NEW, gs.seed & EV_SEED_MASK)
 
     with term.fullscreen(), term.hidden_cursor():
-        show_intro(term, gs)
-        last_tick = time.time()
-
-        with term.cbreak():
-            while gs.running:
-                now = time.time()
-                dt  = now - last_tick
-                last_tick = now
-
-                gs.tick(dt)
-                ren.render()
+        if not args.load:
+            show_intro(term, gs)
+        # 리플레이는 시드에서 재시뮬레이션하므로 세이브에서 시작한 판은 기록하지 않는다
+        rec = ReplayLog.for_game(gs) if args.record and not args.load else None
 
-                key = term.inkey(timeout=TICK)
-                if key:
-                    done = handle_input(key, gs)
-                    if done:
-                        gs.running = False
+        async def play():
+            app = AsyncGame(term, gs, ren, rec, args.autosave,
+                            (args.host, args.spectate) if args.spectate is not None else None,
+                            events)
+            await app.run()
 
+        with term.cbreak():
+            asyncio.run(play())
+
+        if rec:
+            try:
+                rec.save(args.record)
+            except OSError:
+                pass
+        if args.profile:
+            PROF.export(args.profile)
         show_ending(term, gs)
+    if events and events.failed:
+        print(f"이벤트 기록 실패 ({args.events}): {events.failed}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""localhost 서버: 접속 두 개가 각자 상태를 갖고 화면/상태 프레임을 받는지"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main as M
+
+
+async def _join(port, job):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(M.net_frame(b"J" + bytes([job])))
+    hello = await asyncio.wait_for(M.read_frame(reader), 5)
+    assert hello[:1] == b"W"
+    w, h, sid = M._NET_WELCOME.unpack_from(hello, 1)
+    assert (w, h) == (M.VIEW_W, M.VIEW_H)
+    return reader, writer, sid
+
+
+async def _drain(reader, kinds):
+    try:
+        while True:
+            kinds.add((await M.read_frame(reader))[:1])
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+
+
+async def _session_isolation():
+    gs = M.GameState(200, 200, seed=3)
+    srv = M.GameServer(gs)
+    server = await asyncio.start_server(srv.serve_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    run = asyncio.create_task(srv.run())
+    try:
+        (ra, wa, sa), (rb, wb, sb) = await _join(port, 0), await _join(port, 1)
+        assert sa != sb and set(srv.sessions) == {sa, sb}
+        ka, kb = set(), set()
+        drains = [asyncio.create_task(_drain(ra, ka)), asyncio.create_task(_drain(rb, kb))]
+        pa, pb = srv.sessions[sa].state["player"], srv.sessions[sb].state["player"]
+        a0, b0 = (pa.x, pa.y), (pb.x, pb.y)
+        for key in "e" + "d" * 6 + "s" * 6:
+            wa.write(M.net_frame(b"K" + bytes([M.token_byte(key)])))
+        await asyncio.sleep(0.6)
+
+        a, b = srv.sessions[sa].state, srv.sessions[sb].state
+        assert a["player"] is not b["player"]
+        assert a["event_log"] is not b["event_log"]
+        assert a["event_log"].messages and a["event_log"].messages != b["event_log"].messages
+        assert (pa.x, pa.y) != a0 and (pb.x, pb.y) == b0
+        assert srv._bound is None
+        # 세션을 내린 뒤 gs에는 서버 자신의 값만 남는다
+        assert all(gs.__dict__[k] is srv._idle[k] for k in M.SESSION_FIELDS)
+        assert {b"V", b"S"} <= ka and {b"V", b"S"} <= kb
+
+        wa.close()
+        await asyncio.sleep(0.2)
+        assert set(srv.sessions) == {sb}
+        wb.close()
+        for t in drains:
+            t.cancel()
+        await asyncio.gather(*drains, return_exceptions=True)
+    finally:
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+        server.close()
+        await server.wait_closed()
+
+
+def test_sessions_are_isolated_on_localhost():
+    asyncio.run(_session_isolation())
+
+
+def test_view_delta_round_trips_long_jumps():
+    gs = M.GameState(400, 400, seed=3)
+    fov = M.FieldOfView(M.VIEW_W, M.VIEW_H)
+    mirror, client = M.ViewMirror(), M.blank_cells()
+    p = gs.player
+    # 한 칸, 뷰포트 밖 (shift가 전부 비움), 128칸 이상 (keyframe), 지도 가장자리
+    for x, y in [(p.x, p.y), (p.x + 1, p.y), (p.x + 90, p.y - 40), (300, 300),
+                 (40, 40), (399, 0), (200, 200), (201, 201)]:
+        p.x, p.y = x, y
+        cells = M.view_cells(gs, fov, M.PlayerLayer([(x, y)]))
+        body = mirror.delta(cells, *gs.viewport())
+        if body is not None:
+            client = M.apply_view(client, body[1:])
+        assert client == cells, (x, y)